@@ -0,0 +1,140 @@
+/*
+ * Python extension computing regular triangulations with CGAL, used by the
+ * 'cgal' backend of refinementlib/orderk_delaunay.py.
+ *
+ * The regular triangulation of points c_i with weights w_i is the
+ * projection of the lower convex hull of the lifted points
+ * (c_i, |c_i|^2 - w_i), which is the hull computed for each order of the
+ * order-k Delaunay mosaics. The predicates are exact.
+ */
+
+#include <CGAL/Exact_predicates_inexact_constructions_kernel.h>
+#include <CGAL/Regular_triangulation_2.h>
+#include <CGAL/Regular_triangulation_3.h>
+#include <CGAL/Triangulation_vertex_base_with_info_2.h>
+#include <CGAL/Triangulation_vertex_base_with_info_3.h>
+
+#include <pybind11/pybind11.h>
+#include <pybind11/numpy.h>
+
+#include <stdexcept>
+#include <utility>
+#include <vector>
+
+typedef CGAL::Exact_predicates_inexact_constructions_kernel              K;
+
+typedef CGAL::Regular_triangulation_vertex_base_2<K>                     Vb0_2;
+typedef CGAL::Triangulation_vertex_base_with_info_2<unsigned, K, Vb0_2>  Vb_2;
+typedef CGAL::Regular_triangulation_face_base_2<K>                       Fb_2;
+typedef CGAL::Triangulation_data_structure_2<Vb_2, Fb_2>                 Tds_2;
+typedef CGAL::Regular_triangulation_2<K, Tds_2>                          Reg_Tri_2;
+
+typedef CGAL::Regular_triangulation_vertex_base_3<K>                     Vb0_3;
+typedef CGAL::Triangulation_vertex_base_with_info_3<unsigned, K, Vb0_3>  Vb_3;
+typedef CGAL::Regular_triangulation_cell_base_3<K>                       Cb_3;
+typedef CGAL::Triangulation_data_structure_3<Vb_3, Cb_3>                 Tds_3;
+typedef CGAL::Regular_triangulation_3<K, Tds_3>                          Reg_Tri_3;
+
+namespace py = pybind11;
+
+typedef py::array_t<double, py::array::c_style | py::array::forcecast>
+                                                                  DoubleArray;
+typedef py::array_t<int32_t>                                      IndexArray;
+
+
+/*
+ * Triangulate the weighted points and return the finite top-dimensional
+ * simplices as rows of d+1 point indices.
+ */
+std::vector<int32_t> triangulate_2(const std::vector<double>& coords,
+                                   const std::vector<double>& weights) {
+  std::vector< std::pair<Reg_Tri_2::Weighted_point, unsigned> > points;
+  for (unsigned i = 0; i < weights.size(); ++i) {
+    K::Point_2 p(coords[2*i], coords[2*i + 1]);
+    points.push_back(std::make_pair(
+        Reg_Tri_2::Weighted_point(p, weights[i]), i));
+  }
+  Reg_Tri_2 T(points.begin(), points.end());
+
+  std::vector<int32_t> simplices;
+  if (T.dimension() < 2) {
+    return simplices;
+  }
+  Reg_Tri_2::Finite_faces_iterator fit;
+  for (fit = T.finite_faces_begin(); fit != T.finite_faces_end(); ++fit) {
+    for (int i = 0; i <= 2; ++i) {
+      simplices.push_back(fit->vertex(i)->info());
+    }
+  }
+  return simplices;
+}
+
+
+std::vector<int32_t> triangulate_3(const std::vector<double>& coords,
+                                   const std::vector<double>& weights) {
+  std::vector< std::pair<Reg_Tri_3::Weighted_point, unsigned> > points;
+  for (unsigned i = 0; i < weights.size(); ++i) {
+    K::Point_3 p(coords[3*i], coords[3*i + 1], coords[3*i + 2]);
+    points.push_back(std::make_pair(
+        Reg_Tri_3::Weighted_point(p, weights[i]), i));
+  }
+  Reg_Tri_3 T(points.begin(), points.end());
+
+  std::vector<int32_t> simplices;
+  if (T.dimension() < 3) {
+    return simplices;
+  }
+  Reg_Tri_3::Finite_cells_iterator cit;
+  for (cit = T.finite_cells_begin(); cit != T.finite_cells_end(); ++cit) {
+    for (int i = 0; i <= 3; ++i) {
+      simplices.push_back(cit->vertex(i)->info());
+    }
+  }
+  return simplices;
+}
+
+
+/*
+ * Python entry point.
+ *
+ * Input:
+ *    points: (n, d) array of coordinates, d being 2 or 3.
+ *    weights: (n,) array of weights.
+ * Output:
+ *    (m, d+1) int32 array of the simplices as rows of point indices.
+ */
+IndexArray regular_triangulation(DoubleArray points, DoubleArray weights) {
+  if (points.ndim() != 2 || weights.ndim() != 1
+      || points.shape(0) != weights.shape(0)) {
+    throw std::invalid_argument(
+        "expected an (n, d) array of points and an (n,) array of weights");
+  }
+  const py::ssize_t dim = points.shape(1);
+  if (dim != 2 && dim != 3) {
+    throw std::invalid_argument(
+        "regular triangulations are only available in dimensions 2 and 3");
+  }
+  std::vector<double> coords(points.data(), points.data() + points.size());
+  std::vector<double> wts(weights.data(), weights.data() + weights.size());
+
+  std::vector<int32_t> simplices;
+  {
+    // The triangulation does not touch Python objects.
+    py::gil_scoped_release release;
+    simplices = dim == 2 ? triangulate_2(coords, wts)
+                         : triangulate_3(coords, wts);
+  }
+
+  const py::ssize_t n_simplices = simplices.size() / (dim + 1);
+  IndexArray result({n_simplices, dim + 1});
+  std::copy(simplices.begin(), simplices.end(), result.mutable_data());
+  return result;
+}
+
+
+PYBIND11_MODULE(cgal_regular, m) {
+  m.doc() = "Regular triangulations in 2 and 3 dimensions from CGAL.";
+  m.def("regular_triangulation", &regular_triangulation,
+        py::arg("points"), py::arg("weights"),
+        "Finite simplices of the regular triangulation of weighted points.");
+}
@@ -34,63 +34,254 @@ def get_triangle_angles(vertex1, vertex2, vertex3):
     angle3 = np.arccos((a**2 + b**2 - c**2) / (2 * a * b))
     return [angle1, angle2, angle3]
 
-def compute_triangle_angles(points, vertices, triangles):
+# Row of the structured arrays of batch_triangle_angles: the vertex indices
+# of a triangle, the lengths of the edges opposite its vertices, its angles
+# at its vertices in degrees, its area, and whether it is degenerate.
+TRIANGLE_ANGLES_DTYPE = np.dtype([
+    ("triangle", np.int64, (3,)),
+    ("edge_lengths", np.float64, (3,)),
+    ("angles_deg", np.float64, (3,)),
+    ("area", np.float64),
+    ("degenerate", np.bool_),
+])
+
+
+def batch_triangle_angles(positions, triangles):
     """
-     Computes angles for 2D triangles in order-2 Delaunay mosaic.
+     Computes the angles of all triangles at once.
+     Parameters:
+         positions: (n, 2) array of vertex coordinates.
+         triangles: (m, 3) array of vertex indices.
+     Returns:
+         Structured array of m rows of TRIANGLE_ANGLES_DTYPE. Triangles
+         with an area below 1e-10, as in get_triangle_angles, are marked
+         degenerate and have nan angles.
+     """
+    positions = np.asarray(positions, dtype=np.float64)
+    triangles = np.asarray(triangles, dtype=np.int64).reshape(-1, 3)
+    result = np.empty(len(triangles), dtype=TRIANGLE_ANGLES_DTYPE)
+    result["triangle"] = triangles
+
+    corners = positions[triangles]
+    # Edge i is opposite corner i.
+    lengths = np.linalg.norm(corners[:, [2, 0, 1]] - corners[:, [1, 2, 0]],
+                             axis=2)
+    result["edge_lengths"] = lengths
+    a, b, c = lengths.T
+    # Heron's formula, with numerical errors clamped.
+    s = (a + b + c) / 2
+    area = np.sqrt(np.maximum(0, s * (s - a) * (s - b) * (s - c)))
+    result["area"] = area
+    degenerate = area < 1e-10
+    result["degenerate"] = degenerate
+
+    # Law of cosines: the angle at corner i between the other two edges.
+    squares = lengths ** 2
+    others = lengths[:, [1, 2, 0]] * lengths[:, [2, 0, 1]]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cosines = (squares[:, [1, 2, 0]] + squares[:, [2, 0, 1]] - squares) \
+            / (2 * others)
+    angles = np.degrees(np.arccos(np.clip(cosines, -1, 1)))
+    angles[degenerate] = np.nan
+    result["angles_deg"] = angles
+    return result
+
+
+def mosaic_triangle_angles(points, vertices, triangles):
+    """
+     Computes the angles of all triangles of an order-k Delaunay mosaic at
+     once, see batch_triangle_angles.
      Parameters:
          points: Input points (2D array).
-         vertices: List of vertex tuples (k-tuples of point indices).
-         simplices: List of simplices (triangles) as indices into `vertices`.
+         vertices: (n, k) array of the point indices of each vertex.
+         triangles: (m, 3) array of triangles as indices into `vertices`.
      Returns:
-         List of dictionaries with keys "simplex" and "angles_deg".
+         Structured array of TRIANGLE_ANGLES_DTYPE.
      """
+    points = np.asarray(points, dtype=np.float64)
+    vertices = np.asarray(vertices, dtype=np.int64)
+    if vertices.ndim == 1:
+        vertices = vertices[:, None]
+    # The geometric vertices are the centroids of their points.
+    positions = points[vertices].mean(axis=1)
+    return batch_triangle_angles(positions, triangles)
 
 
-    triangle_angles = []
+def complex_triangle_angles(simplicial_complex):
+    """
+     Computes the angles of all triangles of a 2D SimplicialComplex at
+     once, see batch_triangle_angles.
+     """
+    return batch_triangle_angles(simplicial_complex.positions,
+                                 simplicial_complex.faces[2])
 
-    for triangle in triangles:
 
-        # Get the tuples of original points for each vertex in the triangle
-        vertex_tuples = [vertices[i] for i in triangle]
+def _as_dicts(triangles, angles):
+    """Rows of batch_triangle_angles as dicts, without the degenerate."""
+    return [{"triangle": triangle,
+             "angles_deg": np.array([]) if degenerate else angles_deg}
+            for triangle, angles_deg, degenerate in
+            zip(triangles, angles["angles_deg"], angles["degenerate"])]
 
-        #Compute the actual geometric vertices using average
-        average1 = np.mean(points[list(vertex_tuples[0])], axis=0)
-        average2 = np.mean(points[list(vertex_tuples[1])], axis=0)
-        average3 = np.mean(points[list(vertex_tuples[2])], axis=0)
 
-        # Compute the angles of the current triangle
-        angles_rad = get_triangle_angles(average1, average2, average3)
-        angles_deg = np.degrees(angles_rad)
+def _angles_deg(triangle_angles):
+    """All angles of a structured array or list of dicts of triangles."""
+    if isinstance(triangle_angles, np.ndarray):
+        valid = ~triangle_angles["degenerate"]
+        return triangle_angles["angles_deg"][valid].ravel()
+    return np.concatenate([np.ravel(entry["angles_deg"])
+                           for entry in triangle_angles] + [np.zeros(0)])
 
-        # Store angles with its corresponding triangle
 
-        triangle_angles.append({"triangle": triangle, "angles_deg": angles_deg })
+class AngleHistogram:
+    """
+     Histogram of angles in degrees, accumulated batch by batch in fixed
+     memory.
+
+     The counts of equal-width bins over [0, 180] are kept in a
+     preallocated array, together with the exact number, sum, minimum and
+     maximum of the angles. Quantiles are estimated from the counts by
+     interpolating within bins, so they are accurate to a bin width.
+     Histograms with the same bins, e.g. computed by worker processes, can
+     be merged; they pickle as plain arrays and numbers.
+
+     Attributes:
+         edges: the bins+1 bin edges.
+         counts: int64 array of the number of angles in each bin.
+         count, total: number and sum of the angles.
+         min_angle, max_angle: smallest and largest angle, or nan.
+     """
 
-    return triangle_angles
+    def __init__(self, bins=180, angle_range=(0, 180)):
+        self.edges = np.linspace(angle_range[0], angle_range[1], bins + 1)
+        self.counts = np.zeros(bins, dtype=np.int64)
+        self.count = 0
+        self.total = 0.0
+        self.min_angle = np.nan
+        self.max_angle = np.nan
+
+    def add(self, triangle_angles):
+        """
+         Adds a batch of angles: a structured array from
+         batch_triangle_angles, whose degenerate triangles are left out, a
+         list of dicts from compute_triangle_angles, or an array of angles.
+         Returns the histogram.
+         """
+        if isinstance(triangle_angles, np.ndarray) and \
+                triangle_angles.dtype.names is None:
+            angles = triangle_angles.ravel()
+        else:
+            angles = _angles_deg(triangle_angles)
+        angles = np.asarray(angles, dtype=np.float64)
+        angles = angles[~np.isnan(angles)]
+        if len(angles) == 0:
+            return self
+        bins = len(self.counts)
+        low, high = self.edges[0], self.edges[-1]
+        # Bin of each angle, with the upper edge in the last bin as in
+        # np.histogram; angles outside the range go to the outer bins.
+        index = np.floor((angles - low) * (bins / (high - low)))
+        index = np.clip(index, 0, bins - 1).astype(np.int64)
+        self.counts += np.bincount(index, minlength=bins)
+        self.count += len(angles)
+        self.total += float(angles.sum())
+        self.min_angle = np.fmin(self.min_angle, angles.min())
+        self.max_angle = np.fmax(self.max_angle, angles.max())
+        return self
+
+    def merge(self, other):
+        """Adds the angles of another histogram with the same bins."""
+        if not np.array_equal(self.edges, other.edges):
+            raise ValueError("Cannot merge histograms with different bins.")
+        self.counts += other.counts
+        self.count += other.count
+        self.total += other.total
+        self.min_angle = np.fmin(self.min_angle, other.min_angle)
+        self.max_angle = np.fmax(self.max_angle, other.max_angle)
+        return self
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else np.nan
+
+    def quantile(self, q):
+        """
+         Estimated q-quantile(s) of the angles, for q in [0, 1].
+         """
+        q = np.asarray(q, dtype=np.float64)
+        if self.count == 0:
+            return np.full(q.shape, np.nan)
+        cumulative = np.cumsum(self.counts)
+        target = q * self.count
+        # The first bin reaching the target, and the fraction of it needed.
+        index = np.minimum(np.searchsorted(cumulative, target),
+                           len(self.counts) - 1)
+        before = cumulative[index] - self.counts[index]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            fraction = np.where(self.counts[index] > 0,
+                                (target - before) / self.counts[index], 0)
+        width = self.edges[1] - self.edges[0]
+        estimate = self.edges[index] + np.clip(fraction, 0, 1) * width
+        return np.clip(estimate, self.min_angle, self.max_angle)
+
+    def plot(self, ax, **kwargs):
+        """Draws the histogram as bars on ax, taking ax.hist arguments."""
+        return ax.hist(self.edges[:-1], bins=self.edges, weights=self.counts,
+                       **kwargs)
 
 
-def compute_triangle_angles_refinement(points, vertices, triangles):
-    triangle_angles = []
-    for triangle in triangles:
-        # Convert indices to integers
-        triangle = [int(i) for i in triangle]  # <-- Fix here
+def compute_triangle_angles(points, vertices, triangles):
+    """
+     Computes angles for 2D triangles in order-2 Delaunay mosaic.
+     Parameters:
+         points: Input points (2D array).
+         vertices: List of vertex tuples (k-tuples of point indices).
+         simplices: List of simplices (triangles) as indices into `vertices`.
+     Returns:
+         List of dictionaries with keys "simplex" and "angles_deg".
+     """
+
 
-        vertex_tuples = [vertices[i] for i in triangle]
-        average1 = np.mean(points[list(vertex_tuples[0])], axis=0)
-        average2 = np.mean(points[list(vertex_tuples[1])], axis=0)
-        average3 = np.mean(points[list(vertex_tuples[2])], axis=0)
-        angles_rad = get_triangle_angles(average1, average2, average3)
-        angles_deg = np.degrees(angles_rad)
-        triangle_angles.append({"triangle": triangle, "angles_deg": angles_deg})
-    return triangle_angles
+    triangles = list(triangles)
+    angles = mosaic_triangle_angles(
+        points, [list(v) for v in vertices], np.reshape(triangles, (-1, 3)))
+    return _as_dicts(triangles, angles)
+
+
+def compute_complex_triangle_angles(simplicial_complex):
+    """
+     Computes angles for the triangles of a 2D SimplicialComplex, such as
+     the one of an order-k Delaunay mosaic shared by Plotter2D.
+     Parameters:
+         simplicial_complex: SimplicialComplex with vertex positions.
+     Returns:
+         List of dictionaries with keys "triangle" (a sorted row of vertex
+         indices) and "angles_deg".
+     """
+    triangles = simplicial_complex.faces[2].tolist()
+    return _as_dicts(triangles, complex_triangle_angles(simplicial_complex))
+
+
+def compute_triangle_angles_refinement(points, vertices, triangles):
+    triangles = [[int(i) for i in triangle] for triangle in triangles]
+    angles = mosaic_triangle_angles(
+        points, [list(v) for v in vertices], np.reshape(triangles, (-1, 3)))
+    return _as_dicts(triangles, angles)
 
 
 def refinement_histogram(triangle_angles, ax, bins=180, color='skyblue'):
-    all_angles = []
-    for entry in triangle_angles:
-        all_angles.extend(entry["angles_deg"])
+    """
+    Draws the histogram of triangle angles of one refinement step on ax.
+
+    triangle_angles is an AngleHistogram, or anything AngleHistogram.add
+    takes; the angles are then binned into `bins` bins over [0, 180].
+    """
+    if isinstance(triangle_angles, AngleHistogram):
+        histogram = triangle_angles
+    else:
+        histogram = AngleHistogram(bins).add(triangle_angles)
 
-    ax.hist(all_angles, bins=bins, edgecolor='k', color=color, alpha=0.7)
+    histogram.plot(ax, edgecolor='k', color=color, alpha=0.7)
     ax.set_xlabel("Angle (degrees)", fontsize=10)
     ax.set_ylabel("Frequency", fontsize=10)
     ax.set_title("Triangle Angles", fontsize=12)
@@ -106,18 +297,22 @@ def plot_angle_histogram(triangle_angles, bins=50, color='skyblue'):
     Plots a histogram of triangle angles (in degrees).
 
     Parameters:
-        triangle_angles: Output from compute_triangle_angles.
-        bins: Number of histogram bins (default: 18 for 10-degree increments).
+        triangle_angles: Output from compute_triangle_angles, a
+            structured array from batch_triangle_angles, or an
+            AngleHistogram.
+        bins: Number of histogram bins over [0, 180], unless
+            triangle_angles is an AngleHistogram.
         color: Color of the histogram bars.
     """
-    # Extract all angles into a single list
-    all_angles = []
-    for entry in triangle_angles:
-        all_angles.extend(entry["angles_deg"])
+    # Bin the angles without collecting them in a list.
+    if isinstance(triangle_angles, AngleHistogram):
+        histogram = triangle_angles
+    else:
+        histogram = AngleHistogram(bins).add(triangle_angles)
 
     # Plot histogram
     plt.figure(figsize=(15, 6))
-    plt.hist(all_angles, bins=bins, edgecolor='black', color=color)
+    histogram.plot(plt.gca(), edgecolor='black', color=color)
 
     # Add labels and title
     plt.xlabel("Angle (degrees)", fontsize=12)
@@ -0,0 +1,85 @@
+'''Persistent cohomology of the filtration of a simplicial complex.
+
+The persistence pairs of a filtration can be computed by reducing the
+coboundary matrix instead of the boundary matrix, which gives the same
+pairs. This module reduces the coboundary matrix that a SimplicialComplex
+already stores as its coface arrays (in compressed sparse row form, for
+every dimension), translated to filtration indices one dimension at a
+time, instead of building a boundary matrix for PHAT. For each pivot only
+the list of faces whose coboundaries add up to the reduced column is kept,
+rather than the reduced column itself. Going up in dimension, the faces that a pair
+of the dimension below has as pivot are known to reduce to zero and are
+skipped ("clearing", also known as the twist optimization), and a column
+whose pivot is still free is paired at once without any reduction.
+'''
+import numpy as np
+
+
+def cohomology_persistence_pairs(scomplex, sorted_cells):
+    '''
+    Persistence pairs of a filtration of a SimplicialComplex, by reducing
+    the coboundary matrix with clearing.
+
+    Args:
+        scomplex: SimplicialComplex.
+        sorted_cells: permutation of the indices of all faces, numbered
+            dimension by dimension as in the concatenation of
+            scomplex.faces, in which each face comes after its faces.
+
+    Returns:
+        Sorted list of the (birth, death) pairs of indices into
+        sorted_cells, as computed by PHAT from the boundary matrix.
+    '''
+    sizes = [len(f) for f in scomplex.faces]
+    starts = np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64)
+    n_cells = int(starts[-1])
+    sorted_cells = np.asarray(sorted_cells, dtype=np.int64)
+    # Index of each face in the filtration.
+    rank = np.empty(n_cells, dtype=np.int64)
+    rank[sorted_cells] = np.arange(n_cells)
+
+    pairs = []
+    # The p-faces that are the death of a pair of dimension p-1.
+    cleared = np.zeros(0, dtype=bool)
+    for p in range(scomplex.dimension):
+        face_rank = rank[starts[p]:starts[p + 1]]
+        # Coboundaries as filtration indices of (p+1)-faces.
+        coface_rank = rank[starts[p + 1] + scomplex.cofaces[p]]
+        offsets = scomplex.coface_offsets[p]
+
+        def coboundary(face):
+            return coface_rank[offsets[face]:offsets[face + 1]].tolist()
+
+        # The faces of each pivot with the reduced column of that pivot as
+        # sum of their coboundaries.
+        reductions = dict()
+        next_cleared = np.zeros(sizes[p + 1], dtype=bool)
+        # Reducing the anti-transposed boundary matrix from left to right
+        # means going through the faces in reverse filtration order, with
+        # the first coface in the filtration as pivot.
+        for face in np.argsort(face_rank)[::-1].tolist():
+            if len(cleared) and cleared[face]:
+                continue
+            column = set(coboundary(face))
+            if not column:
+                continue
+            pivot = min(column)
+            if pivot in reductions:
+                faces = {face}
+                while pivot in reductions:
+                    for other in reductions[pivot]:
+                        column.symmetric_difference_update(coboundary(other))
+                    faces.symmetric_difference_update(reductions[pivot])
+                    if not column:
+                        break
+                    pivot = min(column)
+                if not column:
+                    continue
+                reductions[pivot] = tuple(faces)
+            else:
+                reductions[pivot] = (face,)
+            pairs.append((int(face_rank[face]), pivot))
+            next_cleared[sorted_cells[pivot] - starts[p + 1]] = True
+        cleared = next_cleared
+    pairs.sort()
+    return pairs
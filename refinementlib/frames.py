@@ -0,0 +1,73 @@
+'''Rendering of animation frames to PNG data URIs in worker processes.
+
+The animations sent through the animate endpoint are lists of frames, each a
+matplotlib figure saved as PNG and encoded as a data URI. Once the data of
+the frames is known they are independent of each other, so render_frames
+hands runs of consecutive frames to a pool of worker processes and yields
+the data URIs in frame order as the runs are done. A run is rendered by a
+single call, which lets it reuse work from one frame for the next, such as
+the mosaics of the previous refinement step.
+'''
+import base64
+import concurrent.futures
+import functools
+import io
+import os
+
+import matplotlib
+matplotlib.use('Agg')  # non-interactive, no Qt required
+import matplotlib.pyplot as plt
+
+
+def png_data_uri(fig, dpi=None):
+    '''The figure as a PNG data URI, closing it.'''
+    buf = io.BytesIO()  # png of figure to mem
+    fig.savefig(buf, format='png', dpi=dpi)
+    plt.close(fig)
+    return ('data:image/png;base64,'
+            + base64.b64encode(buf.getvalue()).decode('ascii'))
+
+
+def render_frames(render, items, processes=None, chunk_size=None,
+                  **options):
+    '''
+    Generate the data URIs of the frames of items, in order.
+
+    Args:
+        render: module-level generator function taking a list of
+            consecutive items and the options as keyword arguments, and
+            yielding the data URI of the frame of each item. It is pickled
+            to the worker processes, as are the items and the options.
+        items: the data of each frame.
+        processes: number of worker processes (default: cpu count). With 1,
+            all frames are rendered by one call of render in this process.
+        chunk_size: number of consecutive items rendered by one call of
+            render in a worker (default: about a quarter of the items per
+            process).
+        options: keyword arguments passed on to render.
+    '''
+    items = list(items)
+    if not items:
+        return
+    if processes is None:
+        processes = os.cpu_count()
+    if processes == 1:
+        yield from render(items, **options)
+        return
+    if chunk_size is None:
+        chunk_size = max(1, -(-len(items) // (4 * processes)))
+    chunks = [items[i:i + chunk_size]
+              for i in range(0, len(items), chunk_size)]
+    with concurrent.futures.ProcessPoolExecutor(processes) as pool:
+        try:
+            for frames in pool.map(functools.partial(_render_list, render,
+                                                     **options), chunks):
+                yield from frames
+        finally:
+            # Do not render the rest if the caller stops early.
+            pool.shutdown(cancel_futures=True)
+
+
+def _render_list(render, items, **options):
+    '''The data URIs of render as a list, to send back from a worker.'''
+    return list(render(items, **options))
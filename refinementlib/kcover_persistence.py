@@ -1,22 +1,29 @@
+import concurrent.futures
 import itertools
 import numpy as np
-import phat
+import os
 import scipy.spatial
-from miniball import miniball
+import tempfile
+from multiprocessing import shared_memory
+from cohomology import cohomology_persistence_pairs
+from miniball import batched
 from orderk_delaunay import OrderKDelaunay
+from simplicial_complex import SimplicialComplex
 
 '''
 Algorithm to compute persistence of the k-fold cover for a given point set.
 
 Outline:
 - Compute order-k Delaunay triangulation (top-dimensional simplices)
-- Make dict of all simplices (any dimension), containing:
-      co-faces and dimension
+- Make arrays of all simplices (any dimension) and, for each simplex,
+      the vertices completing it to a co-face
 - Compute filtration value for all simplices using miniball variant
-      (This needs the coface information)
+      (This needs the coface information), optionally in parallel
 - Sort somplices by dimension and filtration value
-- Assign indices to each simplex and make boundary matrix
-- invoke phat to compute persistence
+- Assign indices to each simplex and make boundary matrix from the
+      arrays of faces
+- invoke phat to compute persistence, or reduce the coboundary matrix
+      given by the coface arrays (see cohomology.py)
 '''
 
 
@@ -30,6 +37,8 @@ class CellInfo:
         dimension: dimension of the cell.
         bdmx_index: Index of the cell in the boundary matrix.
     '''
+    # There is one instance per cell, so leave out the instance dict.
+    __slots__ = ('coface_vxs', 'radius', 'dimension', 'bdmx_index')
 
     def __init__(self, coface_vxs, radius, dimension, bdmx_index):
         self.coface_vxs = coface_vxs
@@ -38,19 +47,285 @@ class CellInfo:
         self.bdmx_index = bdmx_index
 
 
-def kcover_persistence(points, order):
+class SharedArrays:
+    '''
+    Arrays copied once into shared memory, so that worker processes can map
+    them without copying.
+
+    Attributes:
+        specs: dictionary mapping the name of each array to the
+               (shared memory name, shape, dtype) triple that
+               attach_shared_arrays takes to map it.
+    '''
+
+    def __init__(self, arrays):
+        '''
+        Args:
+            arrays: dictionary mapping names to numpy arrays.
+        '''
+        self.specs = dict()
+        self._blocks = []
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            block = shared_memory.SharedMemory(
+                  create=True, size=max(array.nbytes, 1))
+            self._blocks.append(block)
+            np.ndarray(array.shape, array.dtype, buffer=block.buf)[...] = array
+            self.specs[name] = (block.name, array.shape, array.dtype.str)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        '''Release the shared memory.'''
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._blocks = []
+
+
+# Shared memory blocks mapped by this (worker) process, by name.
+_attached_blocks = dict()
+
+
+def attach_shared_arrays(specs):
+    '''Map the arrays of a SharedArrays instance given its specs.'''
+    arrays = dict()
+    for name, (block_name, shape, dtype) in specs.items():
+        if block_name not in _attached_blocks:
+            _attached_blocks[block_name] = shared_memory.SharedMemory(
+                  name=block_name)
+        arrays[name] = np.ndarray(shape, dtype,
+                                  buffer=_attached_blocks[block_name].buf)
+    return arrays
+
+
+def filtration_values(points, point_sets, faces, coface_vertices,
+                      coface_offsets, start=0, stop=None, cache=None):
+    '''
+    Compute the filtration values of faces[start:stop] of one dimension.
+
+    The filtration value of a simplex is the radius of the smallest sphere
+    having the points shared by all its vertices inside (or on) it, the
+    other points of its vertices on it, and the points of the vertices of
+    its co-faces outside (or on) it.
+
+    Args:
+        points: (n, d) array of the input points.
+        point_sets: (n_vertices, k) array of the points of each vertex.
+        faces, coface_vertices, coface_offsets: the faces of one dimension
+            and their co-face vertices, see SimplicialComplex.
+        start, stop: range of the faces to compute the values of.
+        cache: optional miniball.memo.MiniballCache for the points, which
+            can be shared by calls for several dimensions and orders.
+
+    Returns:
+        Array of the filtration values.
+    '''
+    if stop is None:
+        stop = len(faces)
+    offsets = coface_offsets[start:stop + 1].tolist()
+    pins, pons, pouts = [], [], []
+    for i, simplex in enumerate(faces[start:stop].tolist()):
+        ktuples = point_sets[simplex].tolist()
+        # flatten the simplex (i.e. the list of ktuples of points):
+        # We just take all the ktuples and put them in a single list.
+        flattened = itertools.chain.from_iterable(ktuples)
+        # set of points in or on the sphere
+        pinon = set(flattened)
+        # set of points in (possibly on) the sphere are those
+        # that appear in every vertex of our simplex
+        pin = pinon.intersection(*ktuples)
+        # Those that don't appear in every vertex have to be ON the
+        # sphere, not inside.
+        pon = pinon - pin
+        # flatten the list of vertices (i.e. point ktuples) that are
+        # part of co-faces of our simplex
+        flattened = itertools.chain.from_iterable(point_sets[
+              coface_vertices[offsets[i]:offsets[i + 1]]].tolist())
+        # These are the points that must be outside (or on) the sphere
+        pout = set(flattened) - pinon
+        pins.append(list(pin))
+        pons.append(list(pon))
+        pouts.append(list(pout))
+
+    _, radii = batched.miniexonballs(points, pins, pons, pouts, cache)
+    return radii
+
+
+def _shared_filtration_values(specs, p, start, stop):
+    '''filtration_values of p-faces in shared memory, run by workers.'''
+    arrays = attach_shared_arrays(specs)
+    return filtration_values(
+          arrays['points'], arrays['point_sets'], arrays['faces_%d' % p],
+          arrays['coface_vertices_%d' % p], arrays['coface_offsets_%d' % p],
+          start, stop)
+
+
+def parallel_filtration_values(points, scomplex, processes=None,
+                               chunk_size=None):
+    '''
+    Compute the filtration values of all faces of a SimplicialComplex in
+    a pool of worker processes.
+
+    The points and the complex are copied once into shared memory, and the
+    faces are processed in chunks. Each value is computed as by
+    filtration_values, so the results are identical to the serial ones.
+
+    Args:
+        points: (n, d) array of the input points.
+        scomplex: SimplicialComplex of an order-k mosaic.
+        processes: number of worker processes (default: cpu count).
+        chunk_size: number of faces per task (default: such that there
+                    are about 4 tasks per process).
+
+    Returns:
+        List of arrays, the filtration values of the faces of each
+        dimension.
+    '''
+    if processes is None:
+        processes = os.cpu_count()
+    if chunk_size is None:
+        chunk_size = max(64, len(scomplex) // (4 * processes))
+    arrays = {'points': points, 'point_sets': scomplex.point_sets}
+    for p in range(scomplex.dimension + 1):
+        arrays['faces_%d' % p] = scomplex.faces[p]
+        arrays['coface_vertices_%d' % p] = scomplex.coface_vertices[p]
+        arrays['coface_offsets_%d' % p] = scomplex.coface_offsets[p]
+
+    with SharedArrays(arrays) as shared, \
+          concurrent.futures.ProcessPoolExecutor(processes) as pool:
+        futures = []
+        for p in range(scomplex.dimension + 1):
+            n_faces = len(scomplex.faces[p])
+            futures.append([pool.submit(_shared_filtration_values,
+                                        shared.specs, p, start,
+                                        min(start + chunk_size, n_faces))
+                            for start in range(0, n_faces, chunk_size)])
+        # Collect the chunks in order.
+        return [np.concatenate([np.empty(0)] + [f.result() for f in chunks])
+                for chunks in futures]
+
+
+def boundary_matrix_data(scomplex, sorted_cells):
+    '''
+    The boundary matrix of a SimplicialComplex with its faces in the given
+    order, in the binary format that PHAT loads.
+
+    The format is a flat int64 array holding the number of columns and
+    then, for each column, its dimension, its number of entries and its
+    entries in increasing order. It is built from the boundary arrays of
+    the complex without visiting the faces one by one.
+
+    Args:
+        scomplex: SimplicialComplex.
+        sorted_cells: permutation of the indices of all faces, numbered
+            dimension by dimension as in the concatenation of
+            scomplex.faces, in which each face comes after its faces.
+
+    Returns:
+        The int64 array.
+    '''
+    sizes = [len(f) for f in scomplex.faces]
+    starts = np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64)
+    n_cells = int(starts[-1])
+    sorted_cells = np.asarray(sorted_cells, dtype=np.int64)
+    # Index of each face in the boundary matrix.
+    rank = np.empty(n_cells, dtype=np.int64)
+    rank[sorted_cells] = np.arange(n_cells)
+    dimensions = np.repeat(np.arange(len(sizes)), sizes)[sorted_cells]
+    # Two header entries, and p+1 faces for p-faces other than vertices.
+    lengths = 2 + np.where(dimensions > 0, dimensions + 1, 0)
+    offsets = 1 + np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    data = np.empty(1 + int(lengths.sum()), dtype=np.int64)
+    data[0] = n_cells
+    data[offsets] = dimensions
+    data[offsets + 1] = lengths - 2
+    for p in range(1, len(sizes)):
+        columns = np.sort(rank[starts[p - 1] + scomplex.boundaries[p]],
+                          axis=1)
+        positions = offsets[rank[starts[p]:starts[p + 1]]] + 2
+        data[positions[:, None] + np.arange(p + 1)] = columns
+    return data
+
+
+def load_boundary_matrix(data, representation='vector_vector'):
+    '''
+    A phat.boundary_matrix loaded from the output of boundary_matrix_data.
+
+    Args:
+        data: int64 array in the binary format of PHAT.
+        representation: a phat.representations member or its name.
+    '''
+    phat = _phat()
+    boundary_matrix = phat.boundary_matrix(
+          representation=_phat_option(phat.representations, representation))
+    fd, path = tempfile.mkstemp(suffix='.bin')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.ascontiguousarray(data, dtype=np.int64).tofile(f)
+        if not boundary_matrix.load(path, mode='b'):
+            raise IOError("PHAT could not load the boundary matrix.")
+    finally:
+        os.remove(path)
+    return boundary_matrix
+
+
+def _phat():
+    '''The phat module, needed by the 'phat' engine.'''
+    try:
+        import phat
+    except ImportError as error:
+        raise ImportError(
+              "the 'phat' engine needs the phat package; the 'cohomology' "
+              "engine does not") from error
+    return phat
+
+
+def _phat_option(options, value):
+    '''Member of a phat enumeration, given as such or by its name.'''
+    if not isinstance(value, str):
+        return value
+    try:
+        return getattr(options, value)
+    except AttributeError:
+        raise ValueError("Unknown PHAT option '{}'.".format(value))
+
+
+def kcover_persistence(points, order, processes=1, cache=None,
+                       representation='vector_vector',
+                       reduction='twist_reduction', engine='phat'):
     '''
     Compute persistence of the k-fold cover of balls for a set of points
-    in 2D or 3D.
+    in any dimension.
 
     Args:
         points: list of points
         order: order k of the k-fold cover with respect to which 
                to compute persistence
+        processes: number of processes to compute the filtration values in;
+                   None for the cpu count. With more than one, see
+                   parallel_filtration_values.
+        cache: optional miniball.memo.MiniballCache, used when processes
+               is 1 to solve each (pin, pon, pout) problem once. Its
+               hit_rate tells how many were shared between simplices.
+        representation: the phat.representations member, or its name,
+               to store the boundary matrix in.
+        reduction: the phat.reductions member, or its name, to compute
+               persistence with.
+        engine: 'phat' to reduce the boundary matrix with PHAT, or
+               'cohomology' to reduce the coboundary matrix given by the
+               coface arrays of the SimplicialComplex, see cohomology.py.
+               Both give the same pairs; the latter needs no PHAT.
 
     Returns:
         ppairs:
-            List of persistence pairs.
+            List of persistence pairs, sorted. A phat.persistence_pairs
+            with the 'phat' engine, a list of (birth, death) tuples with
+            the 'cohomology' engine.
         filtration:
             Dictionary mapping each simplex of the triangulated order-k
             Delaunay triangulation to a CellInfo struct.
@@ -60,146 +335,144 @@ def kcover_persistence(points, order):
     '''
 
 
-    # Dimension of the ambient space.
-    dimension = len(points[0])
+    if engine not in ('phat', 'cohomology'):
+        raise ValueError("Unknown persistence engine '{}'.".format(engine))
+
+    points = np.asarray(points, dtype=float)
 
     # Compute order-k Delaunay triangulation
     okdel = OrderKDelaunay(points, order)
-    ktuples_allk = okdel.diagrams_vertices
-    simplices_allk = okdel.diagrams_simplices
-    # Vertex set (represented as k-tuples of input points)
-    ktuples = ktuples_allk[order-1]
-    # Top-dimensional simplices.
-    # Simplices are tuples of indices into the vertex set.
-    simplices = simplices_allk[order-1]
-
-
-    # From top-dimensional cells in decreasing dimension down to vertices,
-    # make a dictionary mapping each cell (as tuple of its vertices) to
-    # a CellInfo instance containing its co-face vertices, filtration value,
-    # dimension and index in the boundary matrix.
-    filtration_topdimcells = dict()
-    simplices = [tuple(simplex) for simplex in simplices]
-    for simplex in simplices:
-        filtration_topdimcells[simplex] = CellInfo([], -1, dimension, -1)
-
-    if dimension == 2:
-        filtration_faces = filtration_topdimcells
-
-        # We don't have tetrahedra in 2D, so this stays empty.
-        filtration_tetras = dict()
-
-    elif dimension == 3:
-        filtration_tetras = filtration_topdimcells
-
-        filtration_faces = dict()
-        for tetr in filtration_tetras:
-            # Selection of three vertices.
-            # The first three entries are the vertices making the face. The last
-            # one is the vertex together with which the face makes a co-face
-            for sel in [[0, 1, 2, 3], [0, 1, 3, 2], [0, 2, 3, 1], [1, 2, 3, 0]]:
-                # get the face consisting of three vertices
-                face = (tetr[sel[0]], tetr[sel[1]], tetr[sel[2]])
-                # add the fourth (missing) vertex to its dictionary entry
-                # together with this vertex we get a co-face
-                # (which is our tetr that we started with)
-                if face in filtration_faces.keys():
-                    filtration_faces[face].coface_vxs.append(tetr[sel[3]])
-                else:
-                    filtration_faces[face] = CellInfo([tetr[sel[3]]], -1, 2, -1)
-
-    filtration_edges = dict()
-    for face in filtration_faces:
-        # Selection of two vertices.
-        for sel in [[0, 1, 2], [0, 2, 1], [1, 2, 0]]:
-            # get the edge consisting of two vertices
-            edge = (face[sel[0]], face[sel[1]])
-            # add the third (missing) vertex to its dictionary entry
-            # together with this vertex we get a co-face
-            # (which is our face that we started with)
-            if edge in filtration_edges.keys():
-                filtration_edges[edge].coface_vxs.append(face[sel[2]])
-            else:
-                filtration_edges[edge] = CellInfo([face[sel[2]]], -1, 1, -1)
-
-    filtration_vxs = dict()
-    for edge in filtration_edges:
-        for sel in [[0, 1], [1, 0]]:
-            vertex = (edge[sel[0]], )
-            if vertex in filtration_vxs:
-                filtration_vxs[vertex].coface_vxs.append(edge[sel[1]])
-            else:
-                filtration_vxs[vertex] = CellInfo([edge[sel[1]]], -1, 0, -1)
-
-    # Merge cells of all dimensions into a single new dict.
-    filtration = dict()
-    filtration.update(filtration_tetras)
-    filtration.update(filtration_faces)
-    filtration.update(filtration_edges)
-    filtration.update(filtration_vxs)
 
 
-    # Compute the radius values for each simplex
-    for simplex in filtration:
-        # flatten the simplex (i.e. the list of ktuples of points):
-        # We just take all the ktuples and put them in a single list.
-        flattened = itertools.chain.from_iterable([ktuples[i] for i in simplex])
-        # set of points in or on the sphere
-        pinon = set(flattened)
-        # set of points in (possibly on) the sphere are those
-        # that appear in every vertex of our simplex
-        pin = pinon.intersection(*[ktuples[i] for i in simplex])
-        # Those that don't appear in every vertex have to be ON the sphere,
-        # not inside.
-        pon = pinon - pin
-        # flatten the list of vertices (i.e. point ktuples) that are
-        # part of co-faces of our simplex
-        flattened = itertools.chain.from_iterable(
-              [ktuples[i] for i in filtration[simplex].coface_vxs])
-        # These are the points that must be outside (or on) the sphere
-        pout = set(flattened) - pinon
+    # Make all cells of dimension 0 up to the dimension of the space from
+    # the top-dimensional simplices, each as a sorted row of its vertices,
+    # together with their co-face vertices.
+    scomplex = SimplicialComplex.from_orderk_delaunay(okdel, order)
+    return complex_persistence(points, scomplex, processes, cache,
+                               representation, reduction, engine)
+
+
+def kcover_persistence_orders(points, max_order, processes=None, cache=None,
+                              representation='vector_vector',
+                              reduction='twist_reduction', engine='phat'):
+    '''
+    Compute persistence of the k-fold covers of balls for all orders k
+    from 1 to max_order.
 
-        cc, cr = miniball.miniexonball(
-              [points[i] for i in pin], 
-              [points[i] for i in pon], 
-              [points[i] for i in pout])
-        # Assign the filtration value.
-        filtration[simplex].radius = cr
+    The order-k Delaunay mosaics of all orders are computed once, rather
+    than once per order as by calling kcover_persistence for each k, and
+    the orders are handled by a pool of worker processes, the highest
+    orders, which take longest, first.
+
+    Args:
+        points: list of points
+        max_order: highest order k to compute persistence for
+        processes: number of worker processes (default: cpu count). With
+                   one, the orders are handled one after the other.
+        cache, representation, reduction, engine: see kcover_persistence.
+               The cache is shared between the orders, and only used with
+               one process.
+
+    Returns:
+        Dictionary mapping each order k to the (ppairs, filtration,
+        filtration_sorted) triple of kcover_persistence(points, k). Here,
+        ppairs is always a sorted list of (birth, death) tuples.
+    '''
+    if engine not in ('phat', 'cohomology'):
+        raise ValueError("Unknown persistence engine '{}'.".format(engine))
+    points = np.asarray(points, dtype=float)
+    okdel = OrderKDelaunay(points, max_order, compact=True)
+    orders = range(max_order, 0, -1)
+    complexes = [SimplicialComplex.from_orderk_delaunay(okdel, order)
+                 for order in orders]
+    arguments = (representation, reduction, engine)
+    if processes is None:
+        processes = os.cpu_count()
+    if processes == 1:
+        results = [_complex_persistence_pairs(points, scomplex, cache,
+                                              *arguments)
+                   for scomplex in complexes]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(processes) as pool:
+            futures = [pool.submit(_complex_persistence_pairs, points,
+                                   scomplex, None, *arguments)
+                       for scomplex in complexes]
+            results = [f.result() for f in futures]
+    return dict(zip(orders, results))
+
+
+def _complex_persistence_pairs(points, scomplex, cache, representation,
+                               reduction, engine):
+    '''complex_persistence with the pairs as a list, run by workers.'''
+    ppairs, filtration, filtration_sorted = complex_persistence(
+          points, scomplex, 1, cache, representation, reduction, engine)
+    return ([tuple(pair) for pair in ppairs], filtration,
+            filtration_sorted)
+
+
+def complex_persistence(points, scomplex, processes=1, cache=None,
+                        representation='vector_vector',
+                        reduction='twist_reduction', engine='phat'):
+    '''
+    Compute persistence of the filtration of the triangulation of an
+    order-k mosaic of points, given as SimplicialComplex.
+
+    Args and returned values are as for kcover_persistence, which computes
+    the mosaic and calls this.
+    '''
+    # Dimension of the ambient space.
+    dimension = points.shape[1]
+    faces = scomplex.faces
+    coface_vertices = scomplex.coface_vertices
+    coface_offsets = scomplex.coface_offsets
+
+
+    # Compute the radius values for each simplex
+    if processes == 1:
+        radii = [filtration_values(points, scomplex.point_sets, faces[p],
+                                   coface_vertices[p], coface_offsets[p],
+                                   cache=cache)
+                 for p in range(dimension + 1)]
+    else:
+        radii = parallel_filtration_values(points, scomplex, processes)
 
 
     # Sort by dimension, then by filtration value as tiebreaker.
     # This ensures a cell will always appear after its faces,
     # even in case of rounding errors.
-    filtration_sorted = sorted(filtration.items(),
-          key=lambda x: (x[1].dimension, x[1].radius))
+    dimensions = np.concatenate([np.full(len(faces[p]), p)
+                                 for p in range(dimension + 1)])
+    sorted_cells = np.lexsort((np.concatenate(radii), dimensions))
 
-    # Assign each simplex its index in the list.
-    # Note: Because the list of data appears both in the dictionary and
-    # the sorted version as a pointers, changing its content in the sorted
-    # version is sufficient to also change the content in the dict
-    for i in range(len(filtration_sorted)):
-        filtration_sorted[i][1].bdmx_index = i
+    # Compute persistence from the arrays alone, before the per-cell
+    # objects below exist, so that the two are never in memory together.
+    if engine == 'cohomology':
+        ppairs = cohomology_persistence_pairs(scomplex, sorted_cells)
+    else:
+        # Make boundary matrix of the complex straight from the face
+        # arrays and compute persistence using phat.
+        boundary_matrix = load_boundary_matrix(
+              boundary_matrix_data(scomplex, sorted_cells), representation)
+        ppairs = boundary_matrix.compute_persistence_pairs(
+              reduction=_phat_option(_phat().reductions, reduction))
+        del boundary_matrix
+        ppairs.sort()
 
-    # Make boundary matrix of the complex.
-    boundary_matrix = phat.boundary_matrix(
-          representation = phat.representations.vector_vector)
-    bdmx = []
-    for simplex in filtration_sorted:
-        dim = simplex[1].dimension
-        if dim == 0:
-            # If it's a vertex, it doesn't have a boundary
-            bd = []
-        else:
-            # For each face, select all but 1 point.
-            # Look up the index in the filtration dictionary and 
-            # put the list of these indices as boundary.
-            bd = [filtration[i].bdmx_index for i in 
-                  itertools.combinations(simplex[0], dim)]
-        bdmx.append((dim, sorted(bd)))
-    boundary_matrix.columns = bdmx
-
-    # Compute persistence using phat
-    ppairs = boundary_matrix.compute_persistence_pairs()
-    ppairs.sort()
+    # Make the list of the cells in sorted order, each (as tuple of its
+    # vertices) with a CellInfo instance containing its co-face vertices,
+    # filtration value, dimension and index in the boundary matrix, and a
+    # dictionary mapping each cell to the same CellInfo.
+    ranks = np.empty(len(sorted_cells), dtype=np.int64)
+    ranks[sorted_cells] = np.arange(len(sorted_cells))
+    starts = np.concatenate([[0], np.cumsum([len(f) for f in faces])])
+    filtration_sorted = [None] * len(sorted_cells)
+    for p in range(dimension + 1):
+        offsets = coface_offsets[p].tolist()
+        indices = ranks[starts[p]:starts[p + 1]].tolist()
+        for i, (cell, index) in enumerate(zip(faces[p].tolist(), indices)):
+            filtration_sorted[index] = (tuple(cell), CellInfo(
+                  coface_vertices[p][offsets[i]:offsets[i + 1]],
+                  radii[p][i], p, index))
+    filtration = dict(filtration_sorted)
 
     return ppairs, filtration, filtration_sorted
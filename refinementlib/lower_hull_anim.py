@@ -2,8 +2,11 @@ import numpy as np
 import matplotlib.pyplot as plt
 from mpl_toolkits.mplot3d import art3d
 from scipy.spatial import ConvexHull, Delaunay
-import io
-import base64
+
+from rhomboidtiling_convex_collective.refinementlib.frames import (
+    png_data_uri,
+    render_frames
+)
 
 def set_axes_equal(ax):
     """Make 3D axes have equal scale."""
@@ -21,7 +24,20 @@ def set_axes_equal(ax):
     ax.set_ylim3d(y_mid - max_range/2, y_mid + max_range/2)
     ax.set_zlim3d(z_mid - max_range/2, z_mid + max_range/2)
 
-def generate_convex_hull_animation(points=None, num_points=20, seed=42):
+def generate_convex_hull_animation(points=None, num_points=20, seed=42,
+                                   processes=None, figsize=(16, 8), dpi=100):
+    return list(iter_convex_hull_animation(points, num_points, seed,
+                                           processes, figsize, dpi))
+
+def iter_convex_hull_animation(points=None, num_points=20, seed=42,
+                               processes=None, figsize=(16, 8), dpi=100,
+                               chunk_size=None):
+    """Generate the data URIs of the frames of the animation in order
+
+    The frames are rendered in parallel by a pool of worker processes
+    (processes, default: cpu count), see render_frames. figsize (in inches)
+    and dpi set the size of the frames.
+    """
     if points is None:
         np.random.seed(seed)
         points = np.random.rand(num_points, 2)
@@ -36,11 +52,17 @@ def generate_convex_hull_animation(points=None, num_points=20, seed=42):
     pts2_sorted = points[idx]
     pts3_sorted = pts3[idx]
 
-    frames = []
     total = len(pts2_sorted)
 
-    for i in range(3, total + 1):
-        fig = plt.figure(figsize=(16, 8))
+    return render_frames(_convex_hull_frames, range(3, total + 1), processes,
+                         chunk_size, points=points, pts2_sorted=pts2_sorted,
+                         pts3_sorted=pts3_sorted, figsize=figsize, dpi=dpi)
+
+def _convex_hull_frames(counts, points, pts2_sorted, pts3_sorted, figsize,
+                        dpi):
+    """Generate the data URIs of the frames showing the first i points"""
+    for i in counts:
+        fig = plt.figure(figsize=figsize)
         ax1 = fig.add_subplot(121)
         ax2 = fig.add_subplot(122, projection='3d')
 
@@ -109,11 +131,4 @@ def generate_convex_hull_animation(points=None, num_points=20, seed=42):
 
         plt.tight_layout()
 
-        buf = io.BytesIO()
-        fig.savefig(buf, format='png', dpi=100)
-        plt.close(fig)
-        buf.seek(0)
-        frames.append('data:image/png;base64,' +
-                      base64.b64encode(buf.read()).decode())
-
-    return frames
\ No newline at end of file
+        yield png_data_uri(fig, dpi)
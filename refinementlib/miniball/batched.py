@@ -0,0 +1,199 @@
+import itertools
+import numpy as np
+
+from . import welzl
+from .miniball_2d import EPS
+
+"""
+Vectorized circumspheres and ball constraint checks for many groups of
+points at once.
+
+The functions take m groups of j points each as an (m, j, d) array and
+process all groups in a single call, in any dimension d. Circumspheres of
+up to 3 points, and of 4 points in 3D, use closed-form expressions; other
+group sizes solve the linear system of the group in one batched call.
+miniexonballs builds on these to solve many constrained smallest ball
+problems at once.
+"""
+
+
+def circumspheres(groups):
+    '''Circumspheres of m groups of j points in d dimensions.
+
+    The circumsphere of a group is the smallest sphere having all its
+    points on its surface; its center lies in the affine hull of the group.
+
+    Args:
+        groups: (m, j, d) array of the points, with 1 <= j <= d+1.
+
+    Returns:
+        (m, d) array of the circumcenters and (m,) array of the
+        circumradii. Both are nan for groups whose points are not
+        affinely independent.
+    '''
+    groups = np.asarray(groups, dtype=float)
+    m, j, d = groups.shape
+    if not 1 <= j <= d + 1:
+        raise ValueError("Can't have {}D-circumsphere of {} points."
+                         .format(d, j))
+    # Circumcenters relative to the first point of each group.
+    origin = groups[:, 0]
+    edges = groups[:, 1:] - origin[:, None]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if j == 1:
+            centers = np.zeros((m, d))
+        elif j == 2:
+            centers = edges[:, 0] / 2.0
+        elif j == 3:
+            u = edges[:, 0]
+            v = edges[:, 1]
+            uu = np.einsum('ij,ij->i', u, u)
+            vv = np.einsum('ij,ij->i', v, v)
+            uv = np.einsum('ij,ij->i', u, v)
+            denominator = 2.0 * (uu * vv - uv * uv)
+            centers = ((vv * (uu - uv) / denominator)[:, None] * u +
+                       (uu * (vv - uv) / denominator)[:, None] * v)
+        elif j == 4 and d == 3:
+            u = edges[:, 0]
+            v = edges[:, 1]
+            w = edges[:, 2]
+            vw = np.cross(v, w)
+            denominator = 2.0 * np.einsum('ij,ij->i', u, vw)
+            centers = (np.einsum('ij,ij->i', u, u)[:, None] * vw +
+                       np.einsum('ij,ij->i', v, v)[:, None] * np.cross(w, u) +
+                       np.einsum('ij,ij->i', w, w)[:, None] * np.cross(u, v)
+                       ) / denominator[:, None]
+        else:
+            centers = _solve_circumcenters(edges)
+    radii = np.sqrt(np.einsum('ij,ij->i', centers, centers))
+    degenerate = ~np.isfinite(radii)
+    centers = centers + origin
+    centers[degenerate] = np.nan
+    radii[degenerate] = np.nan
+    return centers, radii
+
+
+def _solve_circumcenters(edges):
+    '''
+    Circumcenters of groups given by the (m, j-1, d) edge vectors from
+    their first point, relative to that point.
+
+    The circumcenter is the combination x of the edges with
+    edges_i . x = |edges_i|^2 / 2 for all i, which is a (j-1)x(j-1)
+    system in the Gram matrix of the edges.
+    '''
+    gram = edges @ edges.transpose(0, 2, 1)
+    rhs = np.diagonal(gram, axis1=1, axis2=2) / 2.0
+    try:
+        coefficients = np.linalg.solve(gram, rhs[..., None])[..., 0]
+    except np.linalg.LinAlgError:
+        # Some group is degenerate; solve the groups one by one.
+        coefficients = np.full(rhs.shape, np.nan)
+        for i in range(len(gram)):
+            try:
+                coefficients[i] = np.linalg.solve(gram[i], rhs[i])
+            except np.linalg.LinAlgError:
+                pass
+    return np.einsum('ij,ijk->ik', coefficients, edges)
+
+
+def valid_spheres(centers, radii, pin, pin_groups, pout, pout_groups,
+                  tolerance=EPS):
+    '''Check m spheres against points to be inside and outside of them.
+
+    Args:
+        centers: (m, d) array of the centers.
+        radii: (m,) array of the radii.
+        pin: (a, d) array of points to be inside or on the spheres.
+        pin_groups: (a,) array, the index of the sphere of each pin point.
+        pout: (b, d) array of points to be outside or on the spheres.
+        pout_groups: (b,) array, the index of the sphere of each pout
+                     point.
+        tolerance: distance by which points may violate the constraints.
+
+    Returns:
+        (m,) boolean array, true for the spheres satisfying all their
+        constraints. Spheres with a nan radius are invalid.
+    '''
+    radii = np.asarray(radii, dtype=float)
+    valid = np.isfinite(radii)
+    for points, groups, sign in ((pin, pin_groups, 1.0),
+                                 (pout, pout_groups, -1.0)):
+        groups = np.asarray(groups, dtype=np.int64)
+        if len(groups) == 0:
+            continue
+        distances = np.linalg.norm(np.asarray(points, dtype=float) -
+                                   centers[groups], axis=1)
+        # Inside: distance <= r + tolerance; outside: -distance <= -r + tol.
+        violated = sign * (distances - radii[groups]) > tolerance
+        valid[groups[violated]] = False
+    return valid
+
+
+def miniexonballs(points, pins, pons, pouts, cache=None):
+    '''Solve many miniexonball problems on the same points.
+
+    Most smallest balls in the filtrations of k-fold covers are the
+    circumspheres of their pon points: no sphere with pon on it is smaller,
+    so it is the answer whenever it has the pin points inside and the pout
+    points outside. This is checked for all problems in one batch per size
+    of pon, and only the others are solved one by one with the iterative
+    solver of the welzl module. As there, the check uses EPS if pon has
+    d+1 points and is exact otherwise.
+
+    Args:
+        points: (n, d) array of the points.
+        pins, pons, pouts: lists of m lists of the indices of the points
+            to be inside, on and outside each ball.
+        cache: optional memo.MiniballCache of the problems that are
+            solved one by one, so that these are solved only once.
+
+    Returns:
+        (m, d) array of the centers, nan where pin and pon are empty, and
+        (m,) array of the radii.
+
+    Raises:
+        ValueError: if one of the balls does not exist
+    '''
+    points = np.asarray(points, dtype=float)
+    if cache is not None:
+        cache.use_points(points)
+    dimension = points.shape[1]
+    centers = np.full((len(pons), dimension), np.nan)
+    radii = np.full(len(pons), np.nan)
+    sizes = np.array([len(pon) for pon in pons], dtype=np.int64)
+    for size in range(1, dimension + 2):
+        selected = np.flatnonzero(sizes == size)
+        if len(selected) == 0:
+            continue
+        group_centers, group_radii = circumspheres(
+              points[np.array([pons[i] for i in selected.tolist()])])
+        pin, pin_groups = _flatten([pins[i] for i in selected.tolist()])
+        pout, pout_groups = _flatten([pouts[i] for i in selected.tolist()])
+        valid = valid_spheres(group_centers, group_radii, points[pin],
+                              pin_groups, points[pout], pout_groups,
+                              EPS if size == dimension + 1 else 0.0)
+        centers[selected[valid]] = group_centers[valid]
+        radii[selected[valid]] = group_radii[valid]
+
+    coordinates = points.tolist()
+    for i in np.flatnonzero(np.isnan(radii)).tolist():
+        if cache is not None:
+            key = cache.key(pins[i], pons[i], pouts[i])
+            ball = cache.get(key)
+            if ball is not None:
+                centers[i], radii[i] = ball
+                continue
+        center, radii[i] = welzl.miniexonball_indices(
+              coordinates, pins[i], pons[i], pouts[i])
+        if center is not None:
+            centers[i] = center
+        if cache is not None:
+            cache.put(key, centers[i].copy(), radii[i])
+    return centers, radii
+
+
+def _flatten(lists):
+    '''Concatenated lists, with the index of the list of each item.'''
+    items = np.fromiter(itertools.chain.from_iterable(lists), dtype=np.int64)
+    return items, np.repeat(np.arange(len(lists)), [len(l) for l in lists])
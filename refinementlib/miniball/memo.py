@@ -0,0 +1,90 @@
+import collections
+import hashlib
+
+import numpy as np
+
+"""
+Memo of solved constrained smallest ball problems.
+
+Problems are given by the indices of their pin, pon and pout points into a
+single point array, as for batched.miniexonballs. The same constraints
+recur often, e.g. for the faces of the triangulation of an order-k mosaic
+that cut through the same cell, and solving them again can be skipped.
+"""
+
+
+class MiniballCache:
+    '''
+    Bounded cache of the balls of (pin, pon, pout) problems on one point
+    array.
+
+    The key of a problem is the triple of frozensets of its point indices,
+    so the order of the indices does not matter. When more than max_entries
+    balls are stored, the least recently used ones are dropped. The cache
+    remembers a fingerprint of the points it was used with, and clears
+    itself when used with others.
+
+    Attributes:
+        max_entries: maximal number of stored balls.
+        hits: number of lookups that found a ball.
+        misses: number of lookups that did not.
+    '''
+
+    def __init__(self, max_entries=1 << 20):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._balls = collections.OrderedDict()
+        self._fingerprint = None
+
+    def __len__(self):
+        return len(self._balls)
+
+    def __repr__(self):
+        return 'MiniballCache({} entries, {} hits, {} misses)'.format(
+              len(self), self.hits, self.misses)
+
+    @property
+    def hit_rate(self):
+        '''Fraction of the lookups that found a ball, 0 before any.'''
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    @staticmethod
+    def key(pin, pon, pout):
+        '''Canonical key of a problem.'''
+        return frozenset(pin), frozenset(pon), frozenset(pout)
+
+    def use_points(self, points):
+        '''Clear the cache unless it was last used with the same points.'''
+        points = np.ascontiguousarray(points, dtype=float)
+        digest = hashlib.sha1(points.tobytes())
+        digest.update(repr(points.shape).encode('ascii'))
+        fingerprint = digest.digest()
+        if fingerprint != self._fingerprint:
+            self._balls.clear()
+            self._fingerprint = fingerprint
+
+    def get(self, key):
+        '''The (center, radius) stored for key, or None.'''
+        ball = self._balls.get(key)
+        if ball is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._balls.move_to_end(key)
+        return ball
+
+    def put(self, key, center, radius):
+        '''Store the ball of key, dropping the oldest ones if full.'''
+        self._balls[key] = (center, radius)
+        self._balls.move_to_end(key)
+        while len(self._balls) > self.max_entries:
+            self._balls.popitem(last=False)
+
+    def clear(self):
+        '''Remove all balls and reset the statistics.'''
+        self._balls.clear()
+        self._fingerprint = None
+        self.hits = 0
+        self.misses = 0
@@ -1,5 +1,4 @@
-from . import miniball_2d
-from . import miniball_3d
+from . import welzl
 
 """
 Functions to compute the smallest enclosing ball of a given set of
@@ -10,31 +9,25 @@ This is an adaptation of the algorithm by Welzl from the 1991 paper
 "Smallest enclosing disks (balls and ellipsoids)". Thanks to Grzegorz
 Jabłoński for making me aware of its generalizability.
 
-TODO: Factor out the dimension-dependent aspects of miniexball_2d
-and miniexball_3d as the main logic is the same for 2D and 3D.
+The functions here work in any dimension. They use the iterative solver
+of the welzl module, which computes the circumspheres of the affine
+subspaces spanned by up to d+1 points with a small linear solve and gives
+the same results as the recursive miniexball_2d and miniexball_3d. To
+solve many problems on the same points at once, see
+batched.miniexonballs.
 """
 
 def miniball(pin):
-    """Compute smallest enclosing ball of pin in 2 or 3 dimensions.
+    """Compute smallest enclosing ball of pin.
 
     Args:
         pin: List of points to be inside/on the ball
 
     Returns:
-        tuple: the center (x, y) of the enclosing ball
+        tuple: the center of the enclosing ball
         int: the radius of the enclosing ball
     """
-    if len(pin) != 0:
-        dim = len(pin[0])
-    else:
-        return None, 0
-
-    if dim == 2:
-        return miniball_2d.miniexball_2d(pin, [], [])
-    elif dim == 3:
-        return miniball_3d.miniexball_3d(pin, [], [])
-    else:
-        raise ValueError("Miniball is not implemented for dimension %d" % dim)
+    return _miniexonball(pin, [], [])
 
 
 def miniexball(pin, pout):
@@ -46,24 +39,15 @@ def miniexball(pin, pout):
         pout: List of points to be outside/on the ball
 
     Returns:
-        tuple: the center (x, y) of the enclosing ball
+        tuple: the center of the enclosing ball
         int: the radius of the enclosing ball
 
     Raises:
         ValueError: if no such ball exists
     """
-
-    if len(pin) != 0:
-        dim = len(pin[0])
-    else:
+    if len(pin) == 0:
         return None, 0
-
-    if dim == 2:
-        return miniball_2d.miniexball_2d(pin, [], pout)
-    elif dim == 3:
-        return miniball_3d.miniexball_3d(pin, [], pout)
-    else:
-        raise ValueError("Miniball is not implemented for dimension %d" % dim)
+    return _miniexonball(pin, [], pout)
 
 
 def miniexonball(pin, pon, pout):
@@ -77,24 +61,24 @@ def miniexonball(pin, pon, pout):
         pout: List of points to be outside/on the ball
 
     Returns:
-        tuple: the center (x, y) of the enclosing ball
+        tuple: the center of the enclosing ball
         int: the radius of the enclosing ball
 
     Raises:
         ValueError: if no such ball exists
     """
 
-    if len(pin) != 0:
-        dim = len(pin[0])
-    elif len(pon) != 0:
-        dim = len(pon[0])
-    else:
-        return None, 0
     # TODO: To deal with degeneracies, we should use the largest
     # affinely independent subset of pon rather than pon itself
-    if dim == 2:
-        return miniball_2d.miniexball_2d(pin, pon, pout)
-    elif dim == 3:
-        return miniball_3d.miniexball_3d(pin, pon, pout)
-    else:
-        raise ValueError("Miniball is not implemented for dimension %d" % dim)
+    return _miniexonball(pin, pon, pout)
+
+
+def _miniexonball(pin, pon, pout):
+    """miniexonball with the iterative solver, on a buffer of all points."""
+    points = [tuple(p) for p in pin] + [tuple(p) for p in pon] + \
+             [tuple(p) for p in pout]
+    indices = range(len(points))
+    a = len(pin)
+    b = a + len(pon)
+    return welzl.miniexonball_indices(points, indices[:a], indices[a:b],
+                                      indices[b:])
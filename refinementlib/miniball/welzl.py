@@ -0,0 +1,152 @@
+import numpy as np
+
+from .miniball_2d import EPS
+
+"""
+Iterative move-to-front variant of the constrained Welzl algorithm of
+miniexball_2d and miniexball_3d, in any dimension.
+
+The points are given once as a buffer, and the constraints as indices into
+it. Instead of recursing on copies of the constraint lists, the solver
+keeps a single list of constraints, the indices of the current support
+and an explicit stack of the suspended loops, which is at most d+1 deep.
+Violated constraints are moved to the front of the list, so that they are
+checked first later on. Distances are compared squared.
+"""
+
+
+def miniexonball_indices(points, pin, pon, pout):
+    """Compute smallest ball that has the points of pon on its surface,
+    the points of pin inside or on it and the points of pout outside or
+    on it.
+
+    Args:
+        points: Sequence of the coordinates of the points, e.g. an (n, d)
+                array. Indexing a list of tuples, as made by
+                points.tolist(), is fastest.
+        pin: Indices of the points to be inside/on the ball
+        pon: Indices of the points to be on the ball
+        pout: Indices of the points to be outside/on the ball
+
+    Returns:
+        tuple: the center of the ball, None if pin and pon are empty
+        float: the radius of the ball
+
+    Raises:
+        ValueError: if no such ball exists
+    """
+    if len(pin) == 0 and len(pon) == 0:
+        return None, 0
+    dimension = len(points[pon[0] if len(pon) else pin[0]])
+    if len(pon) > dimension + 1:
+        raise ValueError("Cannot have {} points on a sphere in {}D."
+                         .format(len(pon), dimension))
+
+    # The constraints, pin before pout, with +1 for pin and -1 for pout.
+    constraints = [(j, 1) for j in pin] + [(j, -1) for j in pout]
+    support = list(pon)
+    center, r2 = _circumsphere(points, support, dimension)
+    # Each loop checks constraints[:end] against the ball with the current
+    # support; the stack holds the (end, i) of the suspended outer loops.
+    stack = []
+    end = len(constraints)
+    i = 0
+    while True:
+        if len(support) == dimension + 1:
+            # The ball is fixed, so it has to satisfy the other constraints.
+            _check(points, constraints, end, center, r2)
+            i = end
+        if i < end:
+            j, sign = constraints[i]
+            if center is None or sign * (_distance2(points[j], center) -
+                                         r2) > 0:
+                # The constraint is on the surface of the smallest ball
+                # satisfying the constraints up to i.
+                stack.append((end, i))
+                support.append(j)
+                center, r2 = _circumsphere(points, support, dimension)
+                end = i
+                i = 0
+            else:
+                i += 1
+        elif stack:
+            # Back in the outer loop, with the ball found by the inner one.
+            end, i = stack.pop()
+            support.pop()
+            constraints.insert(0, constraints.pop(i))
+            i += 1
+        else:
+            break
+    return center, r2 ** 0.5
+
+
+def _distance2(p, q):
+    return sum((x - y) * (x - y) for x, y in zip(p, q))
+
+
+def _check(points, constraints, end, center, r2):
+    '''Raise ValueError if the ball violates one of constraints[:end].'''
+    r = r2 ** 0.5
+    inner2 = (r - EPS) ** 2 if r > EPS else -1.0
+    outer2 = (r + EPS) ** 2
+    for j, sign in constraints[:end]:
+        d2 = _distance2(points[j], center)
+        if (sign > 0 and d2 > outer2) or (sign < 0 and d2 < inner2):
+            raise ValueError("No sphere including pin and excluding pout "
+                             "exists.")
+
+
+def _circumsphere(points, support, dimension):
+    '''Center and squared radius of the circumsphere of points[support].'''
+    n = len(support)
+    if n == 0:
+        return None, 0.0
+    a = points[support[0]]
+    if n == 1:
+        return tuple(a), 0.0
+    u = [x - y for x, y in zip(points[support[1]], a)]
+    if n == 2:
+        offset = [x / 2.0 for x in u]
+    elif n == 3:
+        v = [x - y for x, y in zip(points[support[2]], a)]
+        uu = sum(x * x for x in u)
+        vv = sum(x * x for x in v)
+        uv = sum(x * y for x, y in zip(u, v))
+        denominator = 2.0 * (uu * vv - uv * uv)
+        if denominator == 0.0:
+            raise ValueError("Points on the sphere are collinear.")
+        s = vv * (uu - uv) / denominator
+        t = uu * (vv - uv) / denominator
+        offset = [s * x + t * y for x, y in zip(u, v)]
+    elif n == 4 and dimension == 3:
+        v = [x - y for x, y in zip(points[support[2]], a)]
+        w = [x - y for x, y in zip(points[support[3]], a)]
+        vw = _cross(v, w)
+        wu = _cross(w, u)
+        uv = _cross(u, v)
+        denominator = 2.0 * sum(x * y for x, y in zip(u, vw))
+        if denominator == 0.0:
+            raise ValueError("Points on the sphere are coplanar.")
+        uu = sum(x * x for x in u)
+        vv = sum(x * x for x in v)
+        ww = sum(x * x for x in w)
+        offset = [(uu * x + vv * y + ww * z) / denominator
+                  for x, y, z in zip(vw, wu, uv)]
+    else:
+        edges = np.array([points[j] for j in support[1:]], dtype=float) - \
+                np.asarray(a, dtype=float)
+        gram = edges @ edges.T
+        try:
+            offset = np.linalg.solve(gram, np.diagonal(gram) / 2.0) @ edges
+        except np.linalg.LinAlgError:
+            raise ValueError("Points on the sphere are not affinely "
+                             "independent.")
+        offset = offset.tolist()
+    return (tuple(x + y for x, y in zip(a, offset)),
+            sum(x * x for x in offset))
+
+
+def _cross(u, v):
+    return (u[1] * v[2] - u[2] * v[1],
+            u[2] * v[0] - u[0] * v[2],
+            u[0] * v[1] - u[1] * v[0])
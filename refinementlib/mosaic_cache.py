@@ -0,0 +1,149 @@
+'''Persistent on-disk cache of order-k Delaunay mosaics.
+
+Entries are content addressed: the file name is a hash of the point array
+(its bytes, shape and dtype), the order and the name and options of the
+hull backend, so a repeated computation on the same input becomes a single
+file load.  Each entry is an
+uncompressed .npz file holding the compact arrays of OrderKDelaunay.
+
+Several processes may share a cache directory.  Entries are written to a
+temporary file and moved into place with os.replace, which is atomic, so a
+reader sees either a complete entry or none.  The directory is kept under a
+size limit by evicting the least recently used entries; a read refreshes the
+modification time of the entry, which serves as its access time.
+'''
+import hashlib
+import json
+import os
+import tempfile
+import zipfile
+
+import numpy as np
+
+from rhomboidtiling_convex_collective.refinementlib.orderk_delaunay import (
+    BACKENDS,
+    OrderKDelaunay,
+    make_backend
+)
+
+# Bump when the layout of the stored arrays changes.
+FORMAT_VERSION = 3
+
+SUFFIX = '.npz'
+
+
+class MosaicCache:
+    '''Cache of OrderKDelaunay instances in a directory.
+
+    directory  -- where the entries are stored, created if missing
+    max_bytes  -- total size of the entries kept after each write; the least
+                  recently used ones are removed first
+    '''
+    def __init__(self, directory, max_bytes=1 << 30):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, points, order, backend='hull'):
+        '''Hex digest identifying the mosaics of points up to order.
+
+        The backend enters through its registered name and its arguments,
+        as stored by OrderKDelaunay.save; other backends raise ValueError.
+        '''
+        points = np.ascontiguousarray(points, dtype=np.float64)
+        digest = hashlib.sha256()
+        digest.update(json.dumps(
+              [FORMAT_VERSION, points.shape, order, _backend_key(backend)],
+              sort_keys=True).encode('ascii'))
+        digest.update(points.tobytes())
+        return digest.hexdigest()
+
+    def get(self, points, order, compact=False, pipelined=False,
+            backend='hull'):
+        '''OrderKDelaunay of points up to order, loaded or computed.
+
+        On a miss the mosaics are computed and stored before returning.
+        '''
+        path = self._path(self.key(points, order, backend))
+        okdel = self._load(path, compact)
+        if okdel is None:
+            okdel = OrderKDelaunay(points, order, compact=True,
+                                   pipelined=pipelined, backend=backend)
+            self._store(path, okdel)
+            if not compact:
+                okdel = OrderKDelaunay._from_arrays(okdel._to_arrays())
+        return okdel
+
+    def clear(self):
+        '''Remove all entries.'''
+        for path, _, _ in self._entries():
+            _remove(path)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + SUFFIX)
+
+    def _load(self, path, compact):
+        try:
+            okdel = OrderKDelaunay.load(path, compact)
+            os.utime(path)
+        except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+            # Missing, evicted meanwhile, or unreadable: treat as a miss.
+            return None
+        return okdel
+
+    def _store(self, path, okdel):
+        fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=self.directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                okdel.save(f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            _remove(tmp_path)
+            raise
+        self._evict()
+
+    def _entries(self):
+        '''(path, size, mtime) of the stored entries.'''
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(SUFFIX):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def _evict(self):
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            _remove(path)
+            total -= size
+
+
+def _backend_key(backend):
+    '''[name, arguments] of a registered backend, for the entry key.'''
+    backend = make_backend(backend)
+    name = getattr(backend, 'name', None)
+    if BACKENDS.get(name) is not type(backend):
+        raise ValueError('cannot cache the mosaics of backend %r, which is '
+                         'not one of %s' % (backend, ', '.join(BACKENDS)))
+    arguments = backend.arguments()
+    try:
+        json.dumps(arguments, sort_keys=True)
+    except TypeError:
+        raise ValueError('cannot cache the mosaics of backend %r, whose '
+                         'arguments are not plain values' % (backend,))
+    return [name, arguments]
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
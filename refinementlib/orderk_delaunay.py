@@ -1,17 +1,255 @@
+import collections.abc
+import concurrent.futures
 import itertools
+import json
+import math
 import numpy as np
 import scipy.spatial
 
+# Default options passed to qhull for the lower convex hulls.
+QHULL_OPTIONS = 'Qs QJ'
+
+EPS = 1e-12
+
+
+class CellBatch:
+    '''First-generation cells that appeared at the same order k.
+
+    Attributes:
+        vertices: (n_cells, d+1, k) int32 array. vertices[i] holds the
+                  vertices of cell i, each a sorted row of k point indices.
+        k: the k for which these cells appear.
+    '''
 
-class Cell:
-    # list of vertices of the cell, which themselves are k-tuples of points
-    # k: the k for which this cell appears
     def __init__(self, vertices, k):
         self.vertices = vertices
         self.k = k
 
+    def __len__(self):
+        return len(self.vertices)
+
     def __str__(self):
-        return str(self.vertices) + '[%d]' % self.k
+        return '%d cells[%d]' % (len(self.vertices), self.k)
+
+
+class VertexArray(collections.abc.Sequence):
+    '''Compact storage of the vertex list of an order-k Delaunay mosaic.
+
+    Wraps a lexicographically sorted (n_vertices, k) int32 array whose rows
+    are the sorted point indices of the vertices. Indexing and iteration
+    lazily produce k-tuples of point indices, so an instance can be used
+    wherever a list of vertex tuples is expected.
+
+    Attributes:
+        array: the (n_vertices, k) int32 array of point indices.
+    '''
+
+    def __init__(self, array):
+        self.array = array
+
+    def __len__(self):
+        return len(self.array)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        return tuple(self.array[i].tolist())
+
+
+class RaggedArray(collections.abc.Sequence):
+    '''Compact storage of a list of variable-length lists of integers.
+
+    The lists are concatenated into a single flat array; list i is
+    data[offsets[i]:offsets[i+1]]. Indexing and iteration lazily produce
+    the individual lists as arrays.
+
+    Attributes:
+        data: flat int32 array of the concatenated lists.
+        offsets: int64 array of length len(self) + 1.
+    '''
+
+    def __init__(self, data, offsets):
+        self.data = data
+        self.offsets = offsets
+
+    @classmethod
+    def from_lists(cls, lists):
+        lengths = np.fromiter((len(x) for x in lists), dtype=np.int64,
+                              count=len(lists))
+        offsets = np.zeros(len(lists) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        data = np.fromiter(itertools.chain.from_iterable(lists),
+                           dtype=np.int32, count=offsets[-1])
+        return cls(data, offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('RaggedArray index out of range')
+        return self.data[self.offsets[i]:self.offsets[i + 1]]
+
+
+class CellArray(RaggedArray):
+    '''Compact storage of the cell list of an order-k Delaunay mosaic.
+
+    Each cell is stored as a list of indices into a VertexArray. Indexing
+    and iteration lazily produce each cell as a list of vertices
+    (k-tuples of point indices), matching the non-compact representation.
+
+    Attributes:
+        data, offsets: see RaggedArray.
+        vertices: the VertexArray the stored indices refer to.
+    '''
+
+    def __init__(self, data, offsets, vertices):
+        super().__init__(data, offsets)
+        self.vertices = vertices
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        return [self.vertices[j] for j in super().__getitem__(i)]
+
+
+class QhullBackend:
+    '''Lower convex hulls from qhull, through scipy.spatial.ConvexHull.
+
+    A backend computes the triangulation of the order-1 mosaic from the
+    lifted points (order_1) and the lower convex hull of the lifted
+    centroids of each higher order (lower_hull). Both take an (n, d+1)
+    array of lifts, the last coordinate being the height, and return the
+    simplices as an (m, d+1) array of row indices. Backends are pickled to
+    the worker process in pipelined mode.
+
+    Parameters:
+        options - qhull options; the default joggles the input (QJ)
+    '''
+    name = 'hull'
+
+    def __init__(self, options=QHULL_OPTIONS):
+        self.options = options
+
+    def arguments(self):
+        '''The constructor arguments, as a dictionary.'''
+        return {'options': self.options}
+
+    def order_1(self, lifts):
+        return self.lower_hull(lifts)
+
+    def lower_hull(self, lifts):
+        return _lower_hull(lifts, self.options)
+
+    def __repr__(self):
+        return '%s(%s)' % (type(self).__name__, ', '.join(
+              '%s=%r' % item for item in sorted(self.arguments().items())))
+
+
+class DelaunayBackend(QhullBackend):
+    '''Order 1 from scipy's Delaunay triangulation, only lower hulls after.
+
+    The order-1 mosaic comes from scipy.spatial.Delaunay, which does not
+    joggle the input. For higher orders an apex is added high above the
+    lifts, as qhull's Qz option does for Delaunay triangulations, so the
+    upper hull is replaced by a cone over the boundary of the lower hull.
+    '''
+    name = 'delaunay'
+
+    def order_1(self, lifts):
+        return scipy.spatial.Delaunay(lifts[:, :-1]).simplices
+
+    def lower_hull(self, lifts):
+        return _lower_hull(lifts, self.options, apex=True)
+
+
+class NoJoggleBackend(QhullBackend):
+    '''Qhull without joggling, with a check of the result.
+
+    Non-simplicial facets are triangulated (Qt) instead of removed by
+    joggling the input, which keeps the input exact but may produce
+    degenerate simplices on degenerate input. The projections of the lower
+    facets are therefore checked to be a triangulation of the convex hull
+    of the projected points: no simplex may be flat and their volumes must
+    add up to the volume of the hull.
+
+    Parameters:
+        options - qhull options
+        fallback - name of the backend to use for a hull failing the check,
+                   or None to raise a ValueError instead
+    '''
+    name = 'nojoggle'
+
+    def __init__(self, options='Qs Qt', fallback='hull'):
+        super().__init__(options)
+        self.fallback = fallback
+
+    def arguments(self):
+        return {'options': self.options, 'fallback': self.fallback}
+
+    def lower_hull(self, lifts):
+        try:
+            simplices = _lower_hull(lifts, self.options, tolerance=EPS)
+        except scipy.spatial.QhullError:
+            simplices = None
+        if simplices is None or _is_degenerate(lifts[:, :-1], simplices):
+            if self.fallback is None:
+                raise ValueError('degenerate lower convex hull')
+            return make_backend(self.fallback).lower_hull(lifts)
+        return simplices
+
+
+class CGALBackend:
+    '''Regular triangulations from CGAL, with exact predicates.
+
+    Experimental: the extension has not been built and checked against the
+    other backends yet.
+
+    Needs the cgal_regular extension module, which is built by the
+    cgal_regular target of cpp/CMakeLists.txt and is only available in
+    dimensions 2 and 3. The lower convex hull of lifts (c, h) is the regular
+    triangulation of the points c with weights |c|^2 - h.
+    '''
+    name = 'cgal'
+
+    def __init__(self):
+        _cgal_regular()
+
+    def arguments(self):
+        return {}
+
+    def order_1(self, lifts):
+        points = lifts[:, :-1]
+        return _cgal_regular().regular_triangulation(
+              points, np.zeros(len(points)))
+
+    def lower_hull(self, lifts):
+        points = lifts[:, :-1]
+        weights = np.einsum('ij,ij->i', points, points) - lifts[:, -1]
+        return _cgal_regular().regular_triangulation(points, weights)
+
+    def __repr__(self):
+        return 'CGALBackend()'
+
+
+# Backend classes by name; a backend can be passed to OrderKDelaunay by name
+# or as an instance.
+BACKENDS = {backend.name: backend for backend in
+            [QhullBackend, DelaunayBackend, NoJoggleBackend, CGALBackend]}
+
+
+def make_backend(backend, arguments={}):
+    '''The backend instance for a backend name or instance.'''
+    if not isinstance(backend, str):
+        return backend
+    if backend not in BACKENDS:
+        raise ValueError('unknown backend %r, expected one of %s'
+                         % (backend, ', '.join(BACKENDS)))
+    return BACKENDS[backend](**arguments)
 
 
 class OrderKDelaunay:
@@ -46,14 +284,371 @@ class OrderKDelaunay:
             For each order-k Delaunay mosaic from 1 up to order,
             the list of generations of the top-dimensional cells of the mosaic,
             i.e. each cell from diagrams_cells is associated a generation.
+
+    Compact mode:
+        If constructed with compact=True, the lists above are replaced by
+        array-backed containers, avoiding one Python object per vertex,
+        simplex and cell. For each order k, diagrams_vertices holds a
+        VertexArray around a lexicographically sorted (n_vertices, k) int32
+        array, diagrams_simplices a RaggedArray and diagrams_cells a
+        CellArray (flat int32 index arrays with offsets), and
+        diagrams_generations an int8 array. The containers give lazy tuple
+        views of their entries, so code written against the list
+        representation keeps working.
+
+    Higher orders:
+        An instance keeps the cells still needed for the next order, so
+        extend() computes further orders without redoing the lower ones.
+        save() and load() store this state along with the mosaics.
     """
 
-    def __init__(self, points, order):
+    def __init__(self, points, order, compact=False, pipelined=False,
+                 backend='hull'):
         '''
         Parameters:
             points - list of points
             order - order k up to which to compute the order-k Delaunay mosaics
+            compact - whether to store the mosaics in array-backed containers
+            pipelined - whether to compute the convex hull of each order in a
+                        worker process while the vertices of the next order
+                        are generated
+            backend - how to compute the lower convex hulls, as a name
+                      from BACKENDS ('hull', 'delaunay', 'nojoggle', 'cgal')
+                      or a backend instance, see QhullBackend
+        '''
+        self._initialize(points, compact, backend)
+        # Compute all the mosaics
+        for diagram in self._compute_orders(order, pipelined):
+            self._store_diagram(*diagram)
+
+    @classmethod
+    def iter_orders(cls, points, order, compact=False, pipelined=False,
+                    backend='hull'):
+        '''Generate the order-k Delaunay mosaics one order at a time.
+
+        Unlike the constructor, this does not keep the mosaics of all orders:
+        each order is yielded as soon as it is computed, and only the cells
+        still needed to compute later orders are kept, so memory use is
+        bounded by about two consecutive orders (plus what the caller keeps).
+
+        Parameters: see the constructor.
+
+        Yields:
+            Tuples (k, vertices, simplices, cells, generations) for k from 1
+            up to order, holding the entries that diagrams_vertices,
+            diagrams_simplices, diagrams_cells and diagrams_generations of an
+            OrderKDelaunay instance would have for order k.
+        '''
+        okdel = cls.__new__(cls)
+        okdel._initialize(points, compact, backend)
+        for k, diagram in enumerate(okdel._compute_orders(order, pipelined),
+                                    1):
+            yield (k,) + diagram
+
+    @property
+    def order(self):
+        '''The highest order computed so far.'''
+        return len(self.diagrams_vertices)
+
+    def extend(self, order, pipelined=False):
+        '''Compute the mosaics of the orders above self.order up to order.
+
+        The computation continues from the cell queue kept after the last
+        order, so the result is the same as constructing a new instance with
+        the higher order, without redoing the orders already computed. Does
+        nothing if order is not above self.order.
+
+        Parameters:
+            order - order k up to which to compute the order-k Delaunay mosaics
+            pipelined - see the constructor
+        '''
+        for diagram in self._compute_orders(order, pipelined,
+                                            start=self.order + 1):
+            self._store_diagram(*diagram)
+
+    def insert_point(self, point):
+        '''Add a point, repairing the mosaics of orders 1 and 2 locally.
+
+        The order-1 mosaic is updated by removing the simplices whose
+        circumsphere contains the point and connecting the point to the
+        boundary of the hole they leave. Of the order-2 mosaic only the
+        cells of these simplices and the first-generation cells around the
+        points of the hole change. The first-generation cells around a
+        point a are the simplices of the Delaunay triangulation of the
+        neighbours of a that lie in the star of a, so they are recomputed
+        from the neighbours alone, and no convex hull of all lifts is
+        taken. A point outside the convex hull of the points makes all
+        orders be computed anew.
+
+        The mosaics are the same as those of a new instance with the point
+        appended, up to the order of the simplices and cells, the
+        triangulation of cells that are not simplices, and the flat cells
+        that joggling may leave on degenerate input, such as points on the
+        boundary of the convex hull. The cells still needed by extend() are
+        updated along with them.
+
+        Parameters:
+            point - the coordinates of the new point
+
+        Returns:
+            The index of the new point.
         '''
+        if self.order > 2:
+            raise ValueError('insert_point only updates the mosaics of '
+                             'orders 1 and 2, not of order %d' % self.order)
+        if self.order == 2 and self._dimension > 3:
+            raise ValueError('insert_point only updates order-2 mosaics '
+                             'in dimensions 2 and 3')
+        point = np.asarray(point, dtype=float)
+        index = len(self.lifts)
+        lifts = np.vstack([self.lifts, np.append(point, point @ point)])
+        simplices = self._diagram_arrays(1)[1]
+        conflict = _conflict_mask(lifts, simplices, index)
+        if conflict is None:
+            # Outside the convex hull, the mosaics grow beyond the hole.
+            order = self.order
+            self.lifts = lifts
+            self.diagrams_vertices = []
+            self.diagrams_simplices = []
+            self.diagrams_cells = []
+            self.diagrams_generations = []
+            for diagram in self._compute_orders(order, False):
+                self._store_diagram(*diagram)
+            return index
+
+        # Bowyer-Watson: cone from the point over the boundary of the hole.
+        removed = np.sort(simplices[conflict], axis=1)
+        facets = np.array(list(itertools.combinations(
+              range(self._dimension + 1), self._dimension)))
+        facets, counts = np.unique(
+              removed[:, facets].reshape(-1, self._dimension), axis=0,
+              return_counts=True)
+        boundary = facets[counts == 1]
+        added = np.column_stack(
+              [boundary, np.full(len(boundary), index)]).astype(np.int32)
+        # A point on the boundary of the convex hull splits the facets of
+        # the hull it lies on, the cones over them are flat.
+        volumes = _volumes(lifts[:, :-1], added)
+        flat = volumes <= EPS * _volumes(lifts[:, :-1], removed).sum()
+        boundary = boundary[~flat]
+        added = added[~flat]
+        order_1 = np.concatenate([simplices[~conflict], added])
+        vertices_1 = np.arange(index + 1, dtype=np.int32).reshape(-1, 1)
+
+        self.lifts = lifts
+        queue = [CellBatch(vertices_1[order_1], 1)]
+        self._replace_diagram(1, *self._make_diagram(
+              vertices_1, order_1, [order_1],
+              np.ones(len(order_1), dtype=np.int8)))
+        if self.order == 2:
+            batch = self._insert_order_2(index, removed, boundary, added,
+                                         order_1)
+            if self._dimension > 2:
+                queue.append(batch)
+            else:
+                queue = [batch]
+        self.cell_queue = queue
+        return index
+
+    def _insert_order_2(self, index, removed, boundary, added, order_1):
+        '''Repair the order-2 mosaic after insert_point updated order 1.
+
+        Args:
+            index: the index of the inserted point.
+            removed: the sorted order-1 simplices removed by the insertion.
+            boundary: the sorted facets of the boundary of their union.
+            added: the order-1 simplices added by the insertion.
+            order_1: the updated order-1 simplices.
+
+        Returns:
+            The CellBatch of the first-generation cells of order 2.
+        '''
+        dimension = self._dimension
+        n_points = index + 1
+        vertices, simplices, blocks, generations = self._diagram_arrays(2)
+        # The vertices of order 2 are the edges of the order-1 mosaic, the
+        # edges inside the hole are replaced by those from the new point.
+        hole = np.unique(removed)
+        affected = np.append(hole, index)
+        edges = np.array(list(itertools.combinations(range(dimension + 1),
+                                                     2)))
+        old_keys = _pair_keys(vertices, n_points)
+        inner = np.setdiff1d(
+              _pair_keys(removed[:, edges].reshape(-1, 2), n_points),
+              _pair_keys(boundary[:, edges[edges[:, 1] < dimension]]
+                         .reshape(-1, 2), n_points))
+        kept = ~np.isin(old_keys, inner)
+        keys = np.sort(np.concatenate([old_keys[kept],
+                                       hole.astype(np.int64) * n_points
+                                       + index]))
+        new_vertices = np.column_stack([keys // n_points,
+                                        keys % n_points]).astype(np.int32)
+        remap = np.full(len(vertices), -1, dtype=np.int32)
+        remap[kept] = np.searchsorted(keys, old_keys[kept])
+
+        def vertex_indices(pairs):
+            return np.searchsorted(keys, _pair_keys(pairs, n_points)).astype(
+                  np.int32).reshape(pairs.shape[:-1])
+
+        # Cells and simplices of the new order-1 simplices.
+        nextgen_cells = vertex_indices(added[:, edges])
+        if dimension == 2:
+            nextgen_simplices = nextgen_cells
+        else:
+            nextgen_simplices = nextgen_cells[:, _OCTAHEDRON].reshape(
+                  -1, dimension + 1)
+        # First-generation cells around the points of the hole.
+        coordinates = self.lifts[:, :-1]
+        near = order_1[np.any(np.isin(order_1, affected), axis=1)]
+        firstgen_cells = []
+        for a in affected.tolist():
+            star = near[np.any(near == a, axis=1)]
+            neighbours = np.setdiff1d(star, [a])
+            if len(neighbours) <= dimension:
+                continue
+            try:
+                triangulation = scipy.spatial.Delaunay(
+                      coordinates[neighbours]).simplices
+            except scipy.spatial.QhullError:
+                continue
+            cells = neighbours[triangulation]
+            # Without the flat simplices of collinear neighbours on the hull.
+            cells = cells[_volumes(coordinates, cells)
+                          > EPS * _volumes(coordinates, star).sum()]
+            cells = cells[_in_simplices(coordinates, star,
+                                        coordinates[cells].mean(axis=1))]
+            pairs = np.stack([np.minimum(cells, a), np.maximum(cells, a)],
+                             axis=2)
+            firstgen_cells.append(np.sort(vertex_indices(pairs), axis=1))
+        firstgen_cells = np.concatenate(
+              firstgen_cells + [np.empty((0, dimension + 1), dtype=np.int32)])
+
+        # Keep what was not built from the hole.
+        kept_simplices = simplices[~_from_hole(vertices, simplices, None,
+                                               affected, removed)]
+        cells = []
+        cell_generations = []
+        start = 0
+        for block in blocks:
+            block_generations = generations[start:start + len(block)]
+            start += len(block)
+            keep = ~_from_hole(vertices, block, block_generations == 1,
+                               affected, removed)
+            cells.append(remap[block[keep]])
+            cell_generations.append(block_generations[keep])
+        cells += [nextgen_cells, firstgen_cells]
+        cell_generations += [np.full(len(nextgen_cells), 2, dtype=np.int8),
+                             np.ones(len(firstgen_cells), dtype=np.int8)]
+        queue = np.concatenate(
+              [block[block_generations == 1] for block, block_generations
+               in zip(cells, cell_generations)
+               if block.shape[1] == dimension + 1])
+        self._replace_diagram(2, *self._make_diagram(
+              new_vertices,
+              np.concatenate([remap[kept_simplices], nextgen_simplices,
+                              firstgen_cells]),
+              [block for block in cells if len(block)],
+              np.concatenate(cell_generations)))
+        return CellBatch(new_vertices[queue], 2)
+
+    def save(self, file):
+        '''Write the mosaics and the state needed to extend them to file.
+
+        Parameters:
+            file - file name or open binary file, passed to np.savez
+        '''
+        np.savez(file, **self._to_arrays())
+
+    @classmethod
+    def load(cls, file, compact=False):
+        '''Read an instance written by save.
+
+        Parameters:
+            file - file name or open binary file, passed to np.load
+            compact - whether to store the mosaics in array-backed containers,
+                      independently of how the saved instance stored them
+        '''
+        with np.load(file) as arrays:
+            return cls._from_arrays(arrays, compact)
+
+    def _to_arrays(self):
+        '''Dictionary of arrays holding the mosaics and the cell queue.
+
+        The result can be stored with np.savez and turned back into an
+        instance by _from_arrays.
+        '''
+        arrays = {'points': self.lifts[:, :-1],
+                  'backend': np.array(json.dumps(
+                        [self._backend.name, self._backend.arguments()])),
+                  'order': np.array(self.order),
+                  'queue_orders': np.array([batch.k
+                                            for batch in self.cell_queue])}
+        for i, batch in enumerate(self.cell_queue):
+            arrays['queue_%d' % i] = batch.vertices
+        for k in range(1, self.order + 1):
+            vertices, simplices, cells, generations = \
+                  self._diagram_arrays(k)
+            arrays['vertices_%d' % k] = vertices
+            arrays['simplices_%d' % k] = simplices
+            arrays['generations_%d' % k] = generations
+            for j, block in enumerate(cells):
+                arrays['cells_%d_%d' % (k, j)] = block
+        return arrays
+
+    @classmethod
+    def _from_arrays(cls, arrays, compact=False):
+        '''Make an instance from the output of _to_arrays.'''
+        okdel = cls.__new__(cls)
+        okdel._initialize(arrays['points'], compact,
+                          make_backend(*json.loads(str(arrays['backend']))))
+        okdel.cell_queue = [
+              CellBatch(np.asarray(arrays['queue_%d' % i]), int(k))
+              for i, k in enumerate(arrays['queue_orders'])]
+        for k in range(1, int(arrays['order']) + 1):
+            cells = []
+            while 'cells_%d_%d' % (k, len(cells)) in arrays:
+                key = 'cells_%d_%d' % (k, len(cells))
+                cells.append(np.asarray(arrays[key]))
+            okdel._store_diagram(*okdel._make_diagram(
+                  np.asarray(arrays['vertices_%d' % k]),
+                  np.asarray(arrays['simplices_%d' % k]), cells,
+                  np.asarray(arrays['generations_%d' % k])))
+        return okdel
+
+    def _diagram_arrays(self, k):
+        '''The order-k mosaic in the array form taken by _make_diagram.'''
+        vertices = self.diagrams_vertices[k-1]
+        simplices = self.diagrams_simplices[k-1]
+        cells = self.diagrams_cells[k-1]
+        generations = np.asarray(self.diagrams_generations[k-1],
+                                 dtype=np.int8)
+        if self._compact:
+            vertex_array = vertices.array
+            simplex_array = simplices.data.reshape(-1, self._dimension + 1)
+            data = cells.data
+            offsets = cells.offsets
+        else:
+            vertex_array = np.array(vertices, dtype=np.int32).reshape(
+                  len(vertices), k)
+            simplex_array = np.array(simplices, dtype=np.int32).reshape(
+                  len(simplices), self._dimension + 1)
+            vertex_index = {vertex: i for i, vertex in enumerate(vertices)}
+            cells = RaggedArray.from_lists(
+                  [[vertex_index[vertex] for vertex in cell] for cell in cells])
+            data = cells.data
+            offsets = cells.offsets
+        # Split the cells into blocks of consecutive cells of equal width.
+        widths = np.diff(offsets)
+        starts = np.flatnonzero(np.diff(widths, prepend=-1))
+        stops = np.append(starts[1:], len(widths))
+        cell_blocks = [data[offsets[start]:offsets[stop]].reshape(
+                             stop - start, widths[start])
+                       for start, stop in zip(starts, stops)]
+        return vertex_array, simplex_array, cell_blocks, generations
+
+    def _initialize(self, points, compact, backend):
+        self._compact = compact
+        self._backend = make_backend(backend)
         self.diagrams_vertices = []
         self.diagrams_simplices = []
         self.diagrams_cells = []
@@ -64,112 +659,420 @@ class OrderKDelaunay:
         # Store each point with its magnitude as last coordinate, giving a
         # a point in R^d+1, because we're using a lower convex hull to get
         # the order-k cells from the vertex set.
-        self.lifts = [tuple(np.append(c, np.linalg.norm(c)**2))
-                      for c in points]
+        points = np.asarray(points, dtype=float)
+        self.lifts = np.column_stack(
+              [points, np.einsum('ij,ij->i', points, points)])
 
-        # Compute all the mosaics
-        self._compute_order_1()
-        for k in range(2, order + 1):
-            self._compute_order_k(k)
+    def _compute_orders(self, order, pipelined, start=1):
+        '''Generate the mosaics of orders start to order, see _make_diagram.
+
+        Orders above 1 continue from the cell queue left by order start-1.
+        '''
+        if start == 1:
+            yield self._compute_order_1()
+            start = 2
+        if pipelined:
+            yield from self._compute_orders_pipelined(start, order)
+        else:
+            for k in range(start, order + 1):
+                yield self._compute_order_k(k)
 
     def _compute_order_1(self):
         # Get first order Delaunay mosaic as lower convex hull of the lifts
-        chull = scipy.spatial.ConvexHull(self.lifts, qhull_options='Qs QJ')
-        # chull.equations[i][dimension] < 0 means only taking the
-        # lower convex hull of the lifts
-        simplices = [chull.simplices[i] for i in range(len(chull.simplices))
-                     if chull.equations[i][self._dimension] < 0]
-
-        tupled_simplices = [[(vertex,) for vertex in simplex]
-                            for simplex in simplices]
-        self.diagrams_vertices.append([(i,) for i in range(len(self.lifts))])
-        self.diagrams_simplices.append(simplices)
-        self.diagrams_cells.append(tupled_simplices)
-        self.diagrams_generations.append([1] * len(simplices))
-        # Make a list of the order 1 cells.
-        # cell_queue will be used as the list of cells who haven't gone through
-        # all their barycentric polytopes yet.
-        self.cell_queue = list(zip(tupled_simplices, [1] * len(simplices)))
-        self.cell_queue = [Cell(*cell) for cell in self.cell_queue]
+        simplices = self._backend.order_1(self.lifts).astype(np.int32)
+
+        vertices = np.arange(len(self.lifts), dtype=np.int32).reshape(-1, 1)
+        # Make a batch of the order 1 cells.
+        # cell_queue will be used as the list of cell batches who haven't
+        # gone through all their barycentric polytopes yet.
+        self.cell_queue = [CellBatch(vertices[simplices], 1)]
+        return self._make_diagram(vertices, simplices, [simplices],
+                                  np.ones(len(simplices), dtype=np.int8))
+
+    def _barycentric_candidates(self, batches, k):
+        '''Step 2.1, batched over all cells that appeared at the same order.
+
+        Args:
+            batches: the cell batches to take barycentric polytopes of.
+            k: the order of the new vertices.
+
+        Returns:
+            List of pairs, one for each batch with cells of generation
+            below the dimension: an (n_cells * n_cell_vertices, k) array of
+            candidate vertices (with repetitions), and the tuple
+            (n_cells, n_cell_vertices, generation) of the new cells.
+        '''
+        candidates = []
+        for batch in batches:
+            # k - batch.k is the generation of the new barycentric cells.
+            generation = k - batch.k
+            if generation >= self._dimension or len(batch) == 0:
+                continue
+            # Take all (generation+1)-tuples of vertices of each cell.
+            combos = np.array(list(itertools.combinations(
+                  range(self._dimension + 1), generation + 1)))
+            gathered = batch.vertices[:, combos, :].reshape(
+                  len(batch), len(combos), -1)
+            # The union of the points of the vertices of each tuple is a
+            # new vertex. The vertices of a first-generation cell share
+            # all but one point, so every union has exactly k points:
+            # sort and drop repeated entries.
+            gathered = np.sort(gathered, axis=2)
+            keep = np.ones(gathered.shape, dtype=bool)
+            keep[:, :, 1:] = gathered[:, :, 1:] != gathered[:, :, :-1]
+            candidates.append((gathered[keep].reshape(-1, k),
+                               (len(batch), len(combos), generation + 1)))
+        return candidates
+
+    def _merge_candidates(self, k, candidates):
+        '''Deduplicate the output of _barycentric_candidates.
+
+        Returns:
+            vertices: lexicographically sorted (n_vertices, k) int32 array
+                      of the vertices of the order-k mosaic.
+            cells: list of (n_cells, n_cell_vertices) arrays of indices into
+                   vertices, one per cell batch, each row sorted.
+            generations: list of the generations of the cells in cells.
+        '''
+        # Vertices without repetitions, and for each candidate the index
+        # of its vertex.
+        if candidates:
+            vertices, inverse = np.unique(
+                  np.concatenate([c for c, _ in candidates]), axis=0,
+                  return_inverse=True)
+            inverse = inverse.reshape(-1).astype(np.int32)
+        else:
+            vertices = np.empty((0, k), dtype=np.int32)
+            inverse = np.empty(0, dtype=np.int32)
+
+        # Each cell is the sorted list of the vertices its tuples produced.
+        # Since vertices is sorted lexicographically, sorting indices sorts
+        # the cell's vertices.
+        cells = []
+        generations = []
+        start = 0
+        for _, (n_cells, n_cell_vertices, generation) in candidates:
+            stop = start + n_cells * n_cell_vertices
+            cells.append(np.sort(inverse[start:stop].reshape(
+                  n_cells, n_cell_vertices), axis=1))
+            generations.append(
+                  np.full(n_cells, generation, dtype=np.int8))
+            start = stop
+        return vertices, cells, generations
+
+    def _retire_cell_batches(self, k):
+        # Once the generation is dimension - 1, we've cycled through all
+        # barycentric polytopes and thus don't need to keep the batch in
+        # the queue
+        self.cell_queue = [batch for batch in self.cell_queue
+                           if k - batch.k < self._dimension - 1]
 
     def _compute_order_k(self, k):
         # Step 2.1: Compute the vertices and generation >= 2 cells of the
         # order-k Delaunay mosaic.
-        new_nextgen_cells = []
-        new_generations = []
-        new_vertices = []
-        cell_queue_new = []
-        # Go over all cells whose cycle of barycentric polytopes we haven't
-        # completed yet.
-        for cell in self.cell_queue:
-            # k - cell.k is the generation of the new barycentric cell we get.
-            generation = k - cell.k
-            if generation < self._dimension:
-                # Take all (generation+1)-tuples of vertices
-                # --> list of gtuples of vertices (which are tuples of points)
-                gtuples = list(itertools.combinations(
-                      cell.vertices, generation + 1))
-                # For each of these tuples of vertices, we take the union of
-                # the vertices to get a new vertex.
-                # The outer 'sorted' is not necessary, but ensures output is
-                # entirely sorted, which is useful for testing and comparing.
-                nvs = sorted([tuple(sorted(set.union(*[set(vertex)
-                      for vertex in gtuple]))) for gtuple in gtuples])
-                # The number of points in each new vertex should be k+1,
-                # otherwise something went wrong.
-                new_nextgen_cells.append(nvs)
-                new_generations.append(generation + 1)
-                new_vertices += nvs
-            else:
-                pass
+        candidates = self._barycentric_candidates(self.cell_queue, k)
+        self._retire_cell_batches(k)
+        new_vertices, new_nextgen_cells, new_generations = \
+              self._merge_candidates(k, candidates)
+        simplices = _order_k_simplices(self._order_k_lifts(new_vertices),
+                                       self._backend)
+        return self._add_order_k(k, new_vertices, simplices,
+                                 new_nextgen_cells, new_generations)
 
-            # Once the generation is dimension - 1, we've cycled through all
-            # barycentric polytopes and thus don't need to add the cell to the
-            # queue again
-            if k - cell.k < self._dimension - 1:
-                cell_queue_new.append(cell)
+    def _compute_orders_pipelined(self, start, order):
+        '''Generate orders start to order, overlapping hulls and step 2.1.
+
+        The vertices of order k+1 stem from the cells in the queue after
+        order k. Only the first-generation cells of order k depend on the
+        convex hull of order k, so the candidates from all older cells are
+        generated while that hull is computed in a worker process. The
+        results are identical to those of _compute_order_k.
+        '''
+        if start > order:
+            return
+        with concurrent.futures.ProcessPoolExecutor(max_workers=1) as pool:
+            try:
+                candidates = self._barycentric_candidates(self.cell_queue,
+                                                          start)
+                for k in range(start, order + 1):
+                    self._retire_cell_batches(k)
+                    new_vertices, new_nextgen_cells, new_generations = \
+                          self._merge_candidates(k, candidates)
+                    future = pool.submit(_order_k_simplices,
+                                         self._order_k_lifts(new_vertices),
+                                         self._backend)
+                    if k < order:
+                        candidates = self._barycentric_candidates(
+                              self.cell_queue, k + 1)
+                    diagram = self._add_order_k(
+                          k, new_vertices, future.result(),
+                          new_nextgen_cells, new_generations)
+                    if k < order:
+                        # The first-generation cells of order k, just added.
+                        candidates += self._barycentric_candidates(
+                              self.cell_queue[-1:], k + 1)
+                    yield diagram
+            finally:
+                # Do not keep the worker if the caller stops early.
+                pool.shutdown(cancel_futures=True)
 
-        # List of new vertices without repetitions.
-        new_vertices = list(set(new_vertices))
-        # For each tuple that we identified as vertex,
+    def _order_k_lifts(self, vertices):
+        # For each row that we identified as vertex,
         # compute the centroid of its lifts.
-        new_lifts = np.array([np.sum(
-              [self.lifts[i] for i in new_vertex], axis=0) / k 
-                    for new_vertex in new_vertices])
-
-        chull = scipy.spatial.ConvexHull(new_lifts, qhull_options='Qs QJ')
-        # Compute the simplices of the triangulated order-k Delaunay mosaic,
-        # which is the lower convex hull of these centroids.
-        # Each simplex is a tuple of integers, these integers are indices into
-        # new_vertices, which contains the k-tuples of original points which
-        # are vertices.
-        # (chull.equations[i][dimension] < 0 means only taking the
-        # lower convex hull of the lifts.)
-        simplices = [sorted(chull.simplices[i]) 
-              for i in range(len(chull.simplices))
-                    if chull.equations[i][self._dimension] < 0]
+        return self.lifts[vertices].sum(axis=1) / vertices.shape[1]
 
+    def _add_order_k(self, k, new_vertices, simplices,
+                     new_nextgen_cells, new_generations):
         # Step 2.2: Compute the remaining cells of the order-k Delaunay mosaic
-        new_firstgen_cells = []
-        for simplex in simplices:
-            # Get the k-tuples that are the vertices of the simplex.
-            vertices = [set(new_vertices[i]) for i in simplex]
-            x_in = set.intersection(*vertices)
-            # Simplices are first generation if the intersection of their
-            # vertices is k-1.
-            if len(x_in) == k - 1:
-                # The outer 'sorted' is not necessary, but ensures the output
-                # is entirely sorted, which is useful for testing and comparing
-                cell_vertices = sorted([new_vertices[i] for i in simplex])
-                new_firstgen_cells.append(cell_vertices)
-                cell_queue_new.append(Cell(cell_vertices, k))
-
-        # Use our compiled queue for the next iteration
-        self.cell_queue = cell_queue_new
-
-        # Save the computed stuff
-        self.diagrams_vertices.append(new_vertices)
+        # Simplices are first generation if the intersection of their
+        # vertices is k-1.
+        new_firstgen_cells = simplices[
+              first_generation_mask(new_vertices, simplices)]
+        # Add the new cells to the queue for the next iteration
+        self.cell_queue.append(
+              CellBatch(new_vertices[new_firstgen_cells], k))
+
+        return self._make_diagram(
+              new_vertices, simplices,
+              new_nextgen_cells + [new_firstgen_cells],
+              np.concatenate(new_generations + [
+                    np.ones(len(new_firstgen_cells), dtype=np.int8)]))
+
+    def _make_diagram(self, vertices, simplices, cells, generations):
+        '''Convert the computed order-k mosaic for output.
+
+        See diagram_containers for the arguments.
+        '''
+        return diagram_containers(vertices, simplices, cells, generations,
+                                  self._compact)
+
+    def _store_diagram(self, vertices, simplices, cells, generations):
+        '''Append the order-k mosaic to the diagrams_* lists.'''
+        self.diagrams_vertices.append(vertices)
         self.diagrams_simplices.append(simplices)
-        self.diagrams_cells.append(new_nextgen_cells + new_firstgen_cells)
-        self.diagrams_generations.append(
-            new_generations + [1] * len(new_firstgen_cells))
+        self.diagrams_cells.append(cells)
+        self.diagrams_generations.append(generations)
+
+    def _replace_diagram(self, k, vertices, simplices, cells, generations):
+        '''Replace the order-k mosaic in the diagrams_* lists.'''
+        self.diagrams_vertices[k-1] = vertices
+        self.diagrams_simplices[k-1] = simplices
+        self.diagrams_cells[k-1] = cells
+        self.diagrams_generations[k-1] = generations
+
+
+def diagram_containers(vertices, simplices, cells, generations, compact):
+    '''Convert an order-k mosaic to the representation of OrderKDelaunay.
+
+    Args:
+        vertices: sorted (n_vertices, k) array of point indices.
+        simplices: (n_simplices, d+1) array of indices into vertices.
+        cells: list of 2D arrays of indices into vertices, each row
+               being a cell.
+        generations: array of the generation of each cell.
+        compact: whether to produce array-backed containers (see
+                 OrderKDelaunay) or lists of tuples.
+
+    Returns:
+        The entries of diagrams_vertices, diagrams_simplices,
+        diagrams_cells and diagrams_generations for this order.
+    '''
+    if not compact:
+        vertex_tuples = [tuple(v) for v in vertices.tolist()]
+        return (vertex_tuples,
+                simplices.tolist(),
+                [[vertex_tuples[i] for i in cell]
+                 for block in cells for cell in block.tolist()],
+                generations.tolist())
+
+    compact_vertices = VertexArray(vertices)
+    return (compact_vertices,
+            RaggedArray(simplices.reshape(-1), _block_offsets([simplices])),
+            CellArray(np.concatenate([block.reshape(-1) for block in cells]),
+                      _block_offsets(cells), compact_vertices),
+            generations)
+
+
+def _lower_hull(lifts, options=QHULL_OPTIONS, apex=False, tolerance=0.):
+    '''Facets of the lower convex hull of the lifts as (n, d+1) array.
+
+    Facets whose unit normal has a last coordinate of at least -tolerance,
+    i.e. upper or (nearly) vertical ones, are left out. If apex is true, a
+    point is added high above the lifts, see DelaunayBackend.
+    '''
+    n_lifts = len(lifts)
+    if apex:
+        heights = lifts[:, -1]
+        apex = np.append(lifts[:, :-1].mean(axis=0),
+                         2 * heights.max() - heights.min() + 1)
+        lifts = np.vstack([lifts, apex])
+    chull = scipy.spatial.ConvexHull(lifts, qhull_options=options)
+    # chull.equations[i][dimension] < 0 means only taking the
+    # lower convex hull of the lifts
+    lower = chull.equations[:, lifts.shape[1] - 1] < -tolerance
+    lower &= np.all(chull.simplices < n_lifts, axis=1)
+    return chull.simplices[lower]
+
+
+def _order_k_simplices(lifts, backend):
+    # Compute the simplices of the triangulated order-k Delaunay mosaic,
+    # which is the lower convex hull of the centroids of the lifts.
+    # Each simplex is a sorted row of indices into the vertex array, which
+    # contains the k-tuples of original points which are vertices.
+    return np.sort(backend.lower_hull(lifts), axis=1).astype(np.int32)
+
+
+def _is_degenerate(points, simplices):
+    '''Whether the simplices fail to triangulate the hull of the points.'''
+    if len(simplices) == 0:
+        return True
+    dimension = points.shape[1]
+    edges = points[simplices[:, 1:]] - points[simplices[:, :1]]
+    volumes = np.abs(np.linalg.det(edges)) / math.factorial(dimension)
+    hull_volume = scipy.spatial.ConvexHull(points).volume
+    return (volumes.min() <= EPS * hull_volume
+            or abs(volumes.sum() - hull_volume) > 1e-9 * hull_volume)
+
+
+def _conflict_mask(lifts, simplices, index):
+    '''Which simplices have the point index inside their circumsphere.
+
+    The point is inside the circumsphere of a simplex iff its lift is below
+    the hyperplane through the lifts of the simplex. Returns None if the
+    point is in none of the simplices themselves, i.e. outside their union.
+    '''
+    dimension = simplices.shape[1] - 1
+    corners = lifts[simplices]
+    orientation = np.linalg.det(corners[:, 1:, :-1] - corners[:, :1, :-1])
+    insphere = np.linalg.det(corners - lifts[index])
+    conflict = (-1) ** dimension * insphere * orientation > 0
+    # The simplex containing the point is one of those in conflict.
+    if not _in_simplices(lifts[:, :-1], simplices[conflict],
+                         lifts[index:index + 1, :-1])[0]:
+        return None
+    return conflict
+
+
+def _volumes(points, simplices):
+    '''Absolute volumes of the simplices (rows of point indices), times d!.'''
+    corners = points[simplices]
+    return np.abs(np.linalg.det(corners[:, 1:] - corners[:, :1]))
+
+
+def _in_simplices(points, simplices, queries):
+    '''Which queries lie in one of the simplices (rows of point indices).'''
+    if len(simplices) == 0:
+        return np.zeros(len(queries), dtype=bool)
+    corners = points[simplices]
+    # Barycentric coordinates of each query in each simplex.
+    inverse = np.linalg.pinv(corners[:, 1:] - corners[:, :1])
+    relative = queries[:, None, :] - corners[None, :, 0]
+    coordinates = np.einsum('sij,qsi->qsj', inverse, relative)
+    return np.any((coordinates >= -EPS).all(axis=2)
+                  & (coordinates.sum(axis=2) <= 1 + EPS), axis=1)
+
+
+def _pair_keys(pairs, n_points):
+    '''Integer keys of sorted pairs of point indices, ordered like them.'''
+    pairs = np.asarray(pairs, dtype=np.int64)
+    return pairs[..., 0] * n_points + pairs[..., 1]
+
+
+def _from_hole(vertices, elements, first_generation, affected, removed):
+    '''Which order-2 simplices or cells change when a point is inserted.
+
+    Args:
+        vertices: (n_vertices, 2) array of the order-2 vertices.
+        elements: 2D array of indices into vertices, one simplex or cell
+                  per row.
+        first_generation: boolean array, which elements are first
+                          generation, or None to classify them as
+                          simplices.
+        affected: the points of the hole and the inserted point; the first
+                  generation elements around them change.
+        removed: the sorted order-1 simplices removed; the other elements
+                 are built from an order-1 simplex, which changes if it
+                 was removed.
+    '''
+    # All vertices of an element that changes contain an affected point.
+    near = np.flatnonzero(np.isin(vertices[elements[:, 0]], affected).any(
+          axis=1))
+    changed = np.zeros(len(elements), dtype=bool)
+    if len(near) == 0:
+        return changed
+    elements = elements[near]
+    if first_generation is None:
+        first_generation = first_generation_mask(vertices, elements)
+    else:
+        first_generation = first_generation[near]
+    pairs = vertices[elements]
+    # The point common to the first two vertices is the one all vertices
+    # of a first-generation element have in common.
+    first, second = pairs[:, 0], pairs[:, 1]
+    shared = (first[:, 0] == second[:, 0]) | (first[:, 0] == second[:, 1])
+    common = np.where(shared, first[:, 0], first[:, 1])
+    # The points of the order-1 simplex of the others, without repetitions.
+    points = np.sort(pairs.reshape(len(elements), -1), axis=1)
+    points[:, 1:][points[:, 1:] == points[:, :-1]] = np.iinfo(
+          points.dtype).max
+    points = np.sort(points, axis=1)[:, :removed.shape[1]]
+    rows = np.dtype((np.void, points.dtype.itemsize * points.shape[1]))
+    in_removed = np.isin(
+          np.ascontiguousarray(points).view(rows).ravel(),
+          np.ascontiguousarray(removed.astype(points.dtype)).view(rows)
+          .ravel())
+    changed[near] = np.where(first_generation, np.isin(common, affected),
+                             in_removed)
+    return changed
+
+
+# The four tetrahedra around the diagonal between the midpoints of the edges
+# 01 and 23 of a tetrahedron, triangulating the octahedron spanned by the
+# midpoints of its edges 01, 02, 03, 12, 13, 23.
+_OCTAHEDRON = np.array([[0, 1, 3, 5], [0, 3, 4, 5], [0, 2, 4, 5],
+                        [0, 1, 2, 5]])
+
+
+def _cgal_regular():
+    '''The compiled cgal_regular module.'''
+    try:
+        import cgal_regular
+    except ImportError as error:
+        raise ImportError(
+              'the cgal backend needs the cgal_regular extension, built by '
+              'the cgal_regular target of cpp/CMakeLists.txt') from error
+    return cgal_regular
+
+
+def first_generation_mask(vertices, simplices):
+    '''Classify the simplices of an order-k mosaic as first generation.
+
+    A simplex is first generation if its vertices have exactly k-1 points
+    in common. Within a row of vertices every point is distinct, so after
+    sorting the points of all d+1 vertices of a simplex, a point is shared
+    by all vertices iff it is equal to the entry d positions further on.
+
+    Args:
+        vertices: (n_vertices, k) array of point indices.
+        simplices: (n_simplices, d+1) array of indices into vertices.
+
+    Returns:
+        Boolean array of length n_simplices.
+    '''
+    k = vertices.shape[1]
+    dimension = simplices.shape[1] - 1
+    points = np.sort(vertices[simplices].reshape(
+          len(simplices), (dimension + 1) * k), axis=1)
+    shared = np.count_nonzero(
+          points[:, dimension:] == points[:, :points.shape[1] - dimension],
+          axis=1)
+    return shared == k - 1
+
+
+def _block_offsets(blocks):
+    '''Offsets of the rows of a sequence of 2D arrays when flattened.'''
+    lengths = np.concatenate([np.full(len(block), block.shape[1],
+                                      dtype=np.int64) for block in blocks])
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return offsets
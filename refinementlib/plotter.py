@@ -9,6 +9,12 @@ import mpl_toolkits.mplot3d as a3
 import numpy as np
 import pylab
 
+try:
+    from .simplicial_complex import SimplicialComplex
+except ImportError:
+    # Imported as a top-level module, as by main.py.
+    from simplicial_complex import SimplicialComplex
+
 class Plotter:
     '''Abstract class for plotting order-k Delaunay mosaics.
 
@@ -31,6 +37,8 @@ class Plotter:
         '''
         self._points = points
         self._orderk_delaunay = orderk_delaunay
+        # SimplicialComplex of the triangulation of each order drawn so far
+        self._complexes = dict()
 
         # Whether to draw a label for each vertex
         self.draw_labels = False
@@ -54,6 +62,13 @@ class Plotter:
         '''Stub. Implemented by subclasses.'''
         pass
 
+    def simplicial_complex(self, order):
+        '''The SimplicialComplex of the order-k mosaic, computed once.'''
+        if order not in self._complexes:
+            self._complexes[order] = SimplicialComplex.from_orderk_delaunay(
+                  self._orderk_delaunay, order)
+        return self._complexes[order]
+
 
 class Plotter2D(Plotter):
 
@@ -65,6 +80,10 @@ class Plotter2D(Plotter):
         cells = self._orderk_delaunay.diagrams_cells[order-1]
         generations = self._orderk_delaunay.diagrams_generations[order-1]
 
+        # Geometric vertices, i.e. the centroids of the order-k points.
+        scomplex = self.simplicial_complex(order)
+        centroids = scomplex.positions
+
         if ax is None:
             ax = plt.gca()
         else:
@@ -73,13 +92,7 @@ class Plotter2D(Plotter):
         # Either new_nextgen_cells or triangulated_cells is empty, depending on
         # whether 'triangulate' is True or False.
         for tri, gen in zip(cells, generations):
-            vxs = []
-            for vx in tri:
-                xs = [self._points[c][0] for c in vx]
-                ys = [self._points[c][1] for c in vx]
-                xcenter = sum(xs)/len(xs)
-                ycenter = sum(ys)/len(ys)
-                vxs.append([xcenter, ycenter])
+            vxs = centroids[scomplex.point_set_index(tri)]
             p = plt.Polygon(vxs, closed=True, fill=True,
                             color=self.colors_cells[gen-1], alpha = 0.4)
             ax.add_patch(p)
@@ -90,7 +103,6 @@ class Plotter2D(Plotter):
                 ax.add_artist(line)
 
         # order-k points
-        centroids = np.array([np.sum([self._points[i] for i in vertex], axis=0)/order for vertex in vertices])
         ax.plot(centroids[:,0], centroids[:,1], 'o', color="black")
         if self.draw_labels:
             for c, v in zip(centroids, vertices):
@@ -118,50 +130,34 @@ class Plotter3D(Plotter):
         cells = self._orderk_delaunay.diagrams_cells[order-1]
         generations = self._orderk_delaunay.diagrams_generations[order-1]
 
+        # Geometric vertices, i.e. the centroids of the order-k points.
+        scomplex = self.simplicial_complex(order)
+        centroids = scomplex.positions
+        # Triangles of the triangulation which lie on the boundary of a cell,
+        # i.e. don't contain a diagonal of an octahedron.
+        is_facet = scomplex.mosaic_faces(2)
+
         ax = a3.Axes3D(pylab.figure())
         for cell, gen in zip(cells, generations):
-            gvertices = []
-            # compute the geometric vertices
-            for gvertex in cell:
-                gvertices.append(np.mean(np.array(
-                      [self._points[i][0:3] for i in gvertex]), axis=0))
-            gvertices = np.array(gvertices)
+            cell_vertices = scomplex.point_set_index(cell)
+            gvertices = centroids[cell_vertices]
             col = self.colors_cells[gen-1]
-            faces = []
             cell_center = np.mean(gvertices, axis=0)
 
-            # tetrahedron
-            if len(cell) == 4:
-                for facet in itertools.combinations(gvertices, 3):
-                    # geometric facet
-                    gfacet = [gv[0:3]*(1-self.shrinking_factor) + \
-                          cell_center*(self.shrinking_factor) for gv in facet]
-                    faces.append(gfacet)
-            # octahedron
-            elif len(cell) == 6:
-                for facet_ids in itertools.combinations(range(len(gvertices)), 3):
-                    facet = [cell[i] for i in facet_ids]
-                    gfacet = [gvertices[i] for i in facet_ids]
-                    is_facet = True
-                    # three vertices only span a facet if they pairwise differ
-                    # in only one element.
-                    for edge in itertools.combinations(facet, 2):
-                        if len(set(edge[0]) & set(edge[1])) != order-1:
-                            is_facet = False
-                    if is_facet:
-                        # geometric facet
-                        gfacet = [gv[0:3]*(1-self.shrinking_factor) + \
-                              cell_center*(self.shrinking_factor)
-                                    for gv in gfacet]
-                        faces.append(gfacet)
+            # The facets of a cell (a tetrahedron or an octahedron) are the
+            # triangles spanned by its vertices that are facets.
+            facet_ids = np.array(list(itertools.combinations(
+                  range(len(cell_vertices)), 3)))
+            triangles = scomplex.index(2, cell_vertices[facet_ids])
+            facet_ids = facet_ids[(triangles >= 0) & is_facet[triangles]]
+            # geometric facets
+            faces = gvertices[facet_ids]*(1-self.shrinking_factor) + \
+                  cell_center*(self.shrinking_factor)
             tri = a3.art3d.Poly3DCollection(faces, alpha=0.2)
             tri.set_color(col)
             tri.set_edgecolor('k')
             ax.add_collection3d(tri)
         # order-k points
-        centroids = np.array([np.sum(
-              [self._points[i] for i in vertex], axis=0)/order
-                    for vertex in vertices])
         ax.scatter(centroids[:,0], centroids[:,1], centroids[:,2], 'o',
                    color="black")
         if self.draw_labels:
@@ -2,17 +2,19 @@
 import matplotlib
 matplotlib.use('Agg')  # non-interactive, no Qt required
 
-import io
-import base64
 import triangle as tr
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.animation import FuncAnimation, PillowWriter
 
 from rhomboidtiling_convex_collective.refinementlib.angles import (
-    compute_triangle_angles,
+    complex_triangle_angles,
     refinement_histogram
 )
+from rhomboidtiling_convex_collective.refinementlib.frames import (
+    png_data_uri,
+    render_frames
+)
 from rhomboidtiling_convex_collective.refinementlib.orderk_delaunay import OrderKDelaunay
 from rhomboidtiling_convex_collective.refinementlib.plotter import Plotter2D
 
@@ -43,33 +45,109 @@ from rhomboidtiling_convex_collective.refinementlib.plotter import Plotter2D
 #     return refined_vertices, new_vertices
 
 def refine_with_k_steiner_points(points, k=5, min_angle=20):
-    """Refine mesh with incremental Steiner points and minimum angle constraint"""
+    """Refine mesh with incremental Steiner points and minimum angle constraint
+
+    Each step re-triangulates the mesh with one more Steiner point. See
+    refine_in_one_run for a single refinement run, whose steps are
+    prefixes of the vertices of its final mesh.
+    """
 
     mesh = tr.triangulate({"vertices": points}, opts="c")  #Initial triangulation
-    #original_vertices = set(map(tuple, points))
     steps = [mesh]
-    steiner_added = 0
 
     for _ in range(k):
-        prev_vertices = set(map(tuple, mesh["vertices"]))
-
         # Refine with  min angle and 1 Steiner point
         opts = f"rq{min_angle}S1"
         refined_mesh = tr.triangulate(mesh,opts=opts)
 
         # Check if new vertices (Steiner points) were added
-        new_vertices = set(map(tuple, refined_mesh["vertices"])) - prev_vertices
+        new_vertices = _new_vertex_indices(mesh["vertices"],
+                                           refined_mesh["vertices"])
         if len(new_vertices) == 0:
             break  # No more refinement possible
 
         steps.append(refined_mesh)
         mesh = refined_mesh
-        steiner_added += len(new_vertices)
 
     return steps
 
 
-def animate_refinement(refinement_steps, original_points, min_angle):
+def refine_in_one_run(points, k=5, min_angle=20):
+    """Refine mesh with up to k Steiner points in a single triangle run
+
+    The steps are prefixes of the vertices of the final mesh, with the
+    input vertices first and the Steiner points after them in Triangle's
+    numbering: step j holds the input vertices and the Steiner points
+    numbered first j. They are not the states the run went through, nor
+    those of runs stopped after j points: Triangle does not report the
+    order in which it inserted the Steiner points, and it reuses the slots
+    of points it removes again. Neither are they the steps of
+    refine_with_k_steiner_points, which refine the previous step by one
+    point each.
+
+    Returns:
+        List of steps, each a dict with the "vertices" of the step and the
+        indices of the vertex it adds as "new_vertices" (none for the
+        initial triangulation). The last step also holds the "triangles"
+        of the refined mesh.
+    """
+    mesh = tr.triangulate({"vertices": points}, opts="c")
+    refined_mesh = tr.triangulate(mesh, opts=f"rq{min_angle}S{k}")
+    vertices = refined_mesh["vertices"]
+    steiner = _new_vertex_indices(mesh["vertices"], vertices)
+    n_input = len(vertices) - len(steiner)
+    if not np.array_equal(steiner, np.arange(n_input, len(vertices))):
+        # Move the Steiner points to the end, keeping their order.
+        order = np.concatenate([np.setdiff1d(np.arange(len(vertices)),
+                                             steiner), steiner])
+        vertices = vertices[order]
+        refined_mesh["triangles"] = np.argsort(order)[
+            refined_mesh["triangles"]]
+
+    steps = [{"vertices": vertices[:n_input + j],
+              "new_vertices": np.arange(n_input + j - 1, n_input + j)
+              if j else np.zeros(0, dtype=np.int64)}
+             for j in range(len(steiner) + 1)]
+    steps[-1]["triangles"] = refined_mesh["triangles"]
+    return steps
+
+
+def _new_vertex_indices(previous, vertices):
+    """Indices of the rows of vertices that are not rows of previous."""
+    if len(vertices) >= len(previous) and \
+            np.array_equal(vertices[:len(previous)], previous):
+        # Triangle keeps the vertices it had and appends the new ones.
+        return np.arange(len(previous), len(vertices))
+    rows = np.dtype((np.void, vertices.dtype.itemsize * vertices.shape[1]))
+    known = np.isin(np.ascontiguousarray(vertices).view(rows).ravel(),
+                    np.ascontiguousarray(previous).view(rows).ravel())
+    return np.flatnonzero(~known)
+
+
+def order2_delaunay(pts, cache=None, compact=False):
+    """Order-2 Delaunay of pts (which also holds order 1), from cache if given"""
+    if cache is None:
+        return OrderKDelaunay(pts, order=2, compact=compact)
+    return cache.get(pts, 2, compact=compact)
+
+
+def next_order2_delaunay(okdel, previous_pts, pts, cache=None):
+    """Order-2 Delaunay of pts, updating okdel of previous_pts if possible
+
+    A refinement step adds its Steiner points after the vertices of the
+    step before, so when pts extends previous_pts they are inserted into
+    okdel (which is modified) instead of computing the mosaics anew.
+    """
+    if okdel is not None and len(pts) >= len(previous_pts) and \
+            np.array_equal(pts[:len(previous_pts)], previous_pts):
+        for point in pts[len(previous_pts):]:
+            okdel.insert_point(point)
+        return okdel
+    return order2_delaunay(pts, cache, compact=True)
+
+
+def animate_refinement(refinement_steps, original_points, min_angle,
+                       cache=None):
     fig = plt.figure(figsize=(14, 10))
     gs = plt.GridSpec(2, 2, height_ratios=[2, 1], hspace=0.5, wspace=0.3)
 
@@ -77,6 +155,8 @@ def animate_refinement(refinement_steps, original_points, min_angle):
     ax2 = fig.add_subplot(gs[0, 1])
     ax_hist1 = fig.add_subplot(gs[1, 0])
     ax_hist2 = fig.add_subplot(gs[1, 1])
+    # Mosaics of the last frame drawn and its points
+    last = [None, None]
 
     def update(frame):
         ax1.cla(); ax2.cla(); ax_hist1.cla(); ax_hist2.cla()
@@ -84,16 +164,18 @@ def animate_refinement(refinement_steps, original_points, min_angle):
         pts = mesh["vertices"]
         steiner_count = len(pts) - len(original_points)
 
-        order1 = OrderKDelaunay(pts, order=1)
-        Plotter2D(pts, order1).draw(order=1, ax=ax1)
+        order2 = next_order2_delaunay(last[0], last[1], pts, cache)
+        last[:] = order2, pts
+        order1 = order2
+        plotter = Plotter2D(pts, order1)
+        plotter.draw(order=1, ax=ax1)
         ax1.set_title(f"Order-1 | Steiner Points: {steiner_count}")
-        angles1 = compute_triangle_angles(pts, order1.diagrams_vertices[0], order1.diagrams_simplices[0])
+        angles1 = complex_triangle_angles(plotter.simplicial_complex(1))
         refinement_histogram(angles1, ax_hist1)
 
-        order2 = OrderKDelaunay(pts, order=2)
-        Plotter2D(pts, order2).draw(order=2, ax=ax2)
+        plotter.draw(order=2, ax=ax2)
         ax2.set_title(f"Order-2 | Steiner Points: {steiner_count}")
-        angles2 = compute_triangle_angles(pts, order2.diagrams_vertices[1], order2.diagrams_simplices[1])
+        angles2 = complex_triangle_angles(plotter.simplicial_complex(2))
         refinement_histogram(angles2, ax_hist2)
 
         return ax1, ax2, ax_hist1, ax_hist2
@@ -101,10 +183,43 @@ def animate_refinement(refinement_steps, original_points, min_angle):
     return FuncAnimation(fig, update, frames=len(refinement_steps), interval=500, repeat=False)
 
 
-def get_refinement_frames(refinement_steps, original_points, min_angle):
-    frames = []
-    for mesh in refinement_steps:
-        fig = plt.figure(figsize=(14, 10))
+def get_refinement_frames(refinement_steps, original_points, min_angle,
+                          cache=None, processes=None, figsize=(14, 10),
+                          dpi=None):
+    """List of the frame data URIs of iter_refinement_frames"""
+    return list(iter_refinement_frames(
+          refinement_steps, original_points, min_angle, cache, processes,
+          figsize, dpi))  # send array thru api animate endpoint, port 5000
+
+
+def iter_refinement_frames(refinement_steps, original_points, min_angle,
+                           cache=None, processes=None, figsize=(14, 10),
+                           dpi=None, chunk_size=None):
+    """Generate the data URIs of the frames of the refinement steps in order
+
+    The frames are rendered in parallel by a pool of worker processes
+    (processes, default: cpu count), each taking runs of chunk_size
+    consecutive steps, see render_frames. A worker updates the mosaics
+    from the first step up to each of its steps as in a single process,
+    so the frames do not depend on how the steps are divided. figsize (in
+    inches) and dpi set the size of the frames.
+    """
+    steps = [mesh["vertices"] for mesh in refinement_steps]
+    return render_frames(_refinement_frames, range(len(steps)), processes,
+                         chunk_size, steps=steps,
+                         n_original=len(original_points), cache=cache,
+                         figsize=figsize, dpi=dpi)
+
+
+def _refinement_frames(indices, steps, n_original, cache, figsize, dpi):
+    """Generate the data URIs of the frames of consecutive steps"""
+    order2frame, previous_pts = None, None
+    for pts in steps[:indices[0]]:
+        order2frame = next_order2_delaunay(order2frame, previous_pts, pts,
+                                           cache)
+        previous_pts = pts
+    for pts in steps[indices[0]:indices[-1] + 1]:
+        fig = plt.figure(figsize=figsize)
         gs = plt.GridSpec(2, 2, height_ratios=[2, 1], hspace=0.5, wspace=0.3)
 
         ax1 = fig.add_subplot(gs[0, 0])
@@ -112,32 +227,22 @@ def get_refinement_frames(refinement_steps, original_points, min_angle):
         ax_hist1 = fig.add_subplot(gs[1, 0])
         ax_hist2 = fig.add_subplot(gs[1, 1])
 
-        pts = mesh["vertices"]
-        steiner_count = len(pts) - len(original_points)
+        steiner_count = len(pts) - n_original
 
-        order1frame = OrderKDelaunay(pts, order=1)
-        Plotter2D(pts, order1frame).draw(order=1, ax=ax1)
+        order2frame = next_order2_delaunay(order2frame, previous_pts, pts,
+                                           cache)
+        previous_pts = pts
+        order1frame = order2frame
+        plotter = Plotter2D(pts, order1frame)
+        plotter.draw(order=1, ax=ax1)
         ax1.set_title(f"Order-1 | Steiner: {steiner_count}")
-        angles1 = compute_triangle_angles(pts, order1frame.diagrams_vertices[0], order1frame.diagrams_simplices[0])
+        angles1 = complex_triangle_angles(plotter.simplicial_complex(1))
         refinement_histogram(angles1, ax_hist1)
 
         # order‑2
-        order2frame = OrderKDelaunay(pts, order=2)
-        Plotter2D(pts, order2frame).draw(order=2, ax=ax2)
+        plotter.draw(order=2, ax=ax2)
         ax2.set_title(f"Order-2 | Steiner: {steiner_count}")
-        angles2 = compute_triangle_angles(pts, order2frame.diagrams_vertices[1], order2frame.diagrams_simplices[1])
+        angles2 = complex_triangle_angles(plotter.simplicial_complex(2))
         refinement_histogram(angles2, ax_hist2)
 
-        buf = io.BytesIO() # png of figure to mem
-        fig.savefig(buf, format='png')
-        plt.close(fig)
-        buf.seek(0)
-
-        # base64 encoding to array
-        data_uri = (
-          "data:image/png;base64,"
-          + base64.b64encode(buf.read()).decode('ascii')
-        )
-        frames.append(data_uri)
-
-    return frames # send array thru api animate endpoint, port 5000
+        yield png_data_uri(fig, dpi)
@@ -0,0 +1,197 @@
+'''Simplicial complexes of any dimension, stored as arrays.
+
+A SimplicialComplex holds all faces of a pure simplicial complex, such as
+the triangulation of an order-k Delaunay mosaic, together with the boundary
+and coboundary incidences between faces of consecutive dimensions. The
+faces are computed once, in a single sort-and-deduplicate pass per
+dimension, and can be shared by persistence, plotting and statistics.
+'''
+import numpy as np
+
+
+class SimplicialComplex:
+    '''
+    All faces of a pure simplicial complex.
+
+    Each p-dimensional face is a sorted row of p+1 vertex indices and is
+    referred to by its row index in faces[p]. Coboundaries are stored in
+    CSR style, as one flat array per dimension with offsets into it: the
+    entries for faces[p][i] are cofaces[p][coface_offsets[p][i]:
+    coface_offsets[p][i+1]].
+
+    Attributes:
+        dimension: dimension d of the top-dimensional simplices.
+        faces: list of d+1 int32 arrays; faces[p] is the lexicographically
+               sorted (n_p, p+1) array of the p-dimensional faces.
+        boundaries: list of d+1 int32 arrays; boundaries[p][i, j] is the
+               index in faces[p-1] of faces[p][i] without its j-th vertex.
+               boundaries[0] has no columns.
+        cofaces: list of d+1 flat int32 arrays; the (p+1)-faces containing
+               each p-face, as indices into faces[p+1]. Empty for p = d.
+        coface_vertices: list of d+1 flat int32 arrays, aligned with
+               cofaces; the vertex completing the p-face to each co-face.
+        coface_offsets: list of d+1 int64 arrays of length n_p + 1.
+        positions: (n_vertices, D) array of the coordinates of the
+               vertices, indexed by vertex index, or None.
+        point_sets: for the triangulation of an order-k mosaic, the
+               lexicographically sorted (n_vertices, k) array of the point
+               indices making up each vertex; otherwise None.
+    '''
+
+    def __init__(self, simplices, positions=None, point_sets=None):
+        '''
+        Args:
+            simplices: (n, d+1) array of the vertex indices of the
+                       top-dimensional simplices, in any order.
+            positions: optional array of vertex coordinates.
+            point_sets: optional array of the points of each vertex of an
+                        order-k mosaic, see the class attributes.
+        '''
+        simplices = np.asarray(simplices, dtype=np.int64)
+        self.dimension = simplices.shape[1] - 1
+        self.positions = positions
+        self.point_sets = point_sets
+        self._n_vertices = int(simplices.max()) + 1 if simplices.size else 0
+
+        dimension = self.dimension
+        top, _ = _unique_rows(np.sort(simplices, axis=1), self._n_vertices)
+        faces = [None] * dimension + [top]
+        boundaries = [None] * (dimension + 1)
+        self.cofaces = [None] * dimension + [np.zeros(0, dtype=np.int32)]
+        self.coface_vertices = list(self.cofaces)
+        self.coface_offsets = [None] * dimension + [
+              np.zeros(len(top) + 1, dtype=np.int64)]
+        for p in range(dimension - 1, -1, -1):
+            n_cofaces = len(faces[p + 1])
+            # Drop each column of each (p+1)-face in turn. As the (p+1)-faces
+            # are sorted rows, so are the remaining p-faces. Block j of the
+            # inverse holds the faces without the j-th vertex, which is
+            # column j of the boundary.
+            drops = [np.delete(faces[p + 1], j, axis=1) for j in range(p + 2)]
+            faces[p], inverse = _unique_rows(np.concatenate(drops),
+                                             self._n_vertices)
+            boundaries[p + 1] = inverse.reshape(p + 2, n_cofaces).T
+            order = np.argsort(inverse, kind='stable')
+            self.cofaces[p] = order % n_cofaces
+            self.coface_vertices[p] = faces[p + 1].T.reshape(-1)[order]
+            counts = np.bincount(inverse, minlength=len(faces[p]))
+            self.coface_offsets[p] = np.concatenate(
+                  [[0], np.cumsum(counts)]).astype(np.int64)
+        boundaries[0] = np.zeros((len(faces[0]), 0))
+
+        self.faces = [f.astype(np.int32) for f in faces]
+        self.boundaries = [b.astype(np.int32) for b in boundaries]
+        self.cofaces = [c.astype(np.int32) for c in self.cofaces]
+        self.coface_vertices = [c.astype(np.int32)
+                                for c in self.coface_vertices]
+
+    @classmethod
+    def from_orderk_delaunay(cls, okdel, order):
+        '''
+        The triangulation of the order-k mosaic of an OrderKDelaunay.
+
+        Works with both the list and the compact representation. The vertex
+        positions are the centroids of the points of each vertex.
+        '''
+        vertices = okdel.diagrams_vertices[order-1]
+        simplices = okdel.diagrams_simplices[order-1]
+        if hasattr(vertices, 'array'):
+            point_sets = vertices.array
+            simplices = simplices.data
+        else:
+            point_sets = np.array(vertices, dtype=np.int32)
+            simplices = np.array(simplices, dtype=np.int32)
+        point_sets = point_sets.reshape(-1, order)
+        simplices = simplices.reshape(-1, okdel.lifts.shape[1])
+        positions = okdel.lifts[point_sets, :-1].mean(axis=1)
+        return cls(simplices, positions, point_sets)
+
+    def __len__(self):
+        '''Total number of faces of all dimensions.'''
+        return sum(len(f) for f in self.faces)
+
+    def index(self, p, rows):
+        '''
+        Indices in faces[p] of rows of p+1 vertex indices, in any order
+        within each row; -1 for rows that are not faces of the complex.
+        '''
+        rows = np.sort(np.asarray(rows, dtype=np.int64).reshape(-1, p + 1),
+                       axis=1)
+        return _find_rows(self.faces[p], rows, self._n_vertices)
+
+    def point_set_index(self, point_sets):
+        '''
+        Vertex indices of vertices of an order-k mosaic given as k-tuples
+        of point indices in any order; -1 for point sets that are not
+        vertices.
+        '''
+        k = self.point_sets.shape[1]
+        rows = np.sort(np.asarray(point_sets, dtype=np.int64).reshape(-1, k),
+                       axis=1)
+        n_points = int(self.point_sets.max()) + 1
+        return _find_rows(self.point_sets, rows, n_points)
+
+    def mosaic_faces(self, p):
+        '''
+        Mask of the p-faces lying on faces of the cells of the order-k
+        mosaic, rather than cutting through a cell.
+
+        These are the faces whose vertices pairwise have k-1 points in
+        common; an edge between two vertices with fewer common points is a
+        diagonal of a cell, as in the octahedra of 3D mosaics.
+        '''
+        if p == 0:
+            return np.ones(len(self.faces[0]), dtype=bool)
+        if p > 1:
+            return np.all(self.mosaic_faces(p - 1)[self.boundaries[p]],
+                          axis=1)
+        k = self.point_sets.shape[1]
+        points = np.sort(self.point_sets[self.faces[1]].reshape(-1, 2 * k),
+                         axis=1)
+        shared = np.count_nonzero(points[:, 1:] == points[:, :-1], axis=1)
+        return shared == k - 1
+
+
+def _unique_rows(rows, base):
+    '''
+    Sorted unique rows of an array of integers in range(base), and the
+    index of each row among them. Rows are compared as single integers in
+    the given base whenever these fit into 64 bits, which is much faster
+    than np.unique(axis=0).
+    '''
+    width = rows.shape[1]
+    if base ** width >= 2 ** 63:
+        unique, inverse = np.unique(rows, axis=0, return_inverse=True)
+        return unique, inverse.reshape(-1)
+    keys = rows @ (base ** np.arange(width - 1, -1, -1))
+    _, first, inverse = np.unique(keys, return_index=True,
+                                  return_inverse=True)
+    return rows[first], inverse.reshape(-1)
+
+
+def _find_rows(table, rows, base):
+    '''
+    Indices of rows in table, a lexicographically sorted array of unique
+    rows of integers in range(base); -1 for rows not in table.
+    '''
+    width = table.shape[1]
+    result = np.full(len(rows), -1, dtype=np.int64)
+    if len(table) == 0 or len(rows) == 0:
+        return result
+    if base ** width >= 2 ** 63:
+        _, inverse = np.unique(np.concatenate([table, rows]), axis=0,
+                               return_inverse=True)
+        inverse = inverse.reshape(-1)
+        lookup = np.full(len(table) + len(rows), -1, dtype=np.int64)
+        lookup[inverse[:len(table)]] = np.arange(len(table))
+        return lookup[inverse[len(table):]]
+    # Rows with entries out of range would collide with other keys.
+    valid = np.all((rows >= 0) & (rows < base), axis=1)
+    weights = base ** np.arange(width - 1, -1, -1)
+    table_keys = table.astype(np.int64) @ weights
+    keys = rows[valid] @ weights
+    positions = np.minimum(np.searchsorted(table_keys, keys),
+                           len(table) - 1)
+    found = table_keys[positions] == keys
+    result[np.flatnonzero(valid)[found]] = positions[found]
+    return result
@@ -0,0 +1,129 @@
+import os
+import sys
+# Allow importing any modules relative to the main path, and the modules
+# importing the package by name from the directory holding the package.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..')))
+
+import unittest
+import numpy as np
+
+from rhomboidtiling_convex_collective.refinementlib.angles import (
+    TRIANGLE_ANGLES_DTYPE, AngleHistogram, batch_triangle_angles,
+    get_triangle_angles)
+
+
+class TestBatchTriangleAngles(unittest.TestCase):
+
+    def test_dtype(self):
+        angles = batch_triangle_angles([[0, 0], [1, 0], [0, 1]], [[0, 1, 2]])
+        self.assertEqual(angles.dtype, TRIANGLE_ANGLES_DTYPE)
+        self.assertEqual(set(angles.dtype.names),
+                         {'triangle', 'edge_lengths', 'angles_deg', 'area',
+                          'degenerate'})
+        self.assertEqual(angles['triangle'].shape, (1, 3))
+        self.assertEqual(angles['triangle'].tolist(), [[0, 1, 2]])
+        # Edge i is opposite vertex i.
+        np.testing.assert_allclose(angles['edge_lengths'],
+                                   [[np.sqrt(2), 1, 1]])
+        np.testing.assert_allclose(angles['angles_deg'], [[90, 45, 45]])
+        np.testing.assert_allclose(angles['area'], [0.5])
+        self.assertFalse(angles['degenerate'][0])
+
+    def test_matches_get_triangle_angles(self):
+        positions = np.random.RandomState(0).rand(30, 2)
+        triangles = np.random.RandomState(1).randint(0, 30, (100, 3))
+        triangles = triangles[[len(set(t)) == 3 for t in triangles]]
+        angles = batch_triangle_angles(positions, triangles)
+        self.assertEqual(len(angles), len(triangles))
+        for row, triangle in zip(angles, triangles):
+            expected = get_triangle_angles(*positions[triangle])
+            self.assertFalse(row['degenerate'])
+            np.testing.assert_allclose(row['angles_deg'],
+                                       np.degrees(expected))
+        np.testing.assert_allclose(angles['angles_deg'].sum(axis=1), 180)
+
+    def test_degenerate(self):
+        positions = [[0, 0], [1, 0], [2, 0], [0, 1], [1, 1e-12]]
+        # Collinear, repeated vertex, almost collinear, and a proper one.
+        triangles = [[0, 1, 2], [0, 0, 3], [0, 4, 2], [0, 1, 3]]
+        with np.errstate(all='raise'):
+            angles = batch_triangle_angles(positions, triangles)
+        self.assertEqual(angles['degenerate'].tolist(),
+                         [True, True, True, False])
+        for row in angles[:3]:
+            self.assertEqual(get_triangle_angles(
+                  *np.array(positions, dtype=float)[row['triangle']]), [])
+            self.assertTrue(np.all(np.isnan(row['angles_deg'])))
+        # The degenerate triangles are masked, the others are proper.
+        valid = angles['angles_deg'][~angles['degenerate']]
+        self.assertFalse(np.any(np.isnan(valid)))
+        np.testing.assert_allclose(valid.sum(axis=1), 180)
+
+
+class TestAngleHistogram(unittest.TestCase):
+
+    def setUp(self):
+        random = np.random.RandomState(2)
+        self.batches = [random.rand(n) * 180 for n in (100, 1, 0, 250)]
+        self.angles = np.concatenate(self.batches)
+
+    def test_counts(self):
+        histogram = AngleHistogram(bins=36)
+        for batch in self.batches:
+            histogram.add(batch)
+        counts, edges = np.histogram(self.angles, bins=36, range=(0, 180))
+        np.testing.assert_allclose(histogram.edges, edges)
+        self.assertEqual(histogram.counts.tolist(), counts.tolist())
+        self.assertEqual(histogram.count, len(self.angles))
+        self.assertAlmostEqual(histogram.mean, self.angles.mean())
+        self.assertEqual(histogram.min_angle, self.angles.min())
+        self.assertEqual(histogram.max_angle, self.angles.max())
+
+    def test_merge(self):
+        first = AngleHistogram().add(self.batches[0])
+        second = AngleHistogram().add(self.batches[3])
+        union = AngleHistogram().add(np.concatenate(
+              [self.batches[0], self.batches[3]]))
+        first.merge(second)
+        self.assertEqual(first.counts.tolist(), union.counts.tolist())
+        self.assertEqual(first.count, union.count)
+        self.assertAlmostEqual(first.total, union.total)
+        self.assertEqual(first.min_angle, union.min_angle)
+        self.assertEqual(first.max_angle, union.max_angle)
+        # Merging an empty histogram changes nothing.
+        first.merge(AngleHistogram())
+        self.assertEqual(first.count, union.count)
+        self.assertEqual(first.min_angle, union.min_angle)
+        with self.assertRaises(ValueError):
+            first.merge(AngleHistogram(bins=90))
+
+    def test_quantile(self):
+        histogram = AngleHistogram(bins=90).add(self.angles)
+        width = histogram.edges[1] - histogram.edges[0]
+        q = np.linspace(0, 1, 21)
+        estimates = histogram.quantile(q)
+        self.assertEqual(estimates.shape, q.shape)
+        self.assertTrue(np.all(
+              np.abs(estimates - np.quantile(self.angles, q)) <= width))
+        self.assertTrue(np.isnan(AngleHistogram().quantile(0.5)))
+
+    def test_degenerate(self):
+        positions = [[0, 0], [1, 0], [2, 0], [0, 1]]
+        angles = batch_triangle_angles(positions, [[0, 1, 2], [0, 1, 3],
+                                                   [1, 2, 3]])
+        histogram = AngleHistogram().add(angles)
+        # Only the angles of the two proper triangles are counted.
+        self.assertEqual(histogram.count, 6)
+        self.assertEqual(histogram.counts.sum(), 6)
+        self.assertAlmostEqual(histogram.total, 360)
+        # Nan angles and empty batches are left out, too.
+        histogram.add(np.array([np.nan, 90.0])).add(np.zeros(0))
+        self.assertEqual(histogram.count, 7)
+        self.assertTrue(np.isnan(AngleHistogram().mean))
+        self.assertTrue(np.isnan(AngleHistogram().add(
+              batch_triangle_angles(positions, [[0, 1, 2]])).min_angle))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import os
+import sys
+# Allow importing any modules relative to the main path.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import itertools
+import unittest
+import numpy as np
+
+from cohomology import cohomology_persistence_pairs
+from orderk_delaunay import OrderKDelaunay
+from simplicial_complex import SimplicialComplex
+
+
+def boundary_persistence_pairs(scomplex, sorted_cells):
+    '''Pairs of the standard reduction of the boundary matrix.'''
+    faces = [tuple(f) for p in range(scomplex.dimension + 1)
+             for f in scomplex.faces[p].tolist()]
+    rank = {faces[c]: i for i, c in enumerate(sorted_cells)}
+    columns = []
+    for c in sorted_cells:
+        face = faces[c]
+        columns.append(set() if len(face) == 1 else
+                       {rank[f] for f in itertools.combinations(face,
+                                                                len(face) - 1)})
+    pairs = []
+    lows = dict()
+    for j, column in enumerate(columns):
+        while column and max(column) in lows:
+            column ^= columns[lows[max(column)]]
+        if column:
+            lows[max(column)] = j
+            pairs.append((max(column), j))
+    return sorted(pairs)
+
+
+class TestCohomology(unittest.TestCase):
+
+    def test_hollow_triangle(self):
+        # Edges after their vertices, the triangle last.
+        scomplex = SimplicialComplex([[0, 1, 2]])
+        pairs = cohomology_persistence_pairs(scomplex, [0, 1, 2, 3, 4, 5, 6])
+        # Edge (0, 1) kills vertex 1, edge (0, 2) kills vertex 2, the
+        # triangle kills the cycle born with edge (1, 2).
+        self.assertEqual(pairs, [(1, 3), (2, 4), (5, 6)])
+
+    def test_random_filtrations(self):
+        rng = np.random.RandomState(0)
+        for dimension, n_points, order in [(2, 30, 1), (2, 20, 3),
+                                           (3, 15, 2), (4, 9, 2)]:
+            okdel = OrderKDelaunay(rng.rand(n_points, dimension), order)
+            scomplex = SimplicialComplex.from_orderk_delaunay(okdel, order)
+            dimensions = np.concatenate(
+                  [np.full(len(f), p) for p, f in enumerate(scomplex.faces)])
+            sorted_cells = np.lexsort((rng.rand(len(dimensions)),
+                                       dimensions))
+            self.assertEqual(
+                  cohomology_persistence_pairs(scomplex, sorted_cells),
+                  boundary_persistence_pairs(scomplex, sorted_cells.tolist()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import os
+import sys
+# Allow importing any modules relative to the main path, and the modules
+# importing the package by name from the directory holding the package.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..')))
+
+import threading
+import time
+import unittest
+
+from rhomboidtiling_convex_collective.refinementlib.frames import (
+    render_frames)
+
+
+def render(items, prefix='frame', delay=0):
+    '''Stands in for a frame renderer, yielding a string per item.'''
+    for item in items:
+        time.sleep(delay)
+        yield '%s-%s' % (prefix, item)
+
+
+class TestRenderFrames(unittest.TestCase):
+
+    def test_order(self):
+        items = list(range(11))
+        expected = ['frame-%d' % item for item in items]
+        for processes in (1, 2):
+            for chunk_size in (None, 1, 3, 11, 20):
+                self.assertEqual(
+                      list(render_frames(render, items, processes,
+                                         chunk_size)),
+                      expected)
+
+    def test_options(self):
+        self.assertEqual(
+              list(render_frames(render, 'ab', 2, 1, prefix='x')),
+              ['x-a', 'x-b'])
+
+    def test_empty(self):
+        for processes in (1, 2):
+            self.assertEqual(list(render_frames(render, [], processes)), [])
+
+    def test_abandoned(self):
+        # Rendering all frames takes 10 seconds in two workers; stopping
+        # after the first must cancel the rest.
+        frames = render_frames(render, range(200), 2, 1, delay=0.1)
+        self.assertEqual(next(frames), 'frame-0')
+        closing = threading.Thread(target=frames.close)
+        start = time.perf_counter()
+        closing.start()
+        closing.join(timeout=30)
+        self.assertFalse(closing.is_alive())
+        self.assertLess(time.perf_counter() - start, 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
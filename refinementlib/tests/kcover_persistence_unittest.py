@@ -0,0 +1,89 @@
+import os
+import sys
+# Allow importing any modules relative to the main path.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import itertools
+import unittest
+import numpy as np
+
+from kcover_persistence import (boundary_matrix_data, filtration_values,
+                                kcover_persistence, kcover_persistence_orders,
+                                parallel_filtration_values)
+from orderk_delaunay import OrderKDelaunay
+from simplicial_complex import SimplicialComplex
+
+
+class TestKCoverPersistence(unittest.TestCase):
+
+    def test_orders(self):
+        points = np.random.RandomState(0).rand(15, 3)
+        single = [kcover_persistence(points, k, engine='cohomology')
+                  for k in (1, 2, 3)]
+        for processes in (1, 2):
+            multi = kcover_persistence_orders(points, 3, processes,
+                                              engine='cohomology')
+            self.assertEqual(sorted(multi), [1, 2, 3])
+            for k, (ppairs, filtration, filtration_sorted) in \
+                  zip((1, 2, 3), single):
+                self.assertEqual(multi[k][0], ppairs)
+                self.assertEqual([cell for cell, _ in multi[k][2]],
+                                 [cell for cell, _ in filtration_sorted])
+                self.assertEqual(
+                      [info.radius for _, info in multi[k][2]],
+                      [info.radius for _, info in filtration_sorted])
+
+    def test_unknown_engine(self):
+        with self.assertRaises(ValueError):
+            kcover_persistence([[0, 0], [1, 0], [0, 1]], 1, engine='gudhi')
+
+    def test_boundary_matrix_data(self):
+        # Two tetrahedra sharing a triangle, with the faces of each
+        # dimension in random order.
+        scomplex = SimplicialComplex([[0, 1, 2, 3], [1, 2, 3, 4]])
+        cells = [tuple(face) for faces in scomplex.faces
+                 for face in faces.tolist()]
+        dimensions = [len(cell) - 1 for cell in cells]
+        sorted_cells = np.lexsort(
+              (np.random.RandomState(0).rand(len(cells)), dimensions))
+        ordered = [cells[i] for i in sorted_cells]
+
+        data = boundary_matrix_data(scomplex, sorted_cells)
+        self.assertEqual(data.dtype, np.int64)
+        self.assertEqual(data[0], len(cells))
+        position = 1
+        for cell in ordered:
+            dimension, n_entries = data[position:position + 2]
+            rows = data[position + 2:position + 2 + n_entries]
+            position += 2 + n_entries
+            self.assertEqual(dimension, len(cell) - 1)
+            self.assertEqual(list(rows), sorted(rows))
+            if dimension == 0:
+                self.assertEqual(n_entries, 0)
+            else:
+                self.assertEqual(
+                      [ordered[row] for row in rows.tolist()],
+                      sorted(itertools.combinations(cell, len(cell) - 1),
+                             key=ordered.index))
+        self.assertEqual(position, len(data))
+
+    def test_parallel_filtration_values(self):
+        for seed, dimension, order in [(1, 2, 3), (2, 3, 2)]:
+            points = np.random.RandomState(seed).rand(20, dimension)
+            scomplex = SimplicialComplex.from_orderk_delaunay(
+                  OrderKDelaunay(points, order), order)
+            serial = [filtration_values(points, scomplex.point_sets,
+                                        scomplex.faces[p],
+                                        scomplex.coface_vertices[p],
+                                        scomplex.coface_offsets[p])
+                      for p in range(dimension + 1)]
+            # Small chunks, so that each dimension is split between tasks.
+            parallel = parallel_filtration_values(points, scomplex, 2,
+                                                  chunk_size=7)
+            self.assertEqual(len(parallel), dimension + 1)
+            for values, expected in zip(parallel, serial):
+                np.testing.assert_array_equal(values, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
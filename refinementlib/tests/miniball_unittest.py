@@ -3,6 +3,7 @@ import sys
 # Allow importing any modules relative to the main path.
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
+import itertools
 import unittest
 import numpy as np
 from math import sqrt
@@ -12,6 +13,9 @@ from miniball.miniball_2d import miniexball_2d
 from miniball.miniball_3d import circumsphere_3d
 from miniball.miniball_3d import miniexball_3d
 from miniball.miniball import miniball, miniexball, miniexonball
+from miniball.batched import circumspheres, valid_spheres, miniexonballs
+from miniball.welzl import miniexonball_indices
+from miniball.memo import MiniballCache
 
 class TestMiniball2d(unittest.TestCase):
 
@@ -95,5 +99,191 @@ class TestMiniball2d(unittest.TestCase):
             miniexonball([[1, 0, 0], [0, 1, 0], [0, 0, 1]], [[0, 0, 0]], [[0.5, 0.5, 0.5]])
 
 
+class TestBatched(unittest.TestCase):
+
+    def test_circumspheres(self):
+        rng = np.random.RandomState(0)
+        for dim, circumsphere in ((2, circumsphere_2d), (3, circumsphere_3d)):
+            for j in range(1, dim + 2):
+                groups = rng.rand(20, j, dim)
+                centers, radii = circumspheres(groups)
+                for group, center, radius in zip(groups, centers, radii):
+                    cc, r = circumsphere(list(group))
+                    np.testing.assert_allclose(center, cc)
+                    self.assertAlmostEqual(radius, r)
+
+    def test_circumspheres_high_dim(self):
+        # The vertices of the standard simplex in 5D and the origin.
+        groups = np.vstack([np.zeros(5), np.eye(5)])[None]
+        centers, radii = circumspheres(groups)
+        np.testing.assert_allclose(centers, [[0.5] * 5])
+        np.testing.assert_allclose(radii, [sqrt(5)/2])
+
+    def test_circumspheres_degenerate(self):
+        centers, radii = circumspheres([[[0, 0], [1, 0], [2, 0]],
+                                        [[0, 0], [1, 0], [0, 1]]])
+        self.assertTrue(np.isnan(radii[0]))
+        self.assertTrue(np.all(np.isnan(centers[0])))
+        self.assertAlmostEqual(radii[1], sqrt(2)/2)
+
+    def test_valid_spheres(self):
+        centers = np.array([[0.0, 0.0], [1.0, 0.0], [0.0, 0.0]])
+        radii = np.array([1.0, 1.0, np.nan])
+        pin = [[0.5, 0], [1, 0], [1.5, 0]]
+        pout = [[2, 0], [1.5, 0]]
+        valid = valid_spheres(centers, radii, pin, [0, 0, 1], pout, [0, 1])
+        np.testing.assert_array_equal(valid, [True, False, False])
+        # Points on the sphere satisfy both kinds of constraints.
+        valid = valid_spheres(centers[:1], radii[:1], [[0, 1]], [0],
+                              [[1, 0]], [0], tolerance=0)
+        np.testing.assert_array_equal(valid, [True])
+
+
+class TestWelzl(unittest.TestCase):
+
+    # (pin, pon, pout) of the test cases of the recursive solvers.
+    cases = [
+        ([[0, 0], [1, 0], [0.5, 0.5]], [], []),
+        ([[0, 0], [1, 0], [0.5, 1]], [], []),
+        ([[0, 0], [1, 0]], [], [[0.5, 0.25]]),
+        ([[0, 0], [1, 0]], [[0.5, -1]], [[0.5, 0.3]]),
+        ([[0, 0, 0], [1, 0, 0], [0, 1, 0], [0, 0, 1]], [], []),
+        ([[-100, -100, -100], [55, 1, 0], [0, 33, 33], [100, 100, 100]],
+         [], []),
+        ([[1, 0, 0], [0, 1, 0], [0, 0, 1]], [], [[0, 0, 0]]),
+        ([[1, 0, 0], [0, 1, 0], [0, 0, 1]], [[0, 0, 0]], []),
+        ([[1, 0, 0], [0, 1, 0], [0, 0, 1], [0, 0, 0]], [],
+         [[0.5, 0.5, 0.5]]),
+        ([[0, 0, 0], [1, 0, 0]], [[0.5, -1, 0]], [[0.5, 0.3, 0]]),
+    ]
+
+    def solve(self, pin, pon, pout):
+        points = pin + pon + pout
+        indices = list(range(len(points)))
+        return miniexonball_indices(points, indices[:len(pin)],
+                                    indices[len(pin):len(pin) + len(pon)],
+                                    indices[len(pin) + len(pon):])
+
+    def test_cases(self):
+        for pin, pon, pout in self.cases:
+            recursive = miniexball_2d if len(pin[0]) == 2 else miniexball_3d
+            cc, r = recursive(list(pin), list(pon), list(pout))
+            center, radius = self.solve(pin, pon, pout)
+            np.testing.assert_allclose(center, cc, atol=1e-12)
+            self.assertAlmostEqual(radius, r)
+
+    def test_error(self):
+        with self.assertRaises(ValueError):
+            self.solve([[1, 0, 0], [0, 1, 0], [0, 0, 1]], [[0, 0, 0]],
+                       [[0.5, 0.5, 0.5]])
+
+    def test_random(self):
+        rng = np.random.RandomState(0)
+        for _ in range(200):
+            points = rng.rand(10, 3)
+            pin, pon, pout = [3, 5, 0, 8], [1, 7], [2, 4, 6, 9]
+            try:
+                cc, r = miniexball_3d(points[pin].tolist(),
+                                      points[pon].tolist(),
+                                      points[pout].tolist())
+            except ValueError:
+                with self.assertRaises(ValueError):
+                    miniexonball_indices(points, pin, pon, pout)
+                continue
+            center, radius = miniexonball_indices(points, pin, pon, pout)
+            np.testing.assert_allclose(center, cc)
+            self.assertAlmostEqual(radius, r)
+
+
+def brute_force_radius(points, pin, pon, pout):
+    '''Smallest valid circumsphere of pon and some other points.'''
+    radius = np.inf
+    others = pin + pout
+    dim = points.shape[1]
+    for n in range(dim + 2 - len(pon)):
+        for extra in itertools.combinations(others, n):
+            centers, radii = circumspheres(points[[pon + list(extra)]])
+            valid = valid_spheres(centers, radii, points[pin],
+                                  [0] * len(pin), points[pout],
+                                  [0] * len(pout), tolerance=1e-9)
+            if valid[0]:
+                radius = min(radius, radii[0])
+    return radius
+
+
+class TestHighDimensions(unittest.TestCase):
+
+    def test_mini_5d(self):
+        cc, r = miniball(np.vstack([np.eye(5), -np.eye(5)]))
+        np.testing.assert_allclose(cc, np.zeros(5), atol=1e-12)
+        self.assertAlmostEqual(r, 1)
+
+    def test_miniexon_4d(self):
+        # The origin is on the ball, the unit vectors are inside.
+        cc, r = miniexonball(np.eye(4).tolist(), [[0, 0, 0, 0]], [])
+        np.testing.assert_allclose(cc, [0.5] * 4)
+        self.assertAlmostEqual(r, 1)
+
+    def test_brute_force(self):
+        rng = np.random.RandomState(0)
+        for dim in (2, 3, 4, 5):
+            points = rng.rand(9, dim)
+            problems = []
+            for _ in range(30):
+                indices = rng.permutation(9).tolist()
+                a = rng.randint(0, 4)
+                b = a + rng.randint(1, 3)
+                problems.append((indices[:a], indices[a:b], indices[b:]))
+            for pin, pon, pout in problems:
+                expected = brute_force_radius(points, pin, pon, pout)
+                if np.isinf(expected):
+                    with self.assertRaises(ValueError):
+                        miniexonballs(points, [pin], [pon], [pout])
+                    continue
+                centers, radii = miniexonballs(points, [pin], [pon], [pout])
+                self.assertAlmostEqual(radii[0], expected)
+            feasible = [p for p in problems
+                        if np.isfinite(brute_force_radius(points, *p))]
+            centers, radii = miniexonballs(points, *zip(*feasible))
+            for (pin, pon, pout), center, radius in \
+                  zip(feasible, centers, radii):
+                np.testing.assert_allclose(
+                      np.linalg.norm(points[pon] - center, axis=1), radius)
+
+
+class TestMiniballCache(unittest.TestCase):
+
+    def test_lookups(self):
+        cache = MiniballCache(max_entries=2)
+        self.assertEqual(cache.key([1, 2], [3], []), cache.key([2, 1], [3], []))
+        self.assertIsNone(cache.get(cache.key([1], [], [])))
+        cache.put(cache.key([1], [], []), None, 0.0)
+        cache.put(cache.key([2], [], []), None, 0.0)
+        self.assertEqual(cache.get(cache.key([1], [], [])), (None, 0.0))
+        # The least recently used entry is dropped.
+        cache.put(cache.key([3], [], []), None, 0.0)
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get(cache.key([2], [], [])))
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+        self.assertAlmostEqual(cache.hit_rate, 1/3)
+
+    def test_miniexonballs(self):
+        points = np.random.RandomState(0).rand(10, 3)
+        points[6:] += 5
+        # A problem whose ball is not the circumsphere of pon.
+        problems = ([[0, 1, 2, 3, 4]], [[5]], [[6, 7, 8, 9]])
+        cache = MiniballCache()
+        centers, radii = miniexonballs(points, *problems, cache=cache)
+        self.assertEqual((cache.hits, cache.misses), (0, 1))
+        cached_centers, cached_radii = miniexonballs(
+              points, [[4, 3, 2, 1, 0]], [[5]], [[9, 8, 7, 6]], cache=cache)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        np.testing.assert_array_equal(cached_centers, centers)
+        np.testing.assert_array_equal(cached_radii, radii)
+        # Other points do not use the balls of these.
+        miniexonballs(points * 2, *problems, cache=cache)
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+
 if __name__ == '__main__':
     unittest.main()
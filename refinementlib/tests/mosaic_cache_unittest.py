@@ -0,0 +1,95 @@
+import os
+import sys
+# Allow importing any modules relative to the main path, and the modules
+# importing the package by name from the directory holding the package.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..')))
+
+import tempfile
+import unittest
+from unittest import mock
+import numpy as np
+
+from rhomboidtiling_convex_collective.refinementlib import mosaic_cache
+from rhomboidtiling_convex_collective.refinementlib.mosaic_cache import (
+    MosaicCache)
+from rhomboidtiling_convex_collective.refinementlib.orderk_delaunay import (
+    OrderKDelaunay, QhullBackend)
+
+
+class UnnamedBackend(QhullBackend):
+    '''A backend that is not registered under its name.'''
+
+
+class FailingMosaic:
+    '''Stands in for an OrderKDelaunay whose saving fails halfway.'''
+
+    def save(self, file):
+        file.write(b'partial')
+        raise IOError('disk full')
+
+
+class TestMosaicCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = MosaicCache(self.directory.name)
+        self.points = np.random.RandomState(0).rand(30, 2)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_hit(self):
+        with mock.patch.object(mosaic_cache, 'OrderKDelaunay',
+                               wraps=OrderKDelaunay) as constructor:
+            constructor._from_arrays = OrderKDelaunay._from_arrays
+            constructor.load = OrderKDelaunay.load
+            computed = self.cache.get(self.points, 2, compact=True)
+            loaded = self.cache.get(self.points, 2, compact=True)
+        self.assertEqual(constructor.call_count, 1)
+        self.assertEqual(len(os.listdir(self.directory.name)), 1)
+        expected = computed._to_arrays()
+        arrays = loaded._to_arrays()
+        self.assertEqual(sorted(arrays), sorted(expected))
+        for name in expected:
+            np.testing.assert_array_equal(arrays[name], expected[name])
+
+    def test_key(self):
+        key = self.cache.key(self.points, 2)
+        self.assertEqual(key, self.cache.key(self.points.tolist(), 2))
+        self.assertEqual(key, self.cache.key(self.points, 2, QhullBackend()))
+        self.assertNotEqual(key, self.cache.key(self.points, 3))
+        self.assertNotEqual(key, self.cache.key(self.points, 2, 'delaunay'))
+        self.assertNotEqual(
+              key, self.cache.key(self.points, 2, QhullBackend('Qbb Qc')))
+        with self.assertRaises(ValueError):
+            self.cache.key(self.points, 2, UnnamedBackend())
+        with self.assertRaises(ValueError):
+            self.cache.key(self.points, 2, QhullBackend(options=object()))
+
+    def test_evict(self):
+        paths = [self.cache._path('entry%d' % i) for i in range(3)]
+        for i, path in enumerate(paths):
+            with open(path, 'wb') as f:
+                f.write(b'x' * 100)
+            os.utime(path, (1000 + i, 1000 + i))
+        # Reading the oldest entry makes the second one least recently used.
+        os.utime(paths[0], (2000, 2000))
+        self.cache.max_bytes = 250
+        self.cache._evict()
+        self.assertEqual([os.path.exists(path) for path in paths],
+                         [True, False, True])
+        self.cache.max_bytes = 100
+        self.cache._evict()
+        self.assertEqual([os.path.exists(path) for path in paths],
+                         [True, False, False])
+
+    def test_failed_store(self):
+        path = self.cache._path('entry')
+        with self.assertRaises(IOError):
+            self.cache._store(path, FailingMosaic())
+        self.assertEqual(os.listdir(self.directory.name), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,209 @@
+import os
+import sys
+# Allow importing any modules relative to the main path.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import importlib.util
+import io
+import multiprocessing
+import unittest
+import numpy as np
+
+from orderk_delaunay import (OrderKDelaunay, NoJoggleBackend,
+                             first_generation_mask)
+
+
+def canonical_cells(okdel, k):
+    '''Order-independent representation of the cells of order k.'''
+    return sorted(
+          (int(gen), tuple(sorted(tuple(int(p) for p in vx) for vx in cell)))
+          for cell, gen in zip(okdel.diagrams_cells[k-1],
+                               okdel.diagrams_generations[k-1]))
+
+
+def canonical_simplices(okdel, k):
+    '''Simplices of order k with vertices given as point tuples.'''
+    vertices = okdel.diagrams_vertices[k-1]
+    return sorted(tuple(sorted(tuple(int(p) for p in vertices[i])
+                               for i in simplex))
+                  for simplex in okdel.diagrams_simplices[k-1])
+
+
+class TestOrderKDelaunay(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.points_2d = rng.rand(30, 2)
+        self.points_3d = rng.rand(15, 3)
+
+    def assertSameMosaics(self, a, b, order):
+        for k in range(1, order + 1):
+            self.assertEqual(
+                  sorted(tuple(int(p) for p in v)
+                         for v in a.diagrams_vertices[k-1]),
+                  sorted(tuple(int(p) for p in v)
+                         for v in b.diagrams_vertices[k-1]))
+            self.assertEqual(canonical_simplices(a, k),
+                             canonical_simplices(b, k))
+            self.assertEqual(canonical_cells(a, k), canonical_cells(b, k))
+
+    def test_compact_2d(self):
+        okdel = OrderKDelaunay(self.points_2d, 4)
+        compact = OrderKDelaunay(self.points_2d, 4, compact=True)
+        self.assertSameMosaics(okdel, compact, 4)
+
+    def test_compact_3d(self):
+        okdel = OrderKDelaunay(self.points_3d, 3)
+        compact = OrderKDelaunay(self.points_3d, 3, compact=True)
+        self.assertSameMosaics(okdel, compact, 3)
+
+    def test_pipelined(self):
+        for points, order in [(self.points_2d, 4), (self.points_3d, 3)]:
+            okdel = OrderKDelaunay(points, order)
+            pipelined = OrderKDelaunay(points, order, pipelined=True)
+            self.assertEqual(okdel.diagrams_vertices,
+                             pipelined.diagrams_vertices)
+            self.assertEqual(okdel.diagrams_simplices,
+                             pipelined.diagrams_simplices)
+            self.assertEqual(okdel.diagrams_cells, pipelined.diagrams_cells)
+            self.assertEqual(okdel.diagrams_generations,
+                             pipelined.diagrams_generations)
+
+    def test_iter_orders(self):
+        okdel = OrderKDelaunay(self.points_2d, 4)
+        orders = list(OrderKDelaunay.iter_orders(self.points_2d, 4))
+        self.assertEqual([k for k, *_ in orders], [1, 2, 3, 4])
+        for k, vertices, simplices, cells, generations in orders:
+            self.assertEqual(vertices, okdel.diagrams_vertices[k-1])
+            self.assertEqual(simplices, okdel.diagrams_simplices[k-1])
+            self.assertEqual(cells, okdel.diagrams_cells[k-1])
+            self.assertEqual(generations, okdel.diagrams_generations[k-1])
+
+    def test_iter_orders_abandoned(self):
+        # Stopping after the first order must not leave the worker running.
+        orders = OrderKDelaunay.iter_orders(self.points_2d, 4, pipelined=True)
+        self.assertEqual(next(orders)[0], 1)
+        orders.close()
+        self.assertEqual(multiprocessing.active_children(), [])
+
+    def test_delaunay_backend(self):
+        for points, order in [(self.points_2d, 4), (self.points_3d, 3)]:
+            okdel = OrderKDelaunay(points, order)
+            delaunay = OrderKDelaunay(points, order, backend='delaunay')
+            for k in range(1, order + 1):
+                self.assertEqual(canonical_cells(delaunay, k),
+                                 canonical_cells(okdel, k))
+        with self.assertRaises(ValueError):
+            OrderKDelaunay(self.points_2d, 2, backend='unknown')
+
+    def test_nojoggle_backend(self):
+        for points, order in [(self.points_2d, 4), (self.points_3d, 3)]:
+            okdel = OrderKDelaunay(points, order)
+            nojoggle = OrderKDelaunay(points, order, backend='nojoggle')
+            for k in range(1, order + 1):
+                self.assertEqual(canonical_cells(nojoggle, k),
+                                 canonical_cells(okdel, k))
+        # Cospherical points give flat simplices without joggling.
+        grid = np.array(list(np.ndindex(3, 3, 3)), dtype=float)
+        with self.assertRaises(ValueError):
+            OrderKDelaunay(grid, 2, backend=NoJoggleBackend(fallback=None))
+        OrderKDelaunay(grid, 2, backend=NoJoggleBackend(fallback='hull'))
+
+    @unittest.skipIf(importlib.util.find_spec('cgal_regular') is None,
+                     'needs the cgal_regular extension module')
+    def test_cgal_backend(self):
+        for points, order in [(self.points_2d, 4), (self.points_3d, 3)]:
+            okdel = OrderKDelaunay(points, order)
+            cgal = OrderKDelaunay(points, order, backend='cgal')
+            for k in range(1, order + 1):
+                self.assertEqual(canonical_cells(cgal, k),
+                                 canonical_cells(okdel, k))
+
+    def test_extend(self):
+        for points, order in [(self.points_2d, 4), (self.points_3d, 3)]:
+            okdel = OrderKDelaunay(points, order)
+            for pipelined in [False, True]:
+                extended = OrderKDelaunay(points, 1)
+                extended.extend(2)
+                extended.extend(order, pipelined=pipelined)
+                self.assertEqual(extended.order, order)
+                self.assertEqual(extended.diagrams_vertices,
+                                 okdel.diagrams_vertices)
+                self.assertEqual(extended.diagrams_cells,
+                                 okdel.diagrams_cells)
+
+    def test_save_load(self):
+        okdel = OrderKDelaunay(self.points_2d, 4)
+        for compact in [False, True]:
+            f = io.BytesIO()
+            OrderKDelaunay(self.points_2d, 2, compact=compact,
+                           backend=NoJoggleBackend(fallback=None)).save(f)
+            f.seek(0)
+            loaded = OrderKDelaunay.load(f, compact=not compact)
+            self.assertEqual(loaded.order, 2)
+            self.assertEqual(repr(loaded._backend),
+                             repr(NoJoggleBackend(fallback=None)))
+            loaded.extend(4)
+            self.assertSameMosaics(loaded, okdel, 4)
+
+    def test_compact_layout(self):
+        compact = OrderKDelaunay(self.points_2d, 3, compact=True)
+        for k in range(1, 4):
+            varray = compact.diagrams_vertices[k-1].array
+            self.assertEqual(varray.dtype, np.int32)
+            self.assertEqual(varray.shape[1], k)
+            # rows are sorted, and sorted lexicographically
+            self.assertTrue(np.all(np.diff(varray, axis=1) > 0))
+            self.assertEqual([tuple(v) for v in varray.tolist()],
+                             sorted(tuple(v) for v in varray.tolist()))
+            cells = compact.diagrams_cells[k-1]
+            self.assertEqual(len(cells.offsets), len(cells) + 1)
+            self.assertEqual(cells.offsets[-1], len(cells.data))
+
+    def test_insert_point(self):
+        rng = np.random.RandomState(1)
+        for points, order in [(self.points_2d, 1), (self.points_2d, 2),
+                              (self.points_3d, 2)]:
+            dimension = points.shape[1]
+            for compact in [False, True]:
+                okdel = OrderKDelaunay(points, order, compact=compact)
+                inserted = points
+                for point in rng.rand(5, dimension) * 0.8 + 0.1:
+                    self.assertEqual(okdel.insert_point(point),
+                                     len(inserted))
+                    inserted = np.vstack([inserted, point])
+                    fresh = OrderKDelaunay(inserted, order)
+                    if dimension == 2:
+                        self.assertSameMosaics(okdel, fresh, order)
+                    else:
+                        # Octahedral cells may be triangulated differently.
+                        for k in range(1, order + 1):
+                            self.assertEqual(canonical_cells(okdel, k),
+                                             canonical_cells(fresh, k))
+                # The cells kept for extend() are updated as well.
+                okdel.extend(3)
+                fresh.extend(3)
+                self.assertEqual(canonical_cells(okdel, 3),
+                                 canonical_cells(fresh, 3))
+
+    def test_insert_point_outside(self):
+        okdel = OrderKDelaunay(self.points_2d, 2)
+        okdel.insert_point([2., 2.])
+        self.assertSameMosaics(
+              okdel, OrderKDelaunay(np.vstack([self.points_2d, [2., 2.]]), 2),
+              2)
+        okdel.extend(3)
+        with self.assertRaises(ValueError):
+            okdel.insert_point([.5, .5])
+
+    def test_first_generation_mask(self):
+        vertices = np.array([[0, 1], [0, 2], [1, 2], [0, 3], [2, 3]])
+        simplices = np.array([[0, 1, 3], [0, 1, 2], [1, 2, 3]])
+        np.testing.assert_array_equal(
+              first_generation_mask(vertices, simplices), [True, False, False])
+        self.assertEqual(
+              len(first_generation_mask(vertices, simplices[:0])), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
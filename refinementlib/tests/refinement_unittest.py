@@ -0,0 +1,93 @@
+import os
+import sys
+# Allow importing any modules relative to the main path, and the modules
+# importing the package by name from the directory holding the package.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..')))
+
+import unittest
+from unittest import mock
+import numpy as np
+import triangle as tr
+
+from rhomboidtiling_convex_collective.refinementlib import refinement
+from rhomboidtiling_convex_collective.refinementlib.refinement import (
+    refine_in_one_run)
+
+# Triangle itself, also while refinement.tr.triangulate is patched.
+triangulate = tr.triangulate
+
+
+def triangle_corners(vertices, triangles):
+    '''The set of triangles, each as the set of its corner coordinates.'''
+    return {frozenset(map(tuple, vertices[triangle].tolist()))
+            for triangle in triangles}
+
+
+def reversed_triangulate(mesh, opts):
+    '''tr.triangulate, numbering the vertices of a refinement backwards.'''
+    result = triangulate(mesh, opts)
+    if 'r' in opts:
+        order = np.arange(len(result['vertices']))[::-1]
+        result['vertices'] = result['vertices'][order]
+        result['triangles'] = np.argsort(order)[result['triangles']]
+    return result
+
+
+class TestRefineInOneRun(unittest.TestCase):
+
+    def setUp(self):
+        self.points = np.random.RandomState(0).rand(12, 2)
+
+    def assertSteps(self, steps, k):
+        n_input = len(self.points)
+        self.assertEqual(len(steps), k + 1)
+        # Step 0 holds the input vertices.
+        self.assertEqual(sorted(map(tuple, steps[0]['vertices'].tolist())),
+                         sorted(map(tuple, self.points.tolist())))
+        self.assertEqual(len(steps[0]['new_vertices']), 0)
+        for j, (step, following) in enumerate(zip(steps, steps[1:]), 1):
+            self.assertNotIn('triangles', step)
+            np.testing.assert_array_equal(
+                  following['vertices'][:len(step['vertices'])],
+                  step['vertices'])
+            self.assertEqual(len(following['vertices']), n_input + j)
+            self.assertEqual(following['new_vertices'].tolist(),
+                             [n_input + j - 1])
+
+    def test_steps(self):
+        k = 5
+        steps = refine_in_one_run(self.points, k, 25)
+        self.assertSteps(steps, k)
+        # The triangles index the vertices as Triangle's own output does.
+        mesh = tr.triangulate({'vertices': self.points}, opts='c')
+        refined = tr.triangulate(mesh, opts='rq25S%d' % k)
+        self.assertEqual(
+              triangle_corners(steps[-1]['vertices'], steps[-1]['triangles']),
+              triangle_corners(refined['vertices'], refined['triangles']))
+
+    def test_reordered_vertices(self):
+        # The Steiner points are moved after the input vertices when
+        # Triangle does not number them last.
+        k = 4
+        with mock.patch.object(refinement.tr, 'triangulate',
+                               side_effect=reversed_triangulate):
+            steps = refine_in_one_run(self.points, k, 25)
+        self.assertSteps(steps, k)
+        refined = reversed_triangulate(
+              tr.triangulate({'vertices': self.points}, opts='c'),
+              'rq25S%d' % k)
+        self.assertEqual(
+              triangle_corners(steps[-1]['vertices'], steps[-1]['triangles']),
+              triangle_corners(refined['vertices'], refined['triangles']))
+        # Steiner points keep the order Triangle gives them.
+        steiner = [tuple(vertex) for vertex in refined['vertices'].tolist()
+                   if vertex not in self.points.tolist()]
+        self.assertEqual(
+              [tuple(vertex) for vertex
+               in steps[-1]['vertices'][len(self.points):].tolist()],
+              steiner)
+
+
+if __name__ == '__main__':
+    unittest.main()
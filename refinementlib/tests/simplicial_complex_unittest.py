@@ -0,0 +1,126 @@
+import os
+import sys
+# Allow importing any modules relative to the main path.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import itertools
+import unittest
+import numpy as np
+
+from orderk_delaunay import OrderKDelaunay
+from simplicial_complex import SimplicialComplex, _find_rows
+
+
+def all_faces(simplices, p):
+    '''Sorted p-faces of the simplices, by brute force.'''
+    return sorted({face for simplex in simplices
+                   for face in itertools.combinations(sorted(simplex), p + 1)})
+
+
+class TestSimplicialComplex(unittest.TestCase):
+
+    def test_faces(self):
+        rng = np.random.RandomState(0)
+        for dimension, n_points, order in [(2, 20, 3), (3, 12, 2), (4, 10, 2)]:
+            okdel = OrderKDelaunay(rng.rand(n_points, dimension), order)
+            simplices = okdel.diagrams_simplices[order-1]
+            scomplex = SimplicialComplex.from_orderk_delaunay(okdel, order)
+            self.assertEqual(scomplex.dimension, dimension)
+            for p in range(dimension + 1):
+                faces = all_faces(simplices, p)
+                self.assertEqual([tuple(f) for f in scomplex.faces[p].tolist()],
+                                 faces)
+                np.testing.assert_array_equal(
+                      scomplex.index(p, scomplex.faces[p][:, ::-1]),
+                      np.arange(len(faces)))
+
+    def test_incidences(self):
+        # Two triangles sharing the edge (1, 2).
+        scomplex = SimplicialComplex([[2, 1, 0], [1, 2, 3]])
+        np.testing.assert_array_equal(
+              scomplex.faces[1], [[0, 1], [0, 2], [1, 2], [1, 3], [2, 3]])
+        # Triangle (0, 1, 2) without vertex 0, 1 and 2 respectively.
+        np.testing.assert_array_equal(scomplex.boundaries[2][0], [2, 1, 0])
+        np.testing.assert_array_equal(scomplex.boundaries[1][2], [2, 1])
+        offsets = scomplex.coface_offsets[1]
+        edge = scomplex.index(1, [[2, 1]])[0]
+        self.assertEqual(
+              sorted(scomplex.cofaces[1][offsets[edge]:offsets[edge+1]]),
+              [0, 1])
+        self.assertEqual(sorted(
+              scomplex.coface_vertices[1][offsets[edge]:offsets[edge+1]]),
+              [0, 3])
+        self.assertEqual(scomplex.index(1, [[0, 3]])[0], -1)
+        self.assertEqual(len(scomplex), 4 + 5 + 2)
+
+    def test_cofaces_and_index(self):
+        # Against brute force set computations, on a 3D mosaic.
+        okdel = OrderKDelaunay(np.random.RandomState(2).rand(12, 3), 2)
+        scomplex = SimplicialComplex.from_orderk_delaunay(okdel, 2)
+        for p in range(scomplex.dimension):
+            faces = [set(f) for f in scomplex.faces[p].tolist()]
+            cofaces = [set(f) for f in scomplex.faces[p + 1].tolist()]
+            offsets = scomplex.coface_offsets[p]
+            for i, face in enumerate(faces):
+                begin, end = offsets[i], offsets[i + 1]
+                expected = [j for j, coface in enumerate(cofaces)
+                            if face < coface]
+                self.assertEqual(sorted(scomplex.cofaces[p][begin:end]),
+                                 expected)
+                self.assertEqual(
+                      sorted(scomplex.coface_vertices[p][begin:end]),
+                      sorted(next(iter(cofaces[j] - face))
+                             for j in expected))
+
+        rng = np.random.RandomState(3)
+        n_vertices = len(scomplex.faces[0])
+        for p in range(scomplex.dimension + 1):
+            lookup = {tuple(f): i
+                      for i, f in enumerate(scomplex.faces[p].tolist())}
+            # All faces with their columns permuted, and random rows, some
+            # with vertices out of range.
+            rows = np.concatenate([
+                  rng.permutation(scomplex.faces[p].T).T,
+                  rng.randint(-1, n_vertices + 2, (200, p + 1))])
+            expected = [lookup.get(tuple(sorted(row)), -1)
+                        for row in rows.tolist()]
+            np.testing.assert_array_equal(scomplex.index(p, rows), expected)
+            # The same without packing rows into single integers.
+            valid = np.all((rows >= 0) & (rows < n_vertices), axis=1)
+            np.testing.assert_array_equal(
+                  _find_rows(scomplex.faces[p], np.sort(rows[valid], axis=1),
+                             2 ** 63),
+                  np.array(expected)[valid])
+
+        point_sets = scomplex.point_sets.tolist()
+        queries = [row[::-1] for row in point_sets] + [[0, 0], [1, 100]]
+        np.testing.assert_array_equal(
+              scomplex.point_set_index(queries),
+              [point_sets.index(sorted(q)) if sorted(q) in point_sets
+               else -1 for q in queries])
+
+    def test_mosaic_faces(self):
+        # In 3D, the edges between vertices with k-2 common points are the
+        # diagonals of octahedra, and no other edges have fewer in common.
+        okdel = OrderKDelaunay(np.random.RandomState(1).rand(15, 3), 2)
+        scomplex = SimplicialComplex.from_orderk_delaunay(okdel, 2)
+        shared = [len(set(a) & set(b)) for a, b in
+                  scomplex.point_sets[scomplex.faces[1]].tolist()]
+        np.testing.assert_array_equal(scomplex.mosaic_faces(1),
+                                      np.array(shared) == 1)
+        # Each octahedron has 8 facets, each tetrahedron 4.
+        n_facets = sum(8 if len(cell) == 6 else 4
+                       for cell in okdel.diagrams_cells[1])
+        n_shared = np.count_nonzero(scomplex.mosaic_faces(2)) * 2 - \
+              len(_hull_facets(scomplex))
+        self.assertEqual(n_facets, n_shared)
+
+
+def _hull_facets(scomplex):
+    '''Triangles with a single tetrahedron as co-face.'''
+    counts = np.diff(scomplex.coface_offsets[2])
+    return np.flatnonzero(counts == 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
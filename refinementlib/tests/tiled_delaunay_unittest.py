@@ -0,0 +1,99 @@
+import os
+import sys
+# Allow importing any modules relative to the main path.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import time
+import unittest
+import matplotlib.pyplot as plt
+import numpy as np
+
+from orderk_delaunay import OrderKDelaunay
+from plotter import Plotter2D, Plotter3D
+from tiled_delaunay import TiledOrderKDelaunay
+
+
+def canonical_cells(okdel, k):
+    '''Order-independent representation of the cells of order k.'''
+    return sorted(
+          (int(gen), tuple(sorted(tuple(int(p) for p in vx) for vx in cell)))
+          for cell, gen in zip(okdel.diagrams_cells[k-1],
+                               okdel.diagrams_generations[k-1]))
+
+
+class TestTiledOrderKDelaunay(unittest.TestCase):
+
+    def assertSameCells(self, points, order, tiles, processes=2):
+        okdel = OrderKDelaunay(points, order)
+        tiled = TiledOrderKDelaunay(points, order, tiles=tiles,
+                                    processes=processes)
+        for k in range(1, order + 1):
+            self.assertEqual(canonical_cells(okdel, k),
+                             canonical_cells(tiled, k))
+            # Every simplex is output by exactly one tile.
+            simplices = [tuple(simplex)
+                         for simplex in tiled.diagrams_simplices[k-1]]
+            self.assertEqual(len(set(simplices)), len(simplices))
+        return tiled
+
+    def test_tiled_2d(self):
+        points = np.random.RandomState(1).rand(300, 2)
+        self.assertSameCells(points, 3, 3)
+
+    def test_tiled_3d(self):
+        points = np.random.RandomState(2).rand(150, 3)
+        self.assertSameCells(points, 2, 2)
+
+    def test_single_tile(self):
+        points = np.random.RandomState(3).rand(50, 2)
+        self.assertSameCells(points, 2, 1)
+
+    def test_bounded_tiles(self):
+        # Tiles at the convex hull get the points they need, instead of
+        # growing their halo to the whole point set.
+        points = np.random.RandomState(4).rand(3000, 2)
+        tiled = self.assertSameCells(points, 2, 3, processes=1)
+        self.assertLess(max(tiled.sizes), 3 * len(points) / 9)
+        self.assertEqual(len(set(tiled.halos)), 1)
+
+    def test_quantized(self):
+        # Collinear and cospherical points, as in rounded coordinates, give
+        # cells without a sphere, which are recomputed with a larger halo,
+        # and cells with centroids on the sides of the tiles.
+        grid = np.indices((12, 12)).reshape(2, -1).T.astype(float)
+        self.assertSameCells(grid, 2, 3)
+        points = np.round(np.random.RandomState(6).rand(1000, 2), 3)
+        tiled = self.assertSameCells(points, 2, 3)
+        self.assertLess(max(tiled.sizes), len(points))
+
+    def test_plot(self):
+        # The tiled mosaics can be drawn in place of those of OrderKDelaunay.
+        for points in [np.random.RandomState(7).rand(100, 2),
+                       np.random.RandomState(8).rand(40, 3)]:
+            okdel = OrderKDelaunay(points, 2)
+            tiled = TiledOrderKDelaunay(points, 2, tiles=2, processes=1)
+            np.testing.assert_array_equal(tiled.lifts, okdel.lifts)
+            plotter_class = Plotter2D if points.shape[1] == 2 else Plotter3D
+            plotter = plotter_class(points, tiled)
+            plotter.draw(2)
+            plt.close('all')
+            scomplex = plotter.simplicial_complex(2)
+            self.assertEqual(len(scomplex.faces[-1]),
+                             len(tiled.diagrams_simplices[1]))
+            np.testing.assert_allclose(
+                  scomplex.positions,
+                  points[np.array(tiled.diagrams_vertices[1])].mean(axis=1))
+
+    @unittest.skipIf(os.cpu_count() < 4, 'needs a worker per tile')
+    def test_not_slower(self):
+        points = np.random.RandomState(5).rand(30000, 2)
+        start = time.perf_counter()
+        OrderKDelaunay(points, 2, compact=True)
+        global_time = time.perf_counter() - start
+        start = time.perf_counter()
+        TiledOrderKDelaunay(points, 2, tiles=2, processes=4, compact=True)
+        self.assertLessEqual(time.perf_counter() - start, global_time)
+
+
+if __name__ == '__main__':
+    unittest.main()
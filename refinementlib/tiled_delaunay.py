@@ -0,0 +1,499 @@
+import concurrent.futures
+import numpy as np
+import scipy.sparse
+import scipy.spatial
+from orderk_delaunay import OrderKDelaunay, diagram_containers
+
+'''
+Order-k Delaunay mosaics of large point sets by domain decomposition.
+
+Outline:
+- Split the bounding box of the points into a grid of tiles; the outer
+      sides of the outermost tiles extend to infinity
+- For each tile, compute the order-k Delaunay mosaics of the points in the
+      tile enlarged by a halo, in a process pool. Each worker is sent only
+      these points and the points of the first order+d convex layers (the
+      rim). The rim contains the k points extreme in any direction for k
+      up to order+d, so it serves to recognize the boundary of the global
+      mosaic, and near the convex hull it spans cells far along the hull
+- A tile owns the cells whose centroid (the mean of the centroids of their
+      vertices) lies in the tile, so every cell has exactly one owner
+- Certify the local mosaic of each order within the tile:
+      * Every local cell near the tile must be a cell of the global mosaic.
+        A cell is spanned by the points on a sphere, with the points inside
+        the sphere common to all its vertices, so this holds iff no other
+        point of the whole point set lies in or on its sphere. All points
+        lie in their bounding box, so if the part of the sphere in it lies
+        in the enlarged tile, the points of the tile suffice to check this.
+        The few other spheres, mostly of cells at the convex hull, are
+        checked by the parent against all points; the points found in them
+        are added to the tile, which is then computed again.
+      * Every boundary facet of the local mosaic near the tile must be a
+        facet of the global mosaic's boundary, i.e. of the convex hull of
+        the centroids of all k-subsets of points. Otherwise the local
+        mosaic ends within the tile where the global one continues.
+  Then the global cells owned by the tile are exactly the local ones.
+  Tiles failing the certificate otherwise are computed again with twice
+  the halo.
+- Stitch the owned cells and the simplices triangulating them into global
+      vertex, simplex and cell lists
+'''
+
+# relative numerical error margin of sphere and facet tests
+EPS = 1e-9
+
+
+class TiledOrderKDelaunay:
+    '''Order-k Delaunay mosaics up to a given order, computed in tiles.
+
+    Produces the same cells as OrderKDelaunay, through the same public
+    attributes diagrams_vertices, diagrams_simplices, diagrams_cells and
+    diagrams_generations (see OrderKDelaunay), so it can be used in its
+    place, e.g. by the plotters. Vertices are sorted lexicographically.
+    Cells that are not simplices may be triangulated differently than by
+    OrderKDelaunay. Like OrderKDelaunay, the computation uses floating point
+    arithmetic, and almost cospherical points may be resolved differently
+    in different tiles. The flat cells that joggling may add at collinear
+    points of the convex hull are left out.
+
+    Public attributes (in addition to the diagrams_* lists):
+        lifts: the points with their squared norm as last coordinate, as in
+               OrderKDelaunay, e.g. for SimplicialComplex.from_orderk_delaunay.
+        halos: list with the halo width each tile was finally computed with.
+        sizes: list with the number of points each tile was finally
+               computed with.
+    '''
+
+    def __init__(self, points, order, tiles=4, halo=None, processes=None,
+                 compact=False, backend='hull'):
+        '''
+        Parameters:
+            points - list of points
+            order - order k up to which to compute the order-k Delaunay mosaics
+            tiles - number of tiles along each axis (int or one per axis)
+            halo - initial width of the halo around each tile; by default
+                   estimated from the density of the points
+            processes - number of worker processes (default: cpu count)
+            compact - whether to store the mosaics in array-backed containers
+                      (see OrderKDelaunay)
+            backend - how each tile computes its hulls (see OrderKDelaunay)
+        '''
+        points = np.asarray(points, dtype=float)
+        dimension = points.shape[1]
+        lower = points.min(axis=0)
+        upper = points.max(axis=0)
+        tiles = np.broadcast_to(np.asarray(tiles, dtype=int), (dimension,))
+        self.lifts = np.column_stack(
+              [points, np.einsum('ij,ij->i', points, points)])
+
+        if halo is None:
+            # Width of a cube expected to hold order + d points, twice over.
+            volume = np.prod(np.maximum(upper - lower, np.finfo(float).eps))
+            halo = 2 * ((order + dimension) * volume / len(points)) \
+                  ** (1 / dimension)
+
+        # Tile boxes. The outer sides of the outermost tiles are infinite.
+        edges = [np.linspace(lower[i], upper[i], tiles[i] + 1)
+                 for i in range(dimension)]
+        for edge in edges:
+            edge[0] = -np.inf
+            edge[-1] = np.inf
+        boxes = [(np.array([edges[i][j] for i, j in enumerate(index)]),
+                  np.array([edges[i][j + 1] for i, j in enumerate(index)]))
+                 for index in np.ndindex(*tiles)]
+
+        # Near the convex hull, the cells of the global mosaic may be
+        # spanned by points of the rim far outside the tile, so each tile
+        # gets the rim and, for the spheres of its cells that reach beyond
+        # the enlarged tile, the points in them.
+        rim_ids = _convex_layers(points, order + dimension)
+        rim = points[rim_ids]
+        tree = scipy.spatial.cKDTree(points)
+        self.halos = [halo] * len(boxes)
+        self.sizes = [0] * len(boxes)
+        extras = [rim_ids] * len(boxes)
+        results = [None] * len(boxes)
+        with concurrent.futures.ProcessPoolExecutor(processes) as pool:
+            pending = list(range(len(boxes)))
+            while pending:
+                futures = dict()
+                for i in pending:
+                    # Global indices of the points of the tile, in
+                    # increasing order so that sorted rows of local indices
+                    # remain sorted.
+                    ids = np.union1d(np.flatnonzero(np.all(
+                          (points >= boxes[i][0] - self.halos[i])
+                          & (points <= boxes[i][1] + self.halos[i]), axis=1)),
+                          extras[i])
+                    self.sizes[i] = len(ids)
+                    futures[i] = pool.submit(
+                          _compute_tile, ids, points[ids], len(points), order,
+                          boxes[i][0] - self.halos[i],
+                          boxes[i][1] + self.halos[i], boxes[i][0],
+                          boxes[i][1], (lower, upper), rim, backend)
+                pending = []
+                for i, future in futures.items():
+                    results[i] = future.result()
+                    if results[i] is None:
+                        self.halos[i] *= 2
+                        pending.append(i)
+                        continue
+                    results[i], (centers, radii, counts) = results[i]
+                    inner, outer = _margins(radii, (lower, upper))
+                    failed = ~_holds(tree, centers, inner, outer, counts)
+                    if np.any(failed):
+                        results[i] = None
+                        pending.append(i)
+                        inside = tree.query_ball_point(centers[failed],
+                                                       inner[failed])
+                        missing = np.setdiff1d(np.concatenate(
+                              list(inside)).astype(int), extras[i])
+                        if len(missing):
+                            extras[i] = np.union1d(extras[i], missing)
+                        else:
+                            self.halos[i] *= 2
+
+        self.diagrams_vertices = []
+        self.diagrams_simplices = []
+        self.diagrams_cells = []
+        self.diagrams_generations = []
+        for k in range(1, order + 1):
+            diagram = _stitch([result[k - 1] for result in results], k)
+            vertices, simplices, cells, generations = diagram_containers(
+                  *diagram, compact)
+            self.diagrams_vertices.append(vertices)
+            self.diagrams_simplices.append(simplices)
+            self.diagrams_cells.append(cells)
+            self.diagrams_generations.append(generations)
+
+
+def _convex_layers(points, depth):
+    '''Indices of the points on the first depth convex layers.'''
+    remaining = np.arange(len(points))
+    layers = []
+    for _ in range(depth):
+        if len(remaining) <= points.shape[1] + 1:
+            layers.append(remaining)
+            break
+        try:
+            hull = scipy.spatial.ConvexHull(points[remaining])
+        except scipy.spatial.QhullError:
+            layers.append(remaining)
+            break
+        layers.append(remaining[hull.vertices])
+        remaining = np.delete(remaining, hull.vertices)
+    return np.sort(np.concatenate(layers))
+
+
+def _cell_spheres(points, vertices, cells):
+    '''Centers and radii of the spheres spanning a block of cells.
+
+    The points on the sphere of a cell are those that appear in some but
+    not all of its vertices; in general position there are d+1 of them.
+    If they are affinely dependent, e.g. collinear points of a sliver cell
+    at the convex hull, the cell has no sphere and its center and radius
+    are nan.
+
+    Args:
+        points: (n, d) array of the input points.
+        vertices: (n_vertices, k) array of point indices.
+        cells: (n_cells, n_cell_vertices) array of indices into vertices.
+    '''
+    n_cells, n_cell_vertices = cells.shape
+    dimension = points.shape[1]
+    pts = np.sort(vertices[cells].reshape(n_cells, -1), axis=1)
+    n_entries = pts.shape[1]
+    run_start = np.ones(pts.shape, dtype=bool)
+    run_start[:, 1:] = pts[:, 1:] != pts[:, :-1]
+    # A point is shared by all vertices iff its run has n_cell_vertices
+    # entries.
+    shared = np.zeros(pts.shape, dtype=bool)
+    shared[:, :n_entries - n_cell_vertices + 1] = \
+          pts[:, n_cell_vertices - 1:] == pts[:, :n_entries - n_cell_vertices + 1]
+    on_sphere = points[pts[run_start & ~shared].reshape(
+          n_cells, dimension + 1)]
+
+    # The center c solves 2 (p_i - p_0) . (c - p_0) = |p_i - p_0|^2,
+    # relative to p_0 for accuracy on small spheres.
+    directions = on_sphere[:, 1:] - on_sphere[:, :1]
+    norms = np.einsum('mij,mij->mi', directions, directions)
+    # The determinant is at most the product of the lengths of the rows.
+    singular = np.abs(np.linalg.det(directions)) \
+          <= EPS * np.sqrt(np.prod(norms, axis=1))
+    systems = 2 * directions
+    systems[singular] = np.eye(dimension)
+    offsets = np.linalg.solve(systems, norms[:, :, None])[..., 0]
+    offsets[singular] = np.nan
+    return on_sphere[:, 0] + offsets, np.linalg.norm(offsets, axis=1)
+
+
+def _leaves_region(centers, radii, region_lower, region_upper, bounds):
+    '''Whether each sphere meets the bounding box outside the region.
+
+    The part of the bounding box [bounds[0], bounds[1]] outside the region
+    is covered by the slabs of the box beyond each side of the region; a
+    sphere meets a slab iff the point of the slab closest to its center is
+    within its radius.
+    '''
+    lower, upper = bounds
+    slabs = []
+    for i in range(len(lower)):
+        if region_upper[i] < upper[i]:
+            slab_lower = lower.copy()
+            slab_lower[i] = region_upper[i]
+            slabs.append((slab_lower, upper))
+        if region_lower[i] > lower[i]:
+            slab_upper = upper.copy()
+            slab_upper[i] = region_lower[i]
+            slabs.append((lower, slab_upper))
+    leaves = np.zeros(len(centers), dtype=bool)
+    for slab_lower, slab_upper in slabs:
+        closest = np.clip(centers, slab_lower, slab_upper)
+        leaves |= np.linalg.norm(centers - closest, axis=1) <= radii
+    return leaves
+
+
+def _margins(radii, bounds):
+    '''Radii just inside and outside of spheres by the numerical error margin.
+
+    The margin is on the squared radii, relative to them and to the squared
+    size of the bounding box: a sphere is a hyperplane through the lifted
+    points, whose heights are known up to this precision.
+    '''
+    slack = EPS * (radii ** 2 + np.sum((bounds[1] - bounds[0]) ** 2))
+    return (np.sqrt(np.maximum(radii ** 2 - slack, 0)),
+            np.sqrt(radii ** 2 + slack))
+
+
+def _holds(tree, centers, inner, outer, counts):
+    '''Whether each sphere holds the given number of points of the tree.
+
+    Points between the inner and outer radius of a sphere count as on it,
+    and each sphere must have d+1 points on it.
+    '''
+    on_sphere = centers.shape[1] + 1
+    found = tree.query_ball_point(centers, outer, return_length=True)
+    holds = found == counts + on_sphere
+    more = found > counts + on_sphere
+    if np.any(more):
+        holds[more] = tree.query_ball_point(
+              centers[more], inner[more],
+              return_length=True) <= counts[more]
+    return holds
+
+
+def _touches(lower, upper, box_lower, box_upper):
+    '''Whether each bounding box [lower, upper] meets the box.'''
+    return np.all((upper >= box_lower) & (lower <= box_upper), axis=1)
+
+
+def _boundary_facets(simplices):
+    '''Facets of a triangulation that lie in only one simplex.
+
+    Returns:
+        facets: (n_facets, d) array of vertex indices.
+        opposite: the vertex of the simplex not in the facet.
+    '''
+    dimension = simplices.shape[1] - 1
+    facets = []
+    opposite = []
+    for i in range(dimension + 1):
+        facets.append(np.delete(simplices, i, axis=1))
+        opposite.append(simplices[:, i])
+    facets = np.sort(np.concatenate(facets), axis=1)
+    opposite = np.concatenate(opposite)
+    # Equal facets are adjacent in lexicographic order.
+    order = np.lexsort(facets.T[::-1])
+    distinct = np.any(facets[order[1:]] != facets[order[:-1]], axis=1)
+    single = (np.concatenate([[True], distinct])
+              & np.concatenate([distinct, [True]]))
+    index = order[single]
+    return facets[index], opposite[index]
+
+
+def _is_global_boundary(rim, centroids, facets, opposite, k):
+    '''Whether each facet lies on the boundary of the global mosaic.
+
+    The global order-k mosaic covers the convex hull of the centroids of
+    all k-subsets of points. Its support in direction u is the mean of the
+    k largest values of p.u, which a boundary facet with outward normal u
+    must attain. The k points attaining them lie on the first k convex
+    layers, so only the points of the layers (rim) are needed.
+    '''
+    dimension = rim.shape[1]
+    result = np.empty(len(facets), dtype=bool)
+    for i, (facet, inner) in enumerate(zip(facets, opposite)):
+        corners = centroids[facet]
+        # Normal of the hyperplane through the d corners of the facet.
+        _, _, vt = np.linalg.svd(corners[1:] - corners[0])
+        normal = vt[-1] if dimension > 1 else np.ones(1)
+        if np.dot(centroids[inner] - corners[0], normal) > 0:
+            normal = -normal
+        projections = rim @ normal
+        support = np.partition(projections, len(rim) - k)[-k:].mean()
+        offset = np.dot(corners[0], normal)
+        result[i] = offset >= support - EPS * (1 + abs(support))
+    return result
+
+
+def _compute_tile(ids, local_points, n_points, order, region_lower,
+                  region_upper, box_lower, box_upper, bounds, rim, backend):
+    '''Compute and certify the mosaics of one tile.
+
+    Args:
+        ids: sorted global indices of the points in the enlarged tile.
+        local_points: the coordinates of these points.
+        n_points: the number of all points.
+        order: the order up to which to compute the mosaics.
+        region_lower, region_upper: the corners of the enlarged tile, which
+            holds all points in it.
+        box_lower, box_upper: the corners of the tile.
+        bounds: the corners of the bounding box of all points.
+        rim: the points of the first order+d convex layers.
+        backend: see OrderKDelaunay.
+
+    Returns:
+        None if the halo is too small. Otherwise the list with, for each
+        order k, the tuple (vertices, simplices, cells, generations) of the
+        cells owned by the tile, with vertices as sorted rows of global
+        point indices, and the tuple (centers, radii, counts) of the cell
+        spheres that reach beyond the enlarged tile, with the number of
+        points each must hold inside, which the caller still has to check.
+    '''
+    dimension = local_points.shape[1]
+    is_global = len(ids) == n_points
+    if len(ids) <= dimension + order and not is_global:
+        return None
+    try:
+        okdel = OrderKDelaunay(local_points, order, compact=True,
+                               backend=backend)
+    except scipy.spatial.QhullError:
+        if is_global:
+            raise
+        return None
+    tree = None if is_global else scipy.spatial.cKDTree(local_points)
+
+    result = []
+    unchecked = [(np.empty((0, dimension)), np.empty(0), np.empty(0, int))]
+    for k in range(1, order + 1):
+        vertices = okdel.diagrams_vertices[k - 1].array
+        simplices = okdel.diagrams_simplices[k - 1].data.reshape(
+              -1, dimension + 1)
+        all_cells = okdel.diagrams_cells[k - 1]
+        all_generations = okdel.diagrams_generations[k - 1]
+        centroids = local_points[vertices].mean(axis=1)
+        widths = np.diff(all_cells.offsets)
+
+        # Split the cells into blocks of equal width, certify those near
+        # the tile and mark those whose centroid lies in the tile as owned.
+        blocks = []
+        block_generations = []
+        owned = []
+        touched = is_global
+        for width in np.unique(widths):
+            selected = widths == width
+            block = all_cells.data[
+                  all_cells.offsets[:-1][selected][:, None]
+                  + np.arange(width)]
+            generations = all_generations[selected]
+            corners = centroids[block]
+            near = _touches(corners.min(axis=1), corners.max(axis=1),
+                            box_lower, box_upper)
+            touched = touched or bool(np.any(near))
+            if tree is not None and np.any(near):
+                centers, radii = _cell_spheres(
+                      local_points, vertices, block[near])
+                # A cell without a sphere cannot be certified; with a
+                # larger halo, it either leaves the tile or the tile
+                # eventually holds all points.
+                if np.any(np.isnan(radii)):
+                    return None
+                # The points inside the sphere of a cell of generation g
+                # are its k-g inner points.
+                expected = k - generations[near]
+                # The points of the tile only tell if no other point can
+                # be in the sphere; the others are left to the caller.
+                inner, outer = _margins(radii, bounds)
+                leaves = _leaves_region(centers, outer, region_lower,
+                                        region_upper, bounds)
+                unchecked.append((centers[leaves],
+                                  radii[leaves], expected[leaves]))
+                if not np.all(_holds(tree, centers[~leaves], inner[~leaves],
+                                     outer[~leaves], expected[~leaves])):
+                    return None
+            # Summed in sorted order, so that all tiles round a cell's
+            # centroid alike, also when it lies on a tile side.
+            center = np.sort(corners, axis=1).mean(axis=1)
+            blocks.append(block)
+            block_generations.append(generations)
+            owned.append(np.all((center >= box_lower) & (center < box_upper),
+                                axis=1))
+
+        if not touched:
+            return None
+        if tree is not None:
+            facets, opposite = _boundary_facets(simplices)
+            corners = centroids[facets]
+            near = _touches(corners.min(axis=1), corners.max(axis=1),
+                            box_lower, box_upper)
+            if not np.all(_is_global_boundary(
+                  rim, centroids, facets[near], opposite[near], k)):
+                return None
+
+        # Each simplex lies in the unique cell containing all its vertices.
+        cell_vertices = np.concatenate([block.reshape(-1) for block in blocks])
+        cell_index = np.repeat(
+              np.arange(sum(len(block) for block in blocks)),
+              np.concatenate([np.full(len(block), block.shape[1])
+                              for block in blocks]))
+        incidence = scipy.sparse.csr_matrix(
+              (np.ones(len(cell_index)), (cell_vertices, cell_index)),
+              shape=(len(vertices), sum(len(block) for block in blocks)))
+        simplex_incidence = scipy.sparse.csr_matrix(
+              (np.ones(simplices.size),
+               (np.repeat(np.arange(len(simplices)), dimension + 1),
+                simplices.reshape(-1))),
+              shape=(len(simplices), len(vertices)))
+        counts = (simplex_incidence @ incidence).tocoo()
+        containing = np.full(len(simplices), -1)
+        full = counts.data >= dimension + 1
+        containing[counts.row[full]] = counts.col[full]
+        # At almost cospherical points, numerical errors may leave
+        # simplices outside of all cells, as in the global mosaic; they
+        # belong to no tile.
+        owned_cells = np.concatenate(owned)
+        simplices = simplices[(containing >= 0)
+                              & owned_cells[np.maximum(containing, 0)]]
+        cells = [block[mask] for block, mask in zip(blocks, owned)]
+        generations = [gens[mask]
+                       for gens, mask in zip(block_generations, owned)]
+        cell_vertices = np.concatenate([block.reshape(-1) for block in cells])
+
+        # Restrict to the vertices of owned cells, in global point indices.
+        used = np.unique(cell_vertices)
+        renumber = np.full(len(vertices), -1, dtype=np.int32)
+        renumber[used] = np.arange(len(used), dtype=np.int32)
+        result.append((ids[vertices[used]].astype(np.int32),
+                       renumber[simplices],
+                       [renumber[block] for block in cells],
+                       np.concatenate(generations)))
+    return result, tuple(map(np.concatenate, zip(*unchecked)))
+
+
+def _stitch(parts, k):
+    '''Merge the (vertices, simplices, cells, generations) of all tiles.'''
+    vertices, inverse = np.unique(
+          np.concatenate([np.empty((0, k), dtype=np.int32)]
+                         + [part[0] for part in parts]),
+          axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1).astype(np.int32)
+    simplices = []
+    cells = []
+    start = 0
+    for part_vertices, part_simplices, part_cells, _ in parts:
+        renumber = inverse[start:start + len(part_vertices)]
+        start += len(part_vertices)
+        simplices.append(renumber[part_simplices])
+        cells += [renumber[block] for block in part_cells]
+    return (vertices, np.concatenate(simplices), cells,
+            np.concatenate([part[3] for part in parts]))